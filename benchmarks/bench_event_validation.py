@@ -0,0 +1,92 @@
+"""
+Mide eventos/segundo al validar el cuerpo de POST /v1/events/.
+
+Compara el modelo anterior (timestamps como texto con validadores en Python, validación elemento por
+elemento) con el `TypeAdapter` precompilado que valida la lista completa directamente desde los bytes.
+
+Uso:
+    python benchmarks/bench_event_validation.py [--events 5000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared_module"))
+
+from bench_wire_format import best_of, build_events  # noqa: E402
+from models.event import parse_events  # noqa: E402
+
+
+class LegacyElementAttributes(BaseModel):
+    class_: Optional[str] = Field(None, alias="class")
+    href: Optional[str] = None
+
+
+class LegacyProperties(BaseModel):
+    distinct_id: str
+    session_id: str
+    journey_id: Optional[str] = None
+    current_url: str = Field(..., alias="$current_url")
+    host: str = Field(..., alias="$host")
+    pathname: str = Field(..., alias="$pathname")
+    browser: str = Field(..., alias="$browser")
+    device: str = Field(..., alias="$device")
+    screen_height: int = Field(..., alias="$screen_height")
+    screen_width: int = Field(..., alias="$screen_width")
+    eventType: str
+    elementType: str
+    elementText: str
+    elementAttributes: Optional[LegacyElementAttributes] = None
+    timestamp: str
+    x: int
+    y: int
+    mouseButton: int
+    ctrlKey: bool
+    shiftKey: bool
+    altKey: bool
+    metaKey: bool
+
+    @field_validator("timestamp")
+    def validate_timestamp(cls, value):
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return value
+
+
+class LegacyEvent(BaseModel):
+    event: str
+    properties: LegacyProperties
+    timestamp: str
+
+    @field_validator("timestamp")
+    def validate_event_timestamp(cls, value):
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = json.dumps(build_events(args.events)).encode("utf-8")
+    variants = [
+        ("anterior (json.loads + Event(**e))", lambda: [LegacyEvent(**item) for item in json.loads(body)]),
+        ("TypeAdapter.validate_json", lambda: parse_events(body)),
+    ]
+
+    print(f"{args.events} eventos, mejor de {args.repeat} repeticiones")
+    for name, func in variants:
+        elapsed = best_of(args.repeat, func)
+        print(f"{name:<40}{elapsed * 1000:>10.1f} ms{args.events / elapsed:>14,.0f} eventos/s")
+
+
+if __name__ == "__main__":
+    main()
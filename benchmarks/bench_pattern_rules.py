@@ -0,0 +1,115 @@
+"""
+Mide acciones/segundo al identificar patrones en GET /v1/stories/patterns.
+
+Compara la cadena if/elif anterior con el motor de reglas de `pattern_rules`, que indexa las reglas por tipo
+de acción. Ambos validan cada documento con `Story`, como `GET /v1/stories/patterns` en modo `python`; también
+se mide el motor sobre los documentos sin validar para separar el costo de la validación.
+
+Uso:
+    python benchmarks/bench_pattern_rules.py [--actions 1000000] [--actions-per-story 50] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared_module"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "story_service"))
+
+from bench_wire_format import best_of  # noqa: E402
+from models.story import Story  # noqa: E402
+from pattern_rules import DEFAULT_PATTERN_RULES, PatternEngine  # noqa: E402
+
+ACTION_SAMPLES = [
+    {"type": "click", "target": "a", "value": "User Stories"},
+    {"type": "click", "target": "a", "value": "Test Cases"},
+    {"type": "click", "target": "div", "value": "Destacado"},
+    {"type": "click", "target": "svg", "value": ""},
+    {"type": "click", "target": "span", "value": ""},
+    {"type": "click", "target": "button", "value": "Enviar"},
+    {"type": "click", "target": "#checkout", "value": "Pagar"},
+    {"type": "input", "target": "#login-email", "value": "user@example.com"},
+    {"type": "input", "target": "#q", "value": "zapatillas"},
+    {"type": "navigation", "target": "/search", "value": None, "url": "https://example.com/search"},
+]
+
+
+def build_stories(total_actions: int, actions_per_story: int) -> list:
+    rng = random.Random(42)
+    stories = []
+    for index in range(0, total_actions, actions_per_story):
+        stories.append({
+            "id": f"story-{index}",
+            "session_id": f"session-{index}",
+            "title": "Historia sintética",
+            "startTimestamp": "2024-01-01T00:00:00.000Z",
+            "endTimestamp": "2024-01-01T00:10:00.000Z",
+            "initialState": {"url": "https://example.com"},
+            "finalState": {"url": "https://example.com/final"},
+            "actions": [dict(rng.choice(ACTION_SAMPLES)) for _ in range(min(actions_per_story, total_actions - index))],
+            "networkRequests": [],
+        })
+    return stories
+
+
+def legacy_identify_patterns(stories: list) -> dict:
+    """
+    Implementación anterior de `_identify_patterns`.
+    """
+    patterns = {}
+    for story_data in stories:
+        story = Story(**story_data)
+        for action in story.actions:
+            if action.type == "input" and "login" in action.target:
+                patterns.setdefault("login", {}).setdefault(story.id, 0)
+                patterns["login"][story.id] += 1
+            elif action.type == "click" and "checkout" in action.target:
+                patterns.setdefault("checkout", {}).setdefault(story.id, 0)
+                patterns["checkout"][story.id] += 1
+            elif action.type == "navigation" and "search" in action.target:
+                patterns.setdefault("search", {}).setdefault(story.id, 0)
+                patterns["search"][story.id] += 1
+            elif action.type == "click" and action.target == "a" and action.value in ["User Stories", "Test Cases"]:
+                patterns.setdefault("navigation_to_section", {}).setdefault(story.id, 0)
+                patterns["navigation_to_section"][story.id] += 1
+            elif action.type == "click" and action.target == "div" and action.value:
+                patterns.setdefault("interaction_with_highlighted_content", {}).setdefault(story.id, 0)
+                patterns["interaction_with_highlighted_content"][story.id] += 1
+            elif action.type == "click" and action.value == "Test Cases":
+                patterns.setdefault("repeated_click", {}).setdefault(story.id, 0)
+                patterns["repeated_click"][story.id] += 1
+            elif action.type == "click" and action.target == "svg":
+                patterns.setdefault("ui_icon_interaction", {}).setdefault(story.id, 0)
+                patterns["ui_icon_interaction"][story.id] += 1
+            elif action.type == "click" and not action.value:
+                patterns.setdefault("ambiguous_interaction", {}).setdefault(story.id, 0)
+                patterns["ambiguous_interaction"][story.id] += 1
+    return patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actions", type=int, default=1_000_000)
+    parser.add_argument("--actions-per-story", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    stories = build_stories(args.actions, args.actions_per_story)
+    engine = PatternEngine(DEFAULT_PATTERN_RULES)
+    assert engine.identify(stories) == legacy_identify_patterns(stories), "Los resultados no coinciden"
+
+    variants = [
+        ("anterior (if/elif + Story(**s))", lambda: legacy_identify_patterns(stories)),
+        ("PatternEngine + Story(**s)", lambda: engine.identify(Story(**story) for story in stories)),
+        ("PatternEngine sobre documentos", lambda: engine.identify(stories)),
+    ]
+
+    print(f"{args.actions} acciones en {len(stories)} historias, mejor de {args.repeat} repeticiones")
+    for name, func in variants:
+        elapsed = best_of(args.repeat, func)
+        print(f"{name:<40}{elapsed * 1000:>10.1f} ms{args.actions / elapsed:>14,.0f} acciones/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compara los formatos de transporte del salto events -> stories para un lote de eventos.
+
+Mide bytes en el cable y tiempos de codificación/decodificación (sin y con validación de `List[Event]`).
+
+Uso:
+    python benchmarks/bench_wire_format.py [--events 5000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared_module"))
+
+from models.event import EventListAdapter  # noqa: E402
+from serialization import decode_payload, encode_payload, msgpack_available  # noqa: E402
+
+
+def build_events(count: int) -> list:
+    return [
+        {
+            "event": "$autocapture",
+            "properties": {
+                "distinct_id": f"user-{i % 50}",
+                "session_id": f"session-{i % 200}",
+                "$current_url": f"https://www.bugster.app/dashboard/{i % 20}",
+                "$host": "www.bugster.app",
+                "$pathname": f"/dashboard/{i % 20}",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "div",
+                "elementText": "71.43%Pass Rate21Tests",
+                "elementAttributes": {"class": "card", "href": None},
+                "timestamp": f"2024-10-10T22:{(i // 60) % 60:02d}:{i % 60:02d}.563Z",
+                "x": i % 1920,
+                "y": i % 1080,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False,
+            },
+            "timestamp": f"2024-10-10T22:{(i // 60) % 60:02d}:{i % 60:02d}.563Z",
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    events = build_events(args.events)
+    variants = [("json", "none"), ("json", "gzip")]
+    if msgpack_available():
+        variants += [("msgpack", "none"), ("msgpack", "gzip")]
+
+    print(f"{args.events} eventos, mejor de {args.repeat} repeticiones")
+    print(f"{'formato':<16}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}{'decode+valid ms':>18}")
+    for wire_format, compression in variants:
+        body, headers = encode_payload(events, wire_format, compression)
+        content_type, content_encoding = headers["Content-Type"], headers.get("Content-Encoding")
+
+        encode = best_of(args.repeat, lambda: encode_payload(events, wire_format, compression))
+        decode = best_of(args.repeat, lambda: decode_payload(body, content_type, content_encoding))
+        decode_validate = best_of(
+            args.repeat,
+            lambda: EventListAdapter.validate_python(decode_payload(body, content_type, content_encoding)),
+        )
+        print(
+            f"{wire_format + '+' + compression:<16}{len(body):>12}"
+            f"{encode * 1000:>12.1f}{decode * 1000:>12.1f}{decode_validate * 1000:>18.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
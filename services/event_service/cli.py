@@ -0,0 +1,66 @@
+"""
+Herramientas offline del servicio de eventos.
+
+Uso:
+    python cli.py archive-events
+    python cli.py migrate-events [--batch-size 1000]
+"""
+import argparse
+import asyncio
+from dependencies import init_database_manager, close_database_manager
+
+
+async def archive_events() -> list:
+    """
+    Archiva las colecciones de eventos vencidas y elimina su copia en MongoDB.
+
+    Returns:
+        list: Un resumen `{bucket, archived}` por período archivado.
+    """
+    db_manager = init_database_manager()
+    try:
+        return await db_manager.archive_expired_event_buckets()
+    finally:
+        close_database_manager()
+
+
+async def migrate_events(batch_size: int) -> dict:
+    """
+    Reescribe los eventos guardados con timestamps de texto al formato actual (fechas y `_id` determinístico).
+
+    Args:
+        batch_size (int): Documentos por inserción y eliminación.
+
+    Returns:
+        dict: Cantidad de eventos migrados, duplicados descartados e inválidos.
+    """
+    db_manager = init_database_manager()
+    try:
+        return await db_manager.migrate_legacy_events(batch_size=batch_size)
+    finally:
+        close_database_manager()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Herramientas del servicio de eventos.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("archive-events", help="Archiva las colecciones de eventos vencidas (EVENTS_STORAGE_MODE=bucketed).")
+    migrate_parser = subparsers.add_parser(
+        "migrate-events", help="Migra los eventos guardados antes del cambio a timestamps de fecha y `_id` determinístico."
+    )
+    migrate_parser.add_argument("--batch-size", type=int, default=1000, help="Documentos por escritura.")
+    args = parser.parse_args()
+
+    if args.command == "migrate-events":
+        summary = asyncio.run(migrate_events(args.batch_size))
+        print(f"{summary['migrated']} eventos migrados, {summary['duplicates']} duplicados, {summary['invalid']} inválidos")
+        return
+
+    archived = asyncio.run(archive_events())
+    for bucket in archived:
+        print(f"{bucket['bucket']}: {bucket['archived']} eventos archivados")
+    print(f"{len(archived)} colecciones archivadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,51 @@
 import httpx
 import asyncio
 import os
+from collections import Counter
 from dotenv import load_dotenv
-from typing import List
-from models.event import Event
-from database_manager import DatabaseManager
+from pydantic import ValidationError
+from typing import AsyncIterator, List, Optional
+from models.event import Event, EventAdapter
+from async_database_manager import AsyncDatabaseManager
+from http_client import get_http_client
+from serialization import encode_payload, iter_ndjson_lines
 from logging_config import logger
 
 load_dotenv()
 STORIES_SERVICE_URL = os.getenv("STORIES_SERVICE_URL")
+# "outbox": las notificaciones se encolan en MongoDB y las envía OutboxDispatcher; "inline": se envían en la solicitud.
+STORIES_NOTIFY_MODE = os.getenv("STORIES_NOTIFY_MODE", "outbox").lower()
+STORIES_NOTIFY_TIMEOUT_SECONDS = float(os.getenv("STORIES_NOTIFY_TIMEOUT_SECONDS", "10"))
+# Formato de los eventos enviados al servicio de historias: "msgpack" o "json", opcionalmente comprimidos con gzip.
+STORIES_WIRE_FORMAT = os.getenv("STORIES_WIRE_FORMAT", "msgpack").lower()
+STORIES_WIRE_COMPRESSION = os.getenv("STORIES_WIRE_COMPRESSION", "gzip").lower()
+# Ingesta NDJSON: eventos por escritura, errores detallados en la respuesta y largo máximo de una línea.
+EVENTS_STREAM_CHUNK_SIZE = int(os.getenv("EVENTS_STREAM_CHUNK_SIZE", "1000"))
+EVENTS_STREAM_MAX_ERRORS = int(os.getenv("EVENTS_STREAM_MAX_ERRORS", "100"))
+EVENTS_STREAM_MAX_LINE_BYTES = int(os.getenv("EVENTS_STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
+
+# Se activa si el servicio de historias rechaza el formato binario (415); a partir de ahí se envía JSON.
+_wire_fallback_to_json = False
+
+async def send_events_to_stories_service(events_json: List[dict]):
+    """
+    Envía eventos serializados al servicio de historias. Lanza una excepción si la entrega falla.
+    """
+    global _wire_fallback_to_json
+    wire_format = "json" if _wire_fallback_to_json else STORIES_WIRE_FORMAT
+    body, headers = encode_payload(events_json, wire_format, STORIES_WIRE_COMPRESSION)
+    response = await get_http_client().post(
+        url=STORIES_SERVICE_URL, content=body, headers=headers, timeout=STORIES_NOTIFY_TIMEOUT_SECONDS
+    )
+
+    if response.status_code == 415 and wire_format != "json":
+        logger.warning("El servicio de historias no acepta el formato binario. Se usará JSON.")
+        _wire_fallback_to_json = True
+        body, headers = encode_payload(events_json, "json", "none")
+        response = await get_http_client().post(
+            url=STORIES_SERVICE_URL, content=body, headers=headers, timeout=STORIES_NOTIFY_TIMEOUT_SECONDS
+        )
+    response.raise_for_status()
 
 async def notify_stories_service(events: List[Event]):
     """
@@ -20,20 +57,19 @@ async def notify_stories_service(events: List[Event]):
 
     events_json = [event.to_json() for event in events]
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url=STORIES_SERVICE_URL, json=events_json)
-            if response.status_code != 200:
-                logger.error(f"Error llamando al servicio de historias: {response.text}")
+        await send_events_to_stories_service(events_json)
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Error llamando al servicio de historias: {e.response.text}")
     except httpx.RequestError as e:
         logger.error(f"Error conectando con el servicio de historias: {str(e)}")
 
-async def process_events(events: List[Event], db_manager: DatabaseManager) -> dict:
+async def process_events(events: List[Event], db_manager: AsyncDatabaseManager) -> dict:
     """
-    Procesa eventos, los guarda en MongoDB y actualiza la tabla `sessions`.
+    Procesa eventos, los guarda en MongoDB y actualiza el registro de sesiones.
     
     Args:
         events (List[Event]): Lista de eventos (instancias de la clase Event).
-        db_manager (DatabaseManager): Instancia para interactuar con la base de datos.
+        db_manager (AsyncDatabaseManager): Instancia para interactuar con la base de datos.
     
     Returns:
         dict: Resumen del estado del procesamiento.
@@ -41,31 +77,162 @@ async def process_events(events: List[Event], db_manager: DatabaseManager) -> di
     if not events:
         raise ValueError("No se proporcionaron eventos.")
 
-    sessions_data = {}
-    for event in events:
-        distinct_id = event.properties.distinct_id
-        session_id = event.properties.session_id
-        if distinct_id not in sessions_data:
-            sessions_data[distinct_id] = set()
-        sessions_data[distinct_id].add(session_id)
-
-    formatted_sessions = [
-        {"distinct_id": distinct_id, "sessions": list(session_ids)}
-        for distinct_id, session_ids in sessions_data.items()
-    ]
-
     try:
-        db_manager.bulk_save_events(events)
-        db_manager.bulk_upsert_sessions(formatted_sessions)
-        
-        await notify_stories_service(events)
+        duplicates = await persist_events(events, db_manager)
     except Exception as e:
         logger.error(f"Error al procesar eventos: {str(e)}", exc_info=True)
         raise
 
+    return events_result(len(events), sum(duplicates))
+
+
+async def persist_events(events: List[Event], db_manager: AsyncDatabaseManager) -> List[bool]:
+    """
+    Guarda un lote de eventos con una escritura masiva, registra sus sesiones y notifica los eventos nuevos
+    al servicio de historias con un solo envío (o una escritura masiva en la outbox).
+
+    Args:
+        events (List[Event]): Eventos del lote.
+        db_manager (AsyncDatabaseManager): Instancia para interactuar con la base de datos.
+
+    Returns:
+        List[bool]: Para cada evento, si se descartó por duplicado.
+    """
+    save_summary = await db_manager.bulk_save_events(events)
+    duplicates = _mark_duplicates(events, save_summary["duplicate_ids"])
+    new_events = [event for event, duplicate in zip(events, duplicates) if not duplicate]
+
+    if STORIES_NOTIFY_MODE == "outbox":
+        # Se encolan también los duplicados: si un intento anterior guardó los eventos pero falló antes de
+        # encolarlos, el reintento los encola ahora. La outbox ignora los eventos que ya tiene o ya entregó.
+        await db_manager.enqueue_outbox({event.event_id(): event.to_json() for event in events})
+
+    # Solo se registran los eventos nuevos; los duplicados ya se contaron en un envío anterior.
+    await db_manager.bulk_upsert_sessions(_summarize_sessions(new_events))
+    if new_events and STORIES_NOTIFY_MODE != "outbox":
+        await notify_stories_service(new_events)
+    return duplicates
+
+
+async def ingest_event_stream(
+    chunks: AsyncIterator[bytes],
+    db_manager: AsyncDatabaseManager,
+    content_encoding: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    max_errors: Optional[int] = None,
+) -> dict:
+    """
+    Procesa un cuerpo NDJSON (un evento por línea) a medida que llega.
+
+    Cada línea se valida por separado; las válidas se acumulan y se escriben con `persist_events` cada
+    `chunk_size` eventos, y las inválidas se informan con su número de línea. La memoria usada depende
+    del tamaño del bloque y no del cuerpo. Si una escritura falla, los bloques anteriores ya quedaron
+    guardados; reenviar el cuerpo completo es seguro porque los eventos repetidos se descartan como duplicados.
+
+    Args:
+        chunks (AsyncIterator[bytes]): Bloques del cuerpo tal como llegan.
+        db_manager (AsyncDatabaseManager): Instancia para interactuar con la base de datos.
+        content_encoding (Optional[str]): Compresión del cuerpo: `identity`, `gzip` o `zstd`.
+        chunk_size (Optional[int]): Eventos por escritura (por defecto `EVENTS_STREAM_CHUNK_SIZE`).
+        max_errors (Optional[int]): Errores detallados en la respuesta (por defecto `EVENTS_STREAM_MAX_ERRORS`).
+
+    Returns:
+        dict: Líneas leídas, eventos aceptados, insertados, duplicados y rechazados, y el detalle de los errores.
+    """
+    chunk_size = chunk_size or EVENTS_STREAM_CHUNK_SIZE
+    if max_errors is None:
+        max_errors = EVENTS_STREAM_MAX_ERRORS
+    summary = {"lines": 0, "accepted": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "errors": []}
+    pending: List[Event] = []
+
+    async def write(events: List[Event]):
+        duplicates = sum(await persist_events(events, db_manager))
+        summary["inserted"] += len(events) - duplicates
+        summary["duplicates"] += duplicates
+
+    def reject(line_number: int, error):
+        summary["rejected"] += 1
+        if len(summary["errors"]) < max_errors:
+            summary["errors"].append({"line": line_number, "error": error})
+
+    async for line_number, line in iter_ndjson_lines(chunks, content_encoding, EVENTS_STREAM_MAX_LINE_BYTES):
+        summary["lines"] = line_number
+        if line is None:
+            reject(line_number, f"La línea supera {EVENTS_STREAM_MAX_LINE_BYTES} bytes.")
+            continue
+        try:
+            pending.append(EventAdapter.validate_json(line))
+        except ValidationError as e:
+            reject(line_number, e.errors(include_url=False, include_context=False, include_input=False))
+            continue
+        summary["accepted"] += 1
+        if len(pending) >= chunk_size:
+            await write(pending)
+            pending = []
+
+    if pending:
+        await write(pending)
+
+    summary["errors_truncated"] = summary["rejected"] > len(summary["errors"])
+    logger.info(
+        f"Ingesta NDJSON: {summary['accepted']} eventos aceptados, {summary['rejected']} líneas rechazadas."
+    )
+    return summary
+
+
+def events_result(total: int, duplicates: int) -> dict:
+    """
+    Respuesta de `POST /v1/events/` para una solicitud con `total` eventos.
+    """
     return {
         "status": "success",
-        "message": f"{len(events)} eventos procesados correctamente.",
+        "message": f"{total} eventos procesados correctamente.",
+        "inserted": total - duplicates,
+        "duplicates": duplicates,
     }
 
 
+def _mark_duplicates(events: List[Event], duplicate_ids: List[str]) -> List[bool]:
+    """
+    Marca los eventos que no se guardaron por duplicados.
+
+    Si un evento se repite dentro del mismo lote, la primera aparición se guarda y solo las siguientes
+    figuran en `duplicate_ids`; por eso las marcas se asignan desde el final del lote.
+    """
+    remaining = Counter(duplicate_ids)
+    duplicates = [False] * len(events)
+    for index in range(len(events) - 1, -1, -1):
+        event_id = events[index].event_id()
+        if remaining[event_id]:
+            remaining[event_id] -= 1
+            duplicates[index] = True
+    return duplicates
+
+
+def _summarize_sessions(events: List[Event]) -> List[dict]:
+    """
+    Resume un lote de eventos por sesión: usuario, primer y último timestamp y cantidad de eventos.
+
+    Args:
+        events (List[Event]): Eventos nuevos del lote.
+
+    Returns:
+        List[dict]: Un documento por `session_id` para `bulk_upsert_sessions`.
+    """
+    sessions = {}
+    for event in events:
+        session_id = event.properties.session_id
+        session = sessions.get(session_id)
+        if session is None:
+            sessions[session_id] = {
+                "session_id": session_id,
+                "distinct_id": event.properties.distinct_id,
+                "first_seen": event.timestamp,
+                "last_seen": event.timestamp,
+                "event_count": 1,
+            }
+            continue
+        session["first_seen"] = min(session["first_seen"], event.timestamp)
+        session["last_seen"] = max(session["last_seen"], event.timestamp)
+        session["event_count"] += 1
+    return list(sessions.values())
@@ -0,0 +1,46 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from typing import Optional
+from async_database_manager import AsyncDatabaseManager
+from logging_config import logger
+
+load_dotenv()
+EVENTS_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("EVENTS_ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+class EventArchiver:
+    """
+    Tarea en segundo plano que archiva periódicamente las colecciones de eventos vencidas
+    (modo `EVENTS_STORAGE_MODE=bucketed`), manteniendo en MongoDB solo los períodos recientes.
+    """
+
+    def __init__(self, db_manager: AsyncDatabaseManager, interval: float = EVENTS_ARCHIVE_INTERVAL_SECONDS):
+        self.db_manager = db_manager
+        self.interval = interval
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Archivador de eventos iniciado.")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        logger.info("Archivador de eventos detenido.")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await self.db_manager.archive_expired_event_buckets()
+            except Exception as e:
+                logger.error(f"Error archivando eventos: {str(e)}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
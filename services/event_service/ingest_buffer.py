@@ -0,0 +1,165 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from typing import List, Optional, Set, Tuple
+from models.event import Event
+from async_database_manager import AsyncDatabaseManager
+from event_application import events_result, persist_events
+from logging_config import logger
+
+load_dotenv()
+INGEST_BUFFER_ENABLED = os.getenv("INGEST_BUFFER_ENABLED", "true").lower() == "true"
+# Se escribe un lote al juntar `INGEST_BUFFER_MAX_EVENTS` eventos o al pasar `INGEST_BUFFER_MAX_DELAY_MS` desde el primero
+INGEST_BUFFER_MAX_EVENTS = int(os.getenv("INGEST_BUFFER_MAX_EVENTS", "1000"))
+INGEST_BUFFER_MAX_DELAY_MS = float(os.getenv("INGEST_BUFFER_MAX_DELAY_MS", "50"))
+# Eventos en espera o escribiéndose por encima de los cuales se responde 429
+INGEST_BUFFER_MAX_PENDING = int(os.getenv("INGEST_BUFFER_MAX_PENDING", "20000"))
+
+
+class IngestBufferFull(Exception):
+    """
+    El buffer alcanzó `max_pending` eventos; el cliente debe reintentar más tarde.
+    """
+
+
+class IngestBuffer:
+    """
+    Agrupa los eventos de solicitudes concurrentes de `POST /v1/events/` en un solo lote.
+
+    Cada solicitud deja sus eventos en el buffer y espera el resultado de su lote. El lote se escribe
+    (una escritura masiva, un registro de sesiones y una notificación al servicio de historias) cuando
+    junta `max_events` eventos o cuando pasan `max_delay` segundos desde que entró el primero.
+    Las solicitudes con `max_events` eventos o más no ganan nada al agruparse y se escriben directamente.
+    """
+
+    def __init__(
+        self,
+        db_manager: AsyncDatabaseManager,
+        max_events: int = INGEST_BUFFER_MAX_EVENTS,
+        max_delay: float = INGEST_BUFFER_MAX_DELAY_MS / 1000,
+        max_pending: int = INGEST_BUFFER_MAX_PENDING,
+    ):
+        self.db_manager = db_manager
+        self.max_events = max_events
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._pending: List[Tuple[List[Event], asyncio.Future]] = []
+        self._pending_events = 0
+        self._in_flight_events = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._closed = False
+        self.stats = {"requests": 0, "flushes": 0, "events": 0, "direct": 0, "rejected": 0}
+
+    async def submit(self, events: List[Event]) -> dict:
+        """
+        Agrega los eventos de una solicitud al lote en curso y espera a que se escriba.
+
+        Las solicitudes con `max_events` eventos o más se escriben directamente con `persist_events`, pero
+        cuentan para `max_pending` mientras se escriben. Si el lote en que se escribe una solicitud falla,
+        fallan todas las solicitudes de ese lote.
+
+        Raises:
+            IngestBufferFull: Si aceptar los eventos supera `max_pending` (con el buffer vacío siempre se aceptan).
+
+        Returns:
+            dict: Resumen de la solicitud (mismo formato que `process_events`).
+        """
+        # Con el buffer vacío siempre se acepta una solicitud, así una más grande que `max_pending` no recibe siempre 429.
+        waiting = self._pending_events + self._in_flight_events
+        if waiting and waiting + len(events) > self.max_pending:
+            self.stats["rejected"] += 1
+            raise IngestBufferFull()
+
+        self.stats["requests"] += 1
+        if len(events) >= self.max_events:
+            # Ya es un lote completo: se escribe directamente, pero cuenta como en curso para `max_pending`.
+            self.stats["direct"] += 1
+            self._in_flight_events += len(events)
+            try:
+                return events_result(len(events), sum(await persist_events(events, self.db_manager)))
+            finally:
+                self._in_flight_events -= len(events)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((events, future))
+        self._pending_events += len(events)
+
+        if self._closed or self._pending_events >= self.max_events:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        self._in_flight_events += self._pending_events
+        self._pending_events = 0
+        task = asyncio.create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[List[Event], asyncio.Future]]):
+        events = [event for request_events, _ in batch for event in request_events]
+        try:
+            duplicates = await persist_events(events, self.db_manager)
+        except Exception as e:
+            logger.error(f"Error escribiendo un lote de {len(events)} eventos: {str(e)}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight_events -= len(events)
+
+        self.stats["flushes"] += 1
+        self.stats["events"] += len(events)
+        start = 0
+        for request_events, future in batch:
+            end = start + len(request_events)
+            if not future.done():  # La solicitud pudo cancelarse (cliente desconectado)
+                future.set_result(events_result(len(request_events), sum(duplicates[start:end])))
+            start = end
+
+    async def close(self):
+        """
+        Escribe los eventos pendientes y espera los lotes en curso. Se invoca desde el `lifespan` al apagar.
+        """
+        self._closed = True
+        self._flush_pending()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        logger.info(f"Buffer de ingesta cerrado: {self.stats}")
+
+
+_ingest_buffer: Optional[IngestBuffer] = None
+
+
+def init_ingest_buffer(db_manager: AsyncDatabaseManager) -> Optional[IngestBuffer]:
+    """
+    Crea el buffer de ingesta del proceso si está habilitado. Se invoca desde el `lifespan`.
+    """
+    global _ingest_buffer
+    if _ingest_buffer is None and INGEST_BUFFER_ENABLED:
+        _ingest_buffer = IngestBuffer(db_manager)
+    return _ingest_buffer
+
+
+async def close_ingest_buffer():
+    global _ingest_buffer
+    if _ingest_buffer is not None:
+        await _ingest_buffer.close()
+        _ingest_buffer = None
+
+
+def get_ingest_buffer() -> Optional[IngestBuffer]:
+    """
+    Retorna el buffer de ingesta, o None si no se inicializó (las solicitudes se escriben una por una).
+    """
+    return _ingest_buffer
@@ -2,31 +2,53 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from routes.v1.events import router as events_router
-from database_manager import DatabaseManager
-import os
+from monitoring import router as monitoring_router
+from dependencies import init_database_manager, close_database_manager, events_storage_mode
+from http_client import init_http_client, close_http_client
+from event_application import STORIES_NOTIFY_MODE, STORIES_SERVICE_URL
+from outbox_dispatcher import OutboxDispatcher
+from event_archiver import EventArchiver
+from ingest_buffer import init_ingest_buffer, close_ingest_buffer
 import logging
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("event_service")
 
-db_uri = os.getenv("DB_URI")
-db_name = os.getenv("DB_NAME")
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global db_manager
+    dispatcher = None
+    archiver = None
     try:
         logger.info("Inicializando conexión a MongoDB...")
-        db_manager = DatabaseManager(uri=db_uri, db_name=db_name)
-        db_manager.create_indexes()
+        db_manager = init_database_manager()
+        init_http_client()
+        await db_manager.create_indexes()
         logger.info("Conexión a MongoDB inicializada y los índices fueron creados.")
+        init_ingest_buffer(db_manager)
+
+        if STORIES_NOTIFY_MODE == "outbox":
+            if STORIES_SERVICE_URL:
+                dispatcher = OutboxDispatcher(db_manager)
+                dispatcher.start()
+            else:
+                logger.warning("STORIES_SERVICE_URL no configurado. Los eventos quedarán en la outbox.")
+
+        if events_storage_mode == "bucketed":
+            archiver = EventArchiver(db_manager)
+            archiver.start()
         yield
     except Exception as e:
         logger.error(f"Error en la conexión a MongoDB: {e}")
     finally:
-        if db_manager and db_manager.client:
-            db_manager.client.close()
-            logger.info("Conexión a MongoDB cerrada.")
+        # Los eventos en el buffer se escriben antes de detener el despachador y cerrar MongoDB.
+        await close_ingest_buffer()
+        if dispatcher is not None:
+            await dispatcher.stop()
+        if archiver is not None:
+            await archiver.stop()
+        await close_http_client()
+        close_database_manager()
+        logger.info("Conexión a MongoDB cerrada.")
 
 app = FastAPI(
     title="Event Processing API",
@@ -36,3 +58,4 @@ app = FastAPI(
 )
 
 app.include_router(events_router)
+app.include_router(monitoring_router)
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import httpx
+from dotenv import load_dotenv
+from typing import List, Optional
+from async_database_manager import AsyncDatabaseManager
+from event_application import send_events_to_stories_service
+from logging_config import logger
+
+load_dotenv()
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "5000"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1.0"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_BASE_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BASE_BACKOFF_SECONDS", "1.0"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "300"))
+# Intentos fallidos tras los cuales una entrada pasa a `outbox_dead_letter`
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20"))
+# Errores 4xx que sí se reintentan (timeout del servidor y límite de solicitudes)
+RETRYABLE_CLIENT_ERRORS = {408, 429}
+
+
+class OutboxDispatcher:
+    """
+    Tarea en segundo plano que entrega al servicio de historias los eventos encolados en `outbox`.
+
+    Reserva entradas pendientes en lotes, las envía en una sola solicitud y las marca como entregadas al
+    confirmarse la entrega. Si la entrega falla, las entradas vuelven a pendiente con un backoff exponencial
+    hasta `max_attempts` intentos, y luego pasan a `outbox_dead_letter`. Si el servicio de historias rechaza
+    el lote con un 4xx (un evento inválido), el lote se divide en mitades hasta aislar las entradas
+    rechazadas, que pasan directamente a `outbox_dead_letter`; el resto se entrega.
+    """
+
+    def __init__(
+        self,
+        db_manager: AsyncDatabaseManager,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL_SECONDS,
+        lease_seconds: int = OUTBOX_LEASE_SECONDS,
+        base_backoff: float = OUTBOX_BASE_BACKOFF_SECONDS,
+        max_backoff: float = OUTBOX_MAX_BACKOFF_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    ):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Despachador de outbox iniciado.")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        logger.info("Despachador de outbox detenido.")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                delivered = await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Error en el despachador de outbox: {str(e)}", exc_info=True)
+                delivered = 0
+
+            # Mientras haya entradas entregadas se sigue vaciando la cola sin esperar.
+            if not delivered:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch_once(self) -> int:
+        """
+        Reserva un lote de la cola, lo envía y confirma o reprograma las entradas.
+
+        Returns:
+            int: Cantidad de eventos entregados.
+        """
+        entries = await self.db_manager.claim_outbox_batch(self.batch_size, self.lease_seconds)
+        if not entries:
+            return 0
+
+        return await self._deliver(entries)
+
+    async def _deliver(self, entries: List[dict]) -> int:
+        entry_ids = [entry["_id"] for entry in entries]
+        events_json = _entry_events(entries)
+        try:
+            await send_events_to_stories_service(events_json)
+        except Exception as e:
+            if not _is_permanent_rejection(e):
+                await self._retry(entries, str(e))
+                return 0
+            if len(entries) == 1:
+                await self.db_manager.dead_letter_outbox(entry_ids, f"Rechazado por el servicio de historias: {str(e)}")
+                return 0
+            middle = len(entries) // 2
+            return await self._deliver(entries[:middle]) + await self._deliver(entries[middle:])
+
+        await self.db_manager.ack_outbox(entry_ids)
+        logger.info(f"Se entregaron {len(events_json)} eventos al servicio de historias.")
+        return len(events_json)
+
+    async def _retry(self, entries: List[dict], error: str):
+        """
+        Reprograma las entradas con backoff exponencial; las que agotaron los intentos pasan a `outbox_dead_letter`.
+        """
+        exhausted = [entry["_id"] for entry in entries if entry.get("attempts", 0) + 1 >= self.max_attempts]
+        retryable = [entry for entry in entries if entry.get("attempts", 0) + 1 < self.max_attempts]
+        if exhausted:
+            await self.db_manager.dead_letter_outbox(exhausted, f"Se agotaron {self.max_attempts} intentos: {error}")
+        if not retryable:
+            return
+
+        attempts = max(entry.get("attempts", 0) for entry in retryable) + 1
+        backoff = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+        await self.db_manager.retry_outbox([entry["_id"] for entry in retryable], error, backoff)
+        logger.warning(
+            f"No se pudieron entregar {len(retryable)} entradas al servicio de historias "
+            f"(intento {attempts}, reintento en {backoff:.1f}s): {error}"
+        )
+
+
+def _is_permanent_rejection(error: Exception) -> bool:
+    """
+    Un 4xx del servicio de historias (salvo 408 y 429) no se resuelve reintentando el mismo contenido.
+    """
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    status_code = error.response.status_code
+    return 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS
+
+def _entry_events(entries: List[dict]) -> List[dict]:
+    """
+    Eventos de las entradas reservadas: una entrada por evento (`event`) o, en entradas creadas
+    antes de ese formato, una lista de eventos (`events`).
+    """
+    return [event for entry in entries for event in (entry["events"] if "events" in entry else [entry["event"]])]
@@ -1,27 +1,89 @@
-from fastapi import APIRouter, HTTPException, Body, Depends
-from typing import List
-from models.event import Event
-from event_application import process_events
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import ValidationError
+from models.event import parse_events
+from event_application import ingest_event_stream, process_events
+from ingest_buffer import IngestBufferFull, get_ingest_buffer
 from dependencies import get_database_manager
-from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
+from serialization import UnsupportedWireFormat
 from logging_config import logger
 
 router = APIRouter(prefix="/v1/events")
 
-@router.post("/", summary="Procesar eventos")
+@router.post(
+    "/",
+    summary="Procesar eventos",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "Lista de eventos",
+            "content": {"application/json": {"schema": {"type": "array", "items": {"type": "object"}}}},
+        }
+    },
+)
 async def process_events_route(
-    events: List[Event] = Body(..., description="Lista de eventos"),
-    db_manager: DatabaseManager = Depends(get_database_manager),
+    request: Request,
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
 ):
     """
     Procesa eventos, guarda en MongoDB y actualiza sesiones.
+
+    El cuerpo se valida directamente desde los bytes con un `TypeAdapter` precompilado para la lista completa.
+    Si el buffer de ingesta está activo, los eventos se escriben junto con los de otras solicitudes concurrentes;
+    cuando el buffer está lleno se responde 429.
     """
+    try:
+        events = parse_events(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Cuerpo de la solicitud inválido: {str(e)}")
+
     if not events:
         raise HTTPException(status_code=400, detail="No se proporcionaron eventos.")
 
+    ingest_buffer = get_ingest_buffer()
     try:
+        if ingest_buffer is not None:
+            return await ingest_buffer.submit(events)
         result = await process_events(events, db_manager)
         return result
+    except IngestBufferFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiados eventos pendientes de escritura. Reintente más tarde.",
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         logger.error(f"Error procesando eventos: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error interno procesando eventos.")
+
+
+@router.post(
+    "/stream",
+    summary="Procesar eventos en NDJSON",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "Un evento JSON por línea; admite `Content-Encoding: gzip` (y `zstd` si está instalado)",
+            "content": {"application/x-ndjson": {"schema": {"type": "string"}}},
+        }
+    },
+)
+async def process_event_stream_route(
+    request: Request,
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
+):
+    """
+    Procesa cargas grandes de eventos sin leer el cuerpo completo: valida línea por línea, escribe en
+    bloques y responde con los errores de cada línea rechazada.
+    """
+    try:
+        return await ingest_event_stream(request.stream(), db_manager, request.headers.get("content-encoding"))
+    except UnsupportedWireFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Cuerpo de la solicitud inválido: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error procesando eventos NDJSON: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error interno procesando eventos.")
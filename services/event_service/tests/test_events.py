@@ -70,3 +70,635 @@ def test_process_events_success(mock_db_manager, mock_notify_stories_service):
     assert response.json()["status"] == "success"
     assert response.json()["message"] == f"{len(events)} eventos procesados correctamente."
 
+
+def test_process_events_reports_duplicates(mocker, mock_db_manager, mock_notify_stories_service):
+    """
+    Verifica que un evento reenviado se informa como duplicado y no se vuelve a notificar.
+    """
+    event = {
+        "event": "Duplicate Event",
+        "properties": {
+            "distinct_id": "user-dup",
+            "session_id": "session-dup",
+            "$current_url": "https://example.com/page",
+            "$host": "example.com",
+            "$pathname": "/page",
+            "$browser": "Chrome",
+            "$device": "Desktop",
+            "$screen_height": 1080,
+            "$screen_width": 1920,
+            "eventType": "click",
+            "elementType": "button",
+            "elementText": "Submit",
+            "timestamp": "2024-12-31T00:00:00Z",
+            "x": 100,
+            "y": 200,
+            "mouseButton": 0,
+            "ctrlKey": False,
+            "shiftKey": False,
+            "altKey": False,
+            "metaKey": False,
+        },
+        "timestamp": "2024-12-31T00:00:00Z"
+    }
+
+    mocker.patch("event_application.STORIES_NOTIFY_MODE", "inline")
+    client.post("/v1/events/", json=[event])
+    mock_notify_stories_service.reset_mock()
+    response = client.post("/v1/events/", json=[event])
+
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 0
+    assert response.json()["duplicates"] == 1
+    mock_notify_stories_service.assert_not_called()
+
+
+def test_events_are_validated_once_with_datetime_timestamps():
+    """
+    Verifica que los timestamps se guardan como datetime y se serializan en formato canónico.
+    """
+    import json
+    from datetime import datetime
+    from models.event import parse_events
+
+    event = {
+        "event": "Timestamp Event",
+        "properties": {
+            "distinct_id": "user-ts",
+            "session_id": "session-ts",
+            "$current_url": "https://example.com/page",
+            "$host": "example.com",
+            "$pathname": "/page",
+            "$browser": "Chrome",
+            "$device": "Desktop",
+            "$screen_height": 1080,
+            "$screen_width": 1920,
+            "eventType": "click",
+            "elementType": "button",
+            "elementText": "Submit",
+            "timestamp": "2024-12-30T00:00:00.250Z",
+            "x": 100,
+            "y": 200,
+            "mouseButton": 0,
+            "ctrlKey": False,
+            "shiftKey": False,
+            "altKey": False,
+            "metaKey": False,
+        },
+        "timestamp": "2024-12-30T00:00:00.250+00:00"
+    }
+
+    parsed = parse_events(json.dumps([event]).encode("utf-8"))[0]
+
+    assert isinstance(parsed.timestamp, datetime)
+    assert isinstance(parsed.to_document()["timestamp"], datetime)
+    assert parsed.to_json()["timestamp"] == "2024-12-30T00:00:00.250Z"
+
+    event["timestamp"] = "not-a-date"
+    response = client.post("/v1/events/", json=[event])
+    assert response.status_code == 422
+
+
+def test_outbox_dispatcher_retries_and_acknowledges(mocker):
+    """
+    Verifica que el despachador reprograma las entradas ante un fallo y las confirma al entregarlas.
+    """
+    import asyncio
+    from outbox_dispatcher import OutboxDispatcher
+
+    entry = {"_id": "entry-1", "events": [{"event": "e1"}, {"event": "e2"}], "attempts": 0}
+    db_manager = mocker.MagicMock()
+    db_manager.claim_outbox_batch = AsyncMock(return_value=[entry])
+    db_manager.ack_outbox = AsyncMock()
+    db_manager.retry_outbox = AsyncMock()
+    send = mocker.patch(
+        "outbox_dispatcher.send_events_to_stories_service",
+        new=AsyncMock(side_effect=[Exception("story_service caído"), None]),
+    )
+
+    dispatcher = OutboxDispatcher(db_manager, base_backoff=2.0, max_backoff=60.0)
+
+    assert asyncio.run(dispatcher.dispatch_once()) == 0
+    db_manager.retry_outbox.assert_awaited_once_with(["entry-1"], "story_service caído", 2.0)
+    db_manager.ack_outbox.assert_not_called()
+
+    assert asyncio.run(dispatcher.dispatch_once()) == 2
+    send.assert_awaited_with([{"event": "e1"}, {"event": "e2"}])
+    db_manager.ack_outbox.assert_awaited_once_with(["entry-1"])
+
+
+def test_outbox_dispatcher_dead_letters_rejected_and_exhausted_entries(mocker):
+    """
+    Verifica que un 4xx aísla la entrada rechazada (el resto se entrega) y que una entrada que agotó
+    los intentos pasa a la cola de descartes en lugar de reintentarse.
+    """
+    import asyncio
+    import httpx
+    from outbox_dispatcher import OutboxDispatcher
+
+    entries = [{"_id": f"entry-{index}", "event": {"event": f"e{index}"}, "attempts": 0} for index in range(4)]
+
+    async def send(events_json):
+        if {"event": "e2"} in events_json:
+            request = httpx.Request("POST", "http://story_service/v1/stories/")
+            raise httpx.HTTPStatusError("422", request=request, response=httpx.Response(422, request=request))
+
+    db_manager = mocker.MagicMock()
+    db_manager.claim_outbox_batch = AsyncMock(return_value=entries)
+    db_manager.ack_outbox = AsyncMock()
+    db_manager.retry_outbox = AsyncMock()
+    db_manager.dead_letter_outbox = AsyncMock()
+    mocker.patch("outbox_dispatcher.send_events_to_stories_service", new=AsyncMock(side_effect=send))
+
+    dispatcher = OutboxDispatcher(db_manager, max_attempts=3)
+    assert asyncio.run(dispatcher.dispatch_once()) == 3
+    acked = [entry_id for call in db_manager.ack_outbox.await_args_list for entry_id in call.args[0]]
+    assert sorted(acked) == ["entry-0", "entry-1", "entry-3"]
+    assert db_manager.dead_letter_outbox.await_args.args[0] == ["entry-2"]
+    db_manager.retry_outbox.assert_not_called()
+
+    db_manager.dead_letter_outbox.reset_mock()
+    db_manager.claim_outbox_batch = AsyncMock(return_value=[
+        {"_id": "entry-old", "event": {"event": "e"}, "attempts": 2},
+        {"_id": "entry-new", "event": {"event": "e"}, "attempts": 0},
+    ])
+    mocker.patch("outbox_dispatcher.send_events_to_stories_service", new=AsyncMock(side_effect=Exception("caído")))
+    assert asyncio.run(dispatcher.dispatch_once()) == 0
+    assert db_manager.dead_letter_outbox.await_args.args[0] == ["entry-old"]
+    assert db_manager.retry_outbox.await_args.args[0] == ["entry-new"]
+
+
+def test_database_manager_is_shared_across_requests():
+    """
+    Verifica que todas las solicitudes reutilizan el mismo DatabaseManager y exponen las métricas del pool.
+    """
+    from dependencies import get_database_manager
+    from monitoring import router as monitoring_router
+
+    assert get_database_manager() is get_database_manager()
+
+    monitoring_app = FastAPI()
+    monitoring_app.include_router(monitoring_router)
+    response = TestClient(monitoring_app).get("/metrics/db-pool")
+
+    assert response.status_code == 200
+    for key in ("checked_out", "waiters", "creation_rate_per_second"):
+        assert key in response.json()
+
+    # Las estadísticas de la caché consultan Redis: se sirven desde el pool de hilos.
+    assert TestClient(monitoring_app).get("/metrics/story-cache").status_code == 200
+
+def test_async_database_manager_overlaps_blocking_calls():
+    """
+    Verifica que en modo threadpool dos operaciones bloqueantes concurrentes se solapan.
+    """
+    import asyncio
+    import time
+    from async_database_manager import AsyncDatabaseManager
+
+    class SlowManager:
+        def bulk_save_events(self, events):
+            time.sleep(0.2)
+            return len(events)
+
+        def close(self):
+            pass
+
+    async def run_concurrently():
+        async_manager = AsyncDatabaseManager(SlowManager(), mode="threadpool", max_workers=2)
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            async_manager.bulk_save_events([1]),
+            async_manager.bulk_save_events([1, 2]),
+        )
+        elapsed = time.perf_counter() - start
+        async_manager.close()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run_concurrently())
+
+    assert results == [1, 2]
+    assert elapsed < 0.35
+
+
+def test_session_registry_tracks_sessions_per_batch(mocker):
+    """
+    Verifica que cada sesión tiene su propio documento con usuario, primer/último evento y conteo,
+    y que los eventos reenviados no se cuentan dos veces.
+    """
+    from datetime import datetime, timezone
+    from dependencies import get_database_manager
+
+    def build_event(session_id, timestamp):
+        return {
+            "event": "Registry Event",
+            "properties": {
+                "distinct_id": "user-registry",
+                "session_id": session_id,
+                "$current_url": "https://example.com/page",
+                "$host": "example.com",
+                "$pathname": "/page",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "button",
+                "elementText": "Submit",
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False,
+            },
+            "timestamp": timestamp
+        }
+
+    mocker.patch("event_application.STORIES_NOTIFY_MODE", "inline")
+    mocker.patch("event_application.notify_stories_service", new=AsyncMock())
+    first = [build_event("registry-a", "2024-03-01T10:00:00Z"), build_event("registry-a", "2024-03-01T10:05:00Z")]
+    second = first[:1] + [build_event("registry-a", "2024-03-01T09:55:00Z"), build_event("registry-b", "2024-03-02T08:00:00Z")]
+    assert client.post("/v1/events/", json=first).status_code == 200
+    assert client.post("/v1/events/", json=second).status_code == 200
+
+    db_manager = get_database_manager().db_manager
+    sessions = {session["session_id"]: session for session in db_manager.get_sessions_by_distinct_id("user-registry")}
+    assert list(sessions) == ["registry-b", "registry-a"]  # Más reciente primero
+    assert sessions["registry-a"]["event_count"] == 3
+    assert sessions["registry-a"]["first_seen"].replace(tzinfo=timezone.utc) == datetime(2024, 3, 1, 9, 55, tzinfo=timezone.utc)
+    assert sessions["registry-a"]["last_seen"].replace(tzinfo=timezone.utc) == datetime(2024, 3, 1, 10, 5, tzinfo=timezone.utc)
+    assert db_manager.get_distinct_id_by_session_id("registry-b") == "user-registry"
+
+
+def test_bucketed_events_are_archived_and_still_readable(tmp_path):
+    """
+    Verifica que en modo `bucketed` los eventos se guardan por mes, que los meses vencidos se archivan
+    y eliminan de MongoDB (también los que llegan tarde o quedaron de un archivado interrumpido) y que
+    `get_events_by_sessions` sigue devolviéndolos desde el archivo.
+    """
+    from datetime import datetime, timezone
+    from database_manager import DatabaseManager
+
+    def build_event(session_id, timestamp):
+        return Event(**{
+            "event": "Bucket Event",
+            "properties": {
+                "distinct_id": "user-bucket",
+                "session_id": session_id,
+                "$current_url": "https://example.com/page",
+                "$host": "example.com",
+                "$pathname": "/page",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "button",
+                "elementText": "Submit",
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False,
+            },
+            "timestamp": timestamp
+        })
+
+    db_manager = DatabaseManager(
+        uri="mongodb://localhost:27017",
+        db_name="bucketed_events_test",
+        events_storage_mode="bucketed",
+        events_hot_retention_days=30,
+        events_archive_dir=str(tmp_path),
+    )
+    events = [
+        build_event("bucket-old", "2024-01-10T10:00:00Z"),
+        build_event("bucket-old", "2024-01-31T23:59:59Z"),
+        build_event("bucket-new", "2024-03-05T10:00:00Z"),
+    ]
+    assert db_manager.bulk_save_events(events)["inserted"] == 3
+    assert db_manager.bulk_save_events(events[:1])["duplicates"] == 1
+    assert db_manager.list_event_buckets() == ["events_202401", "events_202403"]
+
+    archived = db_manager.archive_expired_event_buckets(now=datetime(2024, 3, 15, tzinfo=timezone.utc))
+    assert archived == [{"bucket": "events_202401", "archived": 2}]
+    assert db_manager.list_event_buckets() == ["events_202403"]
+
+    found = db_manager.get_events_by_sessions(["bucket-old", "bucket-new"])
+    assert sorted(event["properties"]["session_id"] for event in found) == ["bucket-new", "bucket-old", "bucket-old"]
+    assert all(isinstance(event["timestamp"], datetime) for event in found)
+
+    # Un evento tardío vuelve a crear el período archivado: la colección nueva tiene el índice único
+    # y se archiva aparte en la siguiente ejecución, sin sobrescribir el archivo anterior.
+    late = build_event("bucket-late", "2024-01-20T10:00:00Z")
+    assert db_manager.bulk_save_events([late])["inserted"] == 1
+    assert db_manager.bulk_save_events([late])["duplicates"] == 1
+    # Una copia que quedó de un archivado interrumpido se retoma.
+    db_manager.get_collection("events_202401").rename("archiving_events_202401_0abc")
+    assert db_manager.list_archiving_buckets() == ["archiving_events_202401_0abc"]
+    assert len(db_manager.get_events_by_sessions(["bucket-late"])) == 1
+    archived = db_manager.archive_expired_event_buckets(now=datetime(2024, 3, 15, tzinfo=timezone.utc))
+    assert archived == [{"bucket": "events_202401", "archived": 1}]
+    assert db_manager.list_archiving_buckets() == []
+    assert len(db_manager.get_events_by_sessions(["bucket-old", "bucket-late"])) == 3
+    db_manager.close()
+
+
+def test_ingest_buffer_coalesces_concurrent_requests(mocker):
+    """
+    Verifica que las solicitudes concurrentes se escriben en un solo lote con una sola notificación,
+    que cada una recibe sus propios conteos, que se responde 429 al llenarse y que el cierre escribe lo pendiente.
+    """
+    import asyncio
+    from ingest_buffer import IngestBuffer, IngestBufferFull
+
+    def build_event(second):
+        timestamp = f"2024-05-01T00:00:{second:02d}Z"
+        return Event(**{
+            "event": "Buffered Event",
+            "properties": {
+                "distinct_id": "user-buffer",
+                "session_id": "session-buffer",
+                "$current_url": "https://example.com/page",
+                "$host": "example.com",
+                "$pathname": "/page",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "button",
+                "elementText": "Submit",
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False,
+            },
+            "timestamp": timestamp
+        })
+
+    shared = build_event(1)
+    db_manager = mocker.MagicMock()
+    # El mismo evento llega en dos solicitudes: en el lote combinado la segunda aparición es duplicada.
+    async def save_events(events):
+        await asyncio.sleep(0)  # Como una escritura real, cede el event loop.
+        return {"duplicate_ids": [shared.event_id()]}
+
+    db_manager.bulk_save_events = AsyncMock(side_effect=save_events)
+    db_manager.bulk_upsert_sessions = AsyncMock()
+    db_manager.enqueue_outbox = AsyncMock()
+    mocker.patch("event_application.STORIES_NOTIFY_MODE", "outbox")
+
+    async def scenario():
+        ingest_buffer = IngestBuffer(db_manager, max_events=100, max_delay=0.05, max_pending=5)
+        results = await asyncio.gather(
+            ingest_buffer.submit([shared, build_event(2)]),
+            ingest_buffer.submit([shared]),
+            ingest_buffer.submit([build_event(3)]),
+        )
+        assert db_manager.bulk_save_events.await_count == 1
+        assert len(db_manager.bulk_save_events.await_args.args[0]) == 4
+        assert db_manager.enqueue_outbox.await_count == 1
+        assert len(db_manager.enqueue_outbox.await_args.args[0]) == 3
+
+        pending = asyncio.ensure_future(ingest_buffer.submit([build_event(4), build_event(5), build_event(6)]))
+        await asyncio.sleep(0)
+        try:
+            await ingest_buffer.submit([build_event(7), build_event(8), build_event(9)])
+            rejected = False
+        except IngestBufferFull:
+            rejected = True
+        await ingest_buffer.close()  # Escribe el lote pendiente sin esperar `max_delay`
+        last = await pending
+
+        # Una solicitud que ya llena un lote se escribe directamente aunque supere `max_pending`,
+        # y con el buffer vacío se acepta cualquier solicitud.
+        small_buffer = IngestBuffer(db_manager, max_events=8, max_delay=0.05, max_pending=5)
+        direct = await small_buffer.submit([build_event(second) for second in range(10, 18)])
+        admitted = await small_buffer.submit([build_event(second) for second in range(20, 26)])
+        # Las escrituras directas en curso también cuentan para `max_pending`.
+        first_direct = asyncio.ensure_future(small_buffer.submit([build_event(second) for second in range(30, 38)]))
+        await asyncio.sleep(0)
+        try:
+            await small_buffer.submit([build_event(second) for second in range(40, 48)])
+            direct_rejected = False
+        except IngestBufferFull:
+            direct_rejected = True
+        await first_direct
+        await small_buffer.close()
+        return results, rejected, last, direct, admitted, direct_rejected, small_buffer.stats
+
+    results, rejected, last, direct, admitted, direct_rejected, stats = asyncio.run(scenario())
+
+    assert [(result["inserted"], result["duplicates"]) for result in results] == [(2, 0), (0, 1), (1, 0)]
+    assert rejected
+    assert last["inserted"] == 3
+    assert direct["inserted"] == 8
+    assert admitted["inserted"] == 6
+    assert direct_rejected
+    assert (stats["direct"], stats["rejected"]) == (2, 1)
+    assert db_manager.bulk_save_events.await_count == 5
+
+
+def test_ndjson_stream_ingests_in_chunks_and_reports_line_errors(mocker):
+    """
+    Verifica que `POST /v1/events/stream` acepta NDJSON comprimido con gzip, escribe por bloques
+    e informa los errores con su número de línea.
+    """
+    import gzip
+    import json
+
+    def build_event(second):
+        timestamp = f"2024-06-01T00:00:{second:02d}Z"
+        return {
+            "event": "Stream Event",
+            "properties": {
+                "distinct_id": "user-stream",
+                "session_id": "session-stream",
+                "$current_url": "https://example.com/page",
+                "$host": "example.com",
+                "$pathname": "/page",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "button",
+                "elementText": "Submit",
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False,
+            },
+            "timestamp": timestamp
+        }
+
+    lines = [json.dumps(build_event(second)) for second in range(1, 6)]
+    lines.insert(2, "")                                   # Línea 3: en blanco, se ignora
+    lines.insert(3, "{not json")                          # Línea 4: JSON inválido
+    lines.append(json.dumps({"event": "Sin propiedades"}))  # Línea 8: faltan campos
+    body = gzip.compress("\n".join(lines).encode("utf-8"))
+
+    mocker.patch("event_application.STORIES_NOTIFY_MODE", "outbox")
+    mocker.patch("event_application.EVENTS_STREAM_CHUNK_SIZE", 2)
+    from dependencies import get_database_manager
+    save_spy = mocker.spy(get_database_manager().db_manager, "bulk_save_events")
+
+    response = client.post(
+        "/v1/events/stream",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["lines"], result["accepted"], result["inserted"], result["rejected"]) == (8, 5, 5, 2)
+    assert [error["line"] for error in result["errors"]] == [4, 8]
+    assert not result["errors_truncated"]
+    assert [len(call.args[0]) for call in save_spy.call_args_list] == [2, 2, 1]
+
+    response = client.post("/v1/events/stream", content=b"{}", headers={"Content-Encoding": "br"})
+    assert response.status_code == 415
+
+    corrupt = bytearray(body)
+    corrupt[20:30] = b"\xff" * 10
+    response = client.post("/v1/events/stream", content=bytes(corrupt), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 400
+    response = client.post("/v1/events/stream", content=body[:-10], headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 400
+
+
+def test_retry_after_failed_enqueue_still_notifies(mocker):
+    """
+    Verifica que si los eventos se guardan pero la outbox falla, el reintento del cliente (que los ve
+    como duplicados) los encola igual, una sola vez por evento, y que la outbox se reserva y confirma por evento.
+    """
+    from dependencies import get_database_manager
+
+    event = {
+        "event": "Outbox Retry Event",
+        "properties": {
+            "distinct_id": "user-outbox-retry",
+            "session_id": "session-outbox-retry",
+            "$current_url": "https://example.com/page",
+            "$host": "example.com",
+            "$pathname": "/page",
+            "$browser": "Chrome",
+            "$device": "Desktop",
+            "$screen_height": 1080,
+            "$screen_width": 1920,
+            "eventType": "click",
+            "elementType": "button",
+            "elementText": "Submit",
+            "timestamp": "2024-07-01T00:00:00Z",
+            "x": 1,
+            "y": 1,
+            "mouseButton": 0,
+            "ctrlKey": False,
+            "shiftKey": False,
+            "altKey": False,
+            "metaKey": False,
+        },
+        "timestamp": "2024-07-01T00:00:00Z"
+    }
+    event_id = Event(**event).event_id()
+    mocker.patch("event_application.STORIES_NOTIFY_MODE", "outbox")
+    db_manager = get_database_manager().db_manager
+    outbox = db_manager.get_collection("outbox")
+    outbox.delete_many({})
+
+    with patch.object(db_manager, "enqueue_outbox", side_effect=Exception("outbox caída")):
+        assert client.post("/v1/events/", json=[event]).status_code == 500
+    assert outbox.count_documents({"_id": event_id}) == 0
+
+    for _ in range(2):
+        response = client.post("/v1/events/", json=[event])
+        assert response.status_code == 200
+        assert response.json()["duplicates"] == 1
+    assert outbox.count_documents({}) == 1
+    assert outbox.find_one({"_id": event_id})["status"] == "pending"
+
+    claimed = db_manager.claim_outbox_batch(10, 60)
+    assert [entry["_id"] for entry in claimed] == [event_id]
+    assert db_manager.claim_outbox_batch(10, 60) == []
+    db_manager.ack_outbox([event_id])
+
+    client.post("/v1/events/", json=[event])  # Reenvío posterior a la entrega: no se vuelve a encolar
+    assert outbox.find_one({"_id": event_id})["status"] == "delivered"
+
+
+def test_migrate_legacy_events_enables_deduplication():
+    """
+    Verifica que `migrate-events` reescribe los eventos con timestamps de texto (con `_id` de ObjectId o el
+    `_id` calculado sobre el texto) al formato actual, descarta los repetidos y que un reenvío posterior del
+    mismo evento se detecta como duplicado.
+    """
+    from datetime import datetime
+    from bson import ObjectId
+    from database_manager import DatabaseManager
+
+    def legacy_document(timestamp, **extra):
+        return {
+            "event": "Legacy Event",
+            "properties": {
+                "distinct_id": "user-legacy",
+                "session_id": "session-legacy",
+                "$current_url": "https://example.com/page",
+                "$host": "example.com",
+                "$pathname": "/page",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "button",
+                "elementText": "Submit",
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False,
+            },
+            "timestamp": timestamp,
+            **extra,
+        }
+
+    db_manager = DatabaseManager(uri="mongodb://localhost:27017", db_name="legacy_events_test")
+    db_manager.create_indexes()
+    events_collection = db_manager.get_collection("events")
+    events_collection.insert_many([
+        legacy_document("2024-01-10T10:00:00Z", _id=ObjectId()),
+        # El mismo instante con otro formato de texto (y el `_id` calculado sobre el texto): es el mismo evento.
+        legacy_document("2024-01-10T10:00:00.000+00:00", _id="legacy-sha1"),
+        legacy_document("2024-01-11T10:00:00Z", _id=ObjectId()),
+        legacy_document("no-es-una-fecha", _id=ObjectId()),
+    ])
+
+    summary = db_manager.migrate_legacy_events(batch_size=2)
+    assert summary == {"migrated": 2, "duplicates": 1, "invalid": 1}
+    assert events_collection.count_documents({}) == 3
+    migrated = list(events_collection.find({"timestamp": {"$type": "date"}}))
+    assert len(migrated) == 2
+    assert all(isinstance(event["properties"]["timestamp"], datetime) for event in migrated)
+    assert db_manager.migrate_legacy_events() == {"migrated": 0, "duplicates": 0, "invalid": 1}
+
+    resent = Event(**legacy_document("2024-01-10T10:00:00Z"))
+    assert db_manager.bulk_save_events([resent]) == {"inserted": 0, "duplicates": 1, "duplicate_ids": [resent.event_id()]}
+    db_manager.close()
@@ -0,0 +1,105 @@
+"""
+Tareas de mantenimiento del servicio de historias.
+
+Uso:
+    python cli.py rebuild-pattern-counts
+    python cli.py backfill-stories [--workers N | --partition I --partitions N] [--resume] [--users-per-batch N]
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dependencies import init_database_manager, close_database_manager
+from story_application import BACKFILL_USERS_PER_BATCH, PATTERNS_MODE, backfill_stories, rebuild_pattern_counts
+
+
+async def rebuild() -> int:
+    """
+    Recalcula la vista materializada `pattern_counts` a partir de todas las historias.
+    """
+    db_manager = init_database_manager()
+    try:
+        await db_manager.create_indexes()
+        return await rebuild_pattern_counts(db_manager)
+    finally:
+        close_database_manager()
+
+
+async def backfill(partition: int, partitions: int, resume: bool, users_per_batch: int) -> dict:
+    """
+    Reconstruye las historias de una partición de usuarios desde la colección de eventos.
+    """
+    db_manager = init_database_manager()
+    try:
+        await db_manager.create_indexes()
+        return await backfill_stories(
+            db_manager, partition=partition, partitions=partitions, resume=resume, users_per_batch=users_per_batch
+        )
+    finally:
+        close_database_manager()
+
+
+def _backfill_partition(partition: int, partitions: int, resume: bool, users_per_batch: int) -> dict:
+    """
+    Tarea de cada proceso: abre su propio cliente de MongoDB y recorre su partición.
+    """
+    return asyncio.run(backfill(partition, partitions, resume, users_per_batch))
+
+
+def run_backfill(args) -> list:
+    if args.partition is not None:
+        return [_backfill_partition(args.partition, args.partitions, args.resume, args.users_per_batch)]
+    if args.workers <= 1:
+        return [_backfill_partition(0, 1, args.resume, args.users_per_batch)]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(_backfill_partition, partition, args.workers, args.resume, args.users_per_batch)
+            for partition in range(args.workers)
+        ]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Herramientas del servicio de historias.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "rebuild-pattern-counts",
+        help="Recalcula pattern_counts desde las historias (backfills o cambios en las reglas).",
+    )
+    backfill_parser = subparsers.add_parser(
+        "backfill-stories", help="Reconstruye las historias a partir de los eventos guardados."
+    )
+    backfill_parser.add_argument("--workers", type=int, default=1, help="Procesos, cada uno con una partición de usuarios.")
+    backfill_parser.add_argument("--partition", type=int, default=None, help="Procesa solo esta partición (entre 0 y --partitions - 1).")
+    backfill_parser.add_argument("--partitions", type=int, default=1, help="Cantidad total de particiones cuando se usa --partition.")
+    backfill_parser.add_argument("--resume", action="store_true", help="Continúa desde el último punto de control.")
+    backfill_parser.add_argument(
+        "--users-per-batch", type=int, default=BACKFILL_USERS_PER_BATCH, help="Usuarios por escritura y punto de control."
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "backfill-stories":
+        if args.partition is not None and not 0 <= args.partition < args.partitions:
+            parser.error("--partition debe estar entre 0 y --partitions - 1")
+        summaries = run_backfill(args)
+        users = sum(summary["users"] for summary in summaries)
+        events = sum(summary["events"] for summary in summaries)
+        print(f"{users} historias reconstruidas desde {events} eventos en {time.perf_counter() - start:.1f}s")
+        if PATTERNS_MODE != "materialized":
+            return
+        if args.partition is not None:
+            # Las demás particiones pueden seguir corriendo en otras máquinas: recalcular acá dejaría conteos
+            # parciales y repetiría el trabajo en cada una. Se recalcula una vez, al terminar todas.
+            print("Al terminar todas las particiones ejecutar: python cli.py rebuild-pattern-counts")
+            return
+        written = asyncio.run(rebuild())
+        print(f"{written} conteos de patrones recalculados")
+        return
+
+    written = asyncio.run(rebuild())
+    print(f"{written} conteos de patrones escritos en {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
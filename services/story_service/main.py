@@ -1,13 +1,11 @@
 from fastapi import FastAPI, Request
 from routes.v1.stories import router as stories_router
-from database_manager import DatabaseManager
+from monitoring import router as monitoring_router
+from dependencies import init_database_manager, close_database_manager
+from story_application import warn_if_pattern_counts_missing
 from logging_config import logger
-import os
 from contextlib import asynccontextmanager
 
-db_uri = os.getenv("DB_URI")
-db_name = os.getenv("DB_NAME")
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -16,19 +14,18 @@ async def lifespan(app: FastAPI):
     Args:
         app (FastAPI): Instancia de la aplicación FastAPI.
     """
-    global db_manager
     try:
         logger.info("Inicializando conexión a MongoDB...")
-        db_manager = DatabaseManager(uri=db_uri, db_name=db_name)
-        db_manager.create_indexes()
+        db_manager = init_database_manager()
+        await db_manager.create_indexes()
         logger.info("Conexión a MongoDB inicializada y los índices fueron creados.")
+        await warn_if_pattern_counts_missing(db_manager)
         yield
     except Exception as e:
         logger.error(f"Error en la conexión a MongoDB: {e}", exc_info=True)
     finally:
-        if db_manager and db_manager.client:
-            db_manager.client.close()
-            logger.info("Conexión a MongoDB cerrada.")
+        close_database_manager()
+        logger.info("Conexión a MongoDB cerrada.")
 
 app = FastAPI(
     title="Story Service API",
@@ -57,3 +54,4 @@ async def log_requests(request: Request, call_next):
         raise e
 
 app.include_router(stories_router)
+app.include_router(monitoring_router)
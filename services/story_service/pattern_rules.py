@@ -0,0 +1,240 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+from pydantic import BaseModel, TypeAdapter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from models.story import Story
+from logging_config import logger
+
+load_dotenv()
+
+# Archivo JSON opcional con la tabla de reglas (lista de objetos `PatternRule`); sin él se usa `DEFAULT_PATTERN_RULES`
+PATTERN_RULES_FILE = os.getenv("PATTERN_RULES_FILE")
+
+
+class PatternRule(BaseModel):
+    """
+    Regla declarativa de detección de patrones sobre una acción.
+
+    Una acción cumple la regla si su tipo es `action_type` y se cumplen todos los predicados definidos.
+    """
+    name: str
+    action_type: str
+    target_contains: Optional[str] = None
+    target_equals: Optional[str] = None
+    value_equals: Optional[str] = None
+    value_in: Optional[List[str]] = None
+    value_present: Optional[bool] = None  # True: la acción tiene valor; False: no lo tiene
+
+
+# Equivalente a la cadena if/elif original. Dentro de un mismo tipo de acción el orden importa:
+# cada acción cuenta solo para la primera regla que cumple.
+DEFAULT_PATTERN_RULES = [
+    PatternRule(name="login", action_type="input", target_contains="login"),
+    PatternRule(name="checkout", action_type="click", target_contains="checkout"),
+    PatternRule(name="search", action_type="navigation", target_contains="search"),
+    PatternRule(name="navigation_to_section", action_type="click", target_equals="a", value_in=["User Stories", "Test Cases"]),
+    PatternRule(name="interaction_with_highlighted_content", action_type="click", target_equals="div", value_present=True),
+    PatternRule(name="repeated_click", action_type="click", value_equals="Test Cases"),
+    PatternRule(name="ui_icon_interaction", action_type="click", target_equals="svg"),
+    PatternRule(name="ambiguous_interaction", action_type="click", value_present=False),
+]
+
+Predicate = Callable[[Optional[str], Optional[str]], bool]
+CompiledRules = Tuple[Tuple[str, Predicate], ...]  # (nombre, predicado) en el orden de la tabla
+
+_ANY = object()  # Predicado no definido en la regla
+
+
+def _rule_predicate(rule: PatternRule) -> Predicate:
+    """
+    Construye la función `(target, value) -> bool` de una regla, con sus valores ya ligados.
+    Los predicados que la regla no define se saltean con una comparación de identidad.
+    """
+    contains = _ANY if rule.target_contains is None else rule.target_contains
+    target_equals = _ANY if rule.target_equals is None else rule.target_equals
+    value_equals = _ANY if rule.value_equals is None else rule.value_equals
+    value_in = _ANY if rule.value_in is None else frozenset(rule.value_in)
+    value_present = _ANY if rule.value_present is None else rule.value_present
+
+    def predicate(target: Optional[str], value: Optional[str]) -> bool:
+        return (
+            (contains is _ANY or (target is not None and contains in target))
+            and (target_equals is _ANY or target == target_equals)
+            and (value_equals is _ANY or value == value_equals)
+            and (value_in is _ANY or value in value_in)
+            and (value_present is _ANY or bool(value) is value_present)
+        )
+
+    return predicate
+
+
+def _field(name: str) -> dict:
+    """
+    Valor de un campo de la acción desplegada, con null si falta (igual que `dict.get`).
+    """
+    return {"$ifNull": [f"$actions.{name}", None]}
+
+
+def _rule_expression(rule: PatternRule) -> dict:
+    """
+    Traduce una regla a una expresión de agregación equivalente a sus predicados.
+    Los valores de la regla van dentro de `$literal` para que no se interpreten como rutas de campos.
+    """
+    conditions: List[dict] = [{"$eq": ["$actions.type", {"$literal": rule.action_type}]}]
+    if rule.target_contains is not None:
+        conditions.append({"$ne": [_field("target"), None]})
+        conditions.append({
+            "$regexMatch": {"input": {"$ifNull": ["$actions.target", ""]}, "regex": re.escape(rule.target_contains)}
+        })
+    if rule.target_equals is not None:
+        conditions.append({"$eq": [_field("target"), {"$literal": rule.target_equals}]})
+    if rule.value_equals is not None:
+        conditions.append({"$eq": [_field("value"), {"$literal": rule.value_equals}]})
+    if rule.value_in is not None:
+        conditions.append({"$in": [_field("value"), {"$literal": list(rule.value_in)}]})
+    if rule.value_present is True:
+        conditions.extend([{"$ne": [_field("value"), None]}, {"$ne": [_field("value"), ""]}])
+    elif rule.value_present is False:
+        conditions.append({"$in": [_field("value"), [None, ""]]})
+    return {"$and": conditions}
+
+
+class PatternEngine:
+    """
+    Motor de reglas: indexa las reglas por tipo de acción, con sus predicados ya construidos, para que cada acción
+    solo evalúe las reglas que le aplican, y lleva un contador de aciertos por regla.
+    """
+
+    def __init__(self, rules: Iterable[PatternRule]):
+        self.rules = list(rules)
+        rules_by_type: Dict[str, List[PatternRule]] = {}
+        for rule in self.rules:
+            rules_by_type.setdefault(rule.action_type, []).append(rule)
+        self._dispatch: Dict[str, CompiledRules] = {
+            action_type: tuple((rule.name, _rule_predicate(rule)) for rule in type_rules)
+            for action_type, type_rules in rules_by_type.items()
+        }
+        self._hits: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def match(self, action_type: Optional[str], target: Optional[str], value: Optional[str]) -> Optional[str]:
+        """
+        Devuelve el nombre de la primera regla que cumple la acción, o None.
+        """
+        for name, predicate in self._dispatch.get(action_type, ()):
+            if predicate(target, value):
+                return name
+        return None
+
+    def identify(self, stories: Iterable[Union[Story, dict]]) -> Dict[str, Dict[str, int]]:
+        """
+        Cuenta, por patrón y por historia, las acciones que cumplen alguna regla.
+
+        Args:
+            stories (Iterable[Union[Story, dict]]): Historias como instancias de `Story` o documentos de MongoDB.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Patrones detectados organizados por tipo.
+        """
+        patterns: Dict[str, Dict[str, int]] = {}
+        hits: Counter = Counter()
+        dispatch = self._dispatch
+
+        for story in stories:
+            story_hits: Dict[str, int] = {}
+            for story_id, action_type, target, value in _iter_actions(story):
+                for name, predicate in dispatch.get(action_type, ()):
+                    if predicate(target, value):
+                        story_hits[name] = story_hits.get(name, 0) + 1
+                        break
+            for name, count in story_hits.items():
+                by_story = patterns.setdefault(name, {})
+                by_story[story_id] = by_story.get(story_id, 0) + count
+            hits.update(story_hits)
+
+        with self._lock:
+            self._hits.update(hits)
+        return patterns
+
+    def stats(self) -> List[dict]:
+        """
+        Tabla de reglas con la cantidad de acciones que cumplió cada una desde el inicio del proceso.
+        """
+        with self._lock:
+            return [dict(rule.model_dump(exclude_none=True), hits=self._hits[rule.name]) for rule in self.rules]
+
+    def aggregation_pipeline(self, query: Optional[dict] = None) -> List[dict]:
+        """
+        Construye el pipeline de agregación que calcula en MongoDB el mismo resultado que `identify`.
+
+        Cada acción se despliega con `$unwind`, un `$switch` con las reglas en orden le asigna el primer
+        patrón que cumple, y `$group` cuenta por patrón e historia. Solo los conteos salen de la base.
+
+        Args:
+            query (Optional[dict]): Filtro de historias (p. ej. por `session_id`).
+
+        Returns:
+            List[dict]: Etapas del pipeline; cada resultado tiene `_id: {pattern, story_id}` y `count`.
+        """
+        branches = [
+            {"case": _rule_expression(rule), "then": {"$literal": rule.name}}
+            for rule in self.rules
+        ]
+        return [
+            {"$match": query or {}},
+            {"$project": {"_id": 0, "id": 1, "actions.type": 1, "actions.target": 1, "actions.value": 1}},
+            {"$unwind": "$actions"},
+            {"$match": {"actions.type": {"$in": list(self._dispatch)}}},
+            {"$project": {"story_id": "$id", "pattern": {"$switch": {"branches": branches, "default": None}}}},
+            {"$match": {"pattern": {"$ne": None}}},
+            {"$group": {"_id": {"pattern": "$pattern", "story_id": "$story_id"}, "count": {"$sum": 1}}},
+        ]
+
+    def collect_aggregation(self, results: Iterable[dict]) -> Dict[str, Dict[str, int]]:
+        """
+        Convierte los resultados de `aggregation_pipeline` al formato de `identify` y actualiza los contadores.
+        """
+        patterns: Dict[str, Dict[str, int]] = {}
+        hits: Counter = Counter()
+        for result in results:
+            pattern, story_id = result["_id"]["pattern"], result["_id"]["story_id"]
+            patterns.setdefault(pattern, {})[story_id] = result["count"]
+            hits[pattern] += result["count"]
+        with self._lock:
+            self._hits.update(hits)
+        return patterns
+
+
+def _iter_actions(story: Union[Story, dict]):
+    """
+    Recorre las acciones de una historia como tuplas `(story_id, type, target, value)` sin reconstruir modelos.
+    """
+    if isinstance(story, Story):
+        for action in story.actions:
+            yield story.id, action.type, action.target, action.value
+        return
+    if not isinstance(story, dict) or "id" not in story:
+        logger.warning(f"Historia no válida encontrada: {story}")
+        return
+    story_id = story["id"]
+    for action in story.get("actions") or ():
+        yield story_id, action.get("type"), action.get("target"), action.get("value")
+
+
+def load_pattern_rules(path: Optional[str] = PATTERN_RULES_FILE) -> List[PatternRule]:
+    """
+    Carga la tabla de reglas desde `path` (JSON) o devuelve la tabla por defecto.
+    """
+    if not path:
+        return list(DEFAULT_PATTERN_RULES)
+    with open(path, "r", encoding="utf-8") as rules_file:
+        rules = TypeAdapter(List[PatternRule]).validate_python(json.load(rules_file))
+    logger.info(f"Se cargaron {len(rules)} reglas de patrones desde {path}.")
+    return rules
+
+
+pattern_engine = PatternEngine(load_pattern_rules())
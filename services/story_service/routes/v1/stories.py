@@ -1,13 +1,22 @@
 from logging_config import logger
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Optional, List
-from models.event import Event
-from database_manager import DatabaseManager
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from pydantic import ValidationError
+from models.event import parse_events
+from serialization import JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, UnsupportedWireFormat, decode_payload
+from async_database_manager import AsyncDatabaseManager
 from dependencies import get_database_manager
+from pattern_rules import pattern_engine
 from story_application import (
     get_stories,
+    get_stories_page,
+    stream_stories,
     post_stories,
+    PatternCountsRebuilding,
     get_patterns,
+    get_frequent_sequences,
+    get_funnel,
 )
 
 router = APIRouter(prefix="/v1/stories")
@@ -16,14 +25,27 @@ router = APIRouter(prefix="/v1/stories")
 async def get_stories_endpoint(
     session_id: Optional[str] = None,
     story_id: Optional[str] = None,
-    db_manager: DatabaseManager = Depends(get_database_manager),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página (activa la paginación)"),
+    after: Optional[str] = Query(None, description="`id` de la última historia de la página anterior"),
+    stream: bool = Query(False, description="Emitir las historias como NDJSON desde el cursor"),
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
 ):
     """
     Obtiene historias de usuario desde la base de datos.
+
+    Con `limit` responde una página ordenada por `id` y el cursor `next_after` de la siguiente.
+    Con `stream=true` emite todas las historias como NDJSON sin construir la lista completa en memoria.
     """
     try:
         logger.info(f"Recibiendo solicitud GET /v1/stories con session_id={session_id} y story_id={story_id}")
 
+        if stream and not story_id:
+            return StreamingResponse(stream_stories(db_manager, session_id), media_type="application/x-ndjson")
+
+        if limit and not story_id:
+            stories, next_after = await get_stories_page(db_manager, limit, after=after, session_id=session_id)
+            return {"stories": stories, "next_after": next_after}
+
         # Llamada a la capa de aplicación
         stories = await get_stories(db_manager, session_id, story_id)
 
@@ -45,33 +67,73 @@ async def get_stories_endpoint(
 
 
 
-@router.post("/", summary="Crear o actualizar historias")
+@router.post(
+    "/",
+    summary="Crear o actualizar historias",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "Lista de eventos en JSON o msgpack (`Content-Type`), opcionalmente con `Content-Encoding: gzip`.",
+            "content": {
+                JSON_CONTENT_TYPE: {"schema": {"type": "array", "items": {"type": "object"}}},
+                MSGPACK_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
 async def post_stories_endpoint(
-    events: List[Event],
-    db_manager: DatabaseManager = Depends(get_database_manager),
+    request: Request,
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
 ):
     """
     Crea o actualiza historias basadas en una lista de eventos.
 
+    El cuerpo se decodifica según `Content-Type` (`application/json` o `application/msgpack`)
+    y `Content-Encoding` (`gzip` opcional).
+
     Args:
-        events (List[Event]): Lista de eventos proporcionados.
-        db_manager (DatabaseManager): Gestor de la base de datos.
+        request (Request): Solicitud con la lista de eventos.
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
 
     Returns:
         dict: Mensaje de confirmación del éxito de la operación.
     """
     try:
-        if not events:
-            raise HTTPException(status_code=400, detail="No events provided.")
+        body = await request.body()
+        content_type = request.headers.get("content-type", JSON_CONTENT_TYPE)
+        content_encoding = request.headers.get("content-encoding")
+        if content_type.startswith(JSON_CONTENT_TYPE) and not content_encoding:
+            # JSON sin comprimir: se valida directamente desde los bytes.
+            payload = body
+        else:
+            payload = decode_payload(body, content_type, content_encoding)
+        events = parse_events(payload)
+    except UnsupportedWireFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {str(e)}")
+
+    if not events:
+        raise HTTPException(status_code=400, detail="No events provided.")
+
+    try:
         await post_stories(events, db_manager)
         return {"message": "Stories created or updated successfully."}
+    except PatternCountsRebuilding:
+        raise HTTPException(
+            status_code=503,
+            detail="Pattern counts are being rebuilt; retry later.",
+            headers={"Retry-After": "30"},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing stories: {str(e)}")
 
 @router.get("/patterns", summary="Identificar patrones comunes en historias")
 async def get_patterns_endpoint(
     session_id: Optional[str] = None,
-    db_manager: DatabaseManager = Depends(get_database_manager),
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
 ):
     """
     Identifica patrones comunes en las historias almacenadas.
@@ -86,3 +148,48 @@ async def get_patterns_endpoint(
         return await get_patterns(db_manager, session_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving patterns: {str(e)}")
+
+
+@router.get("/patterns/rules", summary="Reglas de detección de patrones")
+async def get_pattern_rules_endpoint() -> List[dict]:
+    """
+    Lista las reglas de patrones configuradas y cuántas acciones cumplió cada una.
+    """
+    return pattern_engine.stats()
+
+
+@router.get("/sequences", summary="Secuencias de acciones frecuentes")
+async def get_sequences_endpoint(
+    session_id: Optional[str] = None,
+    min_support: int = Query(2, ge=1, description="Historias mínimas que deben contener la secuencia"),
+    max_length: int = Query(5, ge=1, le=20, description="Largo máximo de las secuencias"),
+    include_value: bool = Query(False, description="Distinguir las acciones también por su valor"),
+    limit: int = Query(100, ge=1, le=10000, description="Cantidad máxima de secuencias en la respuesta"),
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
+):
+    """
+    Encuentra secuencias consecutivas de acciones (`tipo:objetivo`) comunes a varias historias,
+    ordenadas por soporte.
+    """
+    try:
+        result = await get_frequent_sequences(db_manager, session_id, min_support, max_length, include_value)
+        result["sequences"] = result["sequences"][:limit]
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error mining sequences: {str(e)}")
+
+
+@router.get("/funnel", summary="Embudo de conversión entre acciones")
+async def get_funnel_endpoint(
+    steps: List[str] = Query(..., min_length=2, description="Pasos del embudo en orden, como `tipo:objetivo`"),
+    session_id: Optional[str] = None,
+    include_value: bool = Query(False, description="Los pasos incluyen el valor (`tipo:objetivo:valor`)"),
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
+):
+    """
+    Cuenta cuántas historias alcanzan cada paso del embudo en orden y la conversión respecto del paso anterior.
+    """
+    try:
+        return await get_funnel(db_manager, steps, session_id, include_value)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing funnel: {str(e)}")
@@ -0,0 +1,139 @@
+from collections import Counter
+from typing import AsyncIterator, Callable, Dict, List, Set, Tuple
+
+# Fuente de historias: cada llamada abre un nuevo recorrido (cursor) y entrega bloques de documentos con `actions`.
+StorySource = Callable[[], AsyncIterator[List[dict]]]
+Gram = Tuple[str, ...]
+
+
+def action_token(action: dict, include_value: bool = False) -> str:
+    """
+    Representa una acción como un símbolo `tipo:objetivo` (o `tipo:objetivo:valor`).
+    Las navegaciones sin objetivo usan la URL.
+    """
+    target = action.get("target") or action.get("url") or ""
+    token = f"{action.get('type')}:{target}"
+    if include_value:
+        token += f":{action.get('value') or ''}"
+    return token
+
+
+def _tokens(story: dict, include_value: bool) -> List[str]:
+    return [action_token(action, include_value) for action in story.get("actions") or ()]
+
+
+async def mine_sequences(
+    source: StorySource,
+    min_support: int = 2,
+    max_length: int = 5,
+    max_candidates: int = 100_000,
+    include_value: bool = False,
+) -> dict:
+    """
+    Encuentra las secuencias contiguas de acciones (n-gramas) presentes en al menos `min_support` historias.
+
+    El recorrido es por niveles: la pasada `k` lee las historias desde el cursor y solo cuenta los
+    k-gramas cuyo prefijo y sufijo de largo `k-1` fueron frecuentes (si una secuencia es frecuente,
+    todas sus subsecuencias también lo son). Así la memoria queda acotada por los candidatos de un
+    nivel y no por la colección. Cada historia suma a lo sumo uno al soporte de una secuencia.
+    Si un nivel supera `max_candidates` se descarta completo y el recorrido termina: los soportes
+    informados son siempre exactos y no dependen del orden del cursor.
+
+    Args:
+        source (StorySource): Función que abre un recorrido por bloques de las historias.
+        min_support (int): Cantidad mínima de historias que deben contener la secuencia.
+        max_length (int): Largo máximo de las secuencias.
+        max_candidates (int): Límite de candidatos contados por nivel.
+        include_value (bool): Incluye el valor de la acción en el símbolo.
+
+    Returns:
+        dict: `sequences` (lista de `{steps, support}`), `stories` analizadas, `truncated` y
+        `complete_length` (largo máximo contado completo; menor que `max_length` si un nivel se descartó).
+    """
+    frequent: Dict[Gram, int] = {}
+    previous_level: Set[Gram] = set()
+    stories_seen = 0
+    complete_length = 0
+    truncated = False
+
+    for length in range(1, max_length + 1):
+        counts: Counter = Counter()
+        batches = source()
+        try:
+            async for batch in batches:
+                for story in batch:
+                    if length == 1:
+                        stories_seen += 1
+                    if truncated:
+                        continue  # El nivel ya se descartó; en el primero se siguen contando las historias.
+                    tokens = _tokens(story, include_value)
+                    candidates = set()
+                    for start in range(len(tokens) - length + 1):
+                        gram = tuple(tokens[start:start + length])
+                        if length > 1 and (gram[:-1] not in previous_level or gram[1:] not in previous_level):
+                            continue
+                        candidates.add(gram)
+                    for gram in candidates:
+                        if gram not in counts and len(counts) >= max_candidates:
+                            truncated = True
+                            break
+                        counts[gram] += 1
+                if truncated and length > 1:
+                    break
+        finally:
+            await batches.aclose()
+
+        if truncated:
+            break
+        complete_length = length
+        previous_level = {gram for gram, support in counts.items() if support >= min_support}
+        if not previous_level:
+            complete_length = max_length  # Ningún largo mayor puede ser frecuente.
+            break
+        frequent.update({gram: counts[gram] for gram in previous_level})
+
+    sequences = sorted(frequent.items(), key=lambda item: (-item[1], -len(item[0]), item[0]))
+    return {
+        "sequences": [{"steps": list(steps), "support": support} for steps, support in sequences],
+        "stories": stories_seen,
+        "truncated": truncated,
+        "complete_length": complete_length,
+    }
+
+
+async def compute_funnel(source: StorySource, steps: List[str], include_value: bool = False) -> dict:
+    """
+    Cuenta cuántas historias alcanzan cada paso de un embudo, en orden (no necesariamente consecutivos).
+
+    Se hace una sola pasada por el cursor y cada historia se evalúa con memoria constante.
+
+    Args:
+        source (StorySource): Función que abre un recorrido por bloques de las historias.
+        steps (List[str]): Símbolos de los pasos del embudo (ver `action_token`).
+        include_value (bool): Los símbolos incluyen el valor de la acción.
+
+    Returns:
+        dict: `steps` (lista de `{step, stories, conversion}`) y `stories` analizadas.
+    """
+    reached = [0] * len(steps)
+    stories_seen = 0
+    async for batch in source():
+        for story in batch:
+            stories_seen += 1
+            position = 0
+            for token in _tokens(story, include_value):
+                if token == steps[position]:
+                    reached[position] += 1
+                    position += 1
+                    if position == len(steps):
+                        break
+
+    funnel = []
+    for index, step in enumerate(steps):
+        base = stories_seen if index == 0 else reached[index - 1]
+        funnel.append({
+            "step": step,
+            "stories": reached[index],
+            "conversion": reached[index] / base if base else 0.0,
+        })
+    return {"steps": funnel, "stories": stories_seen}
@@ -1,15 +1,50 @@
-from typing import List, Optional, Dict, Union
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Iterator, List, Optional, Dict, Tuple, Union
 from models.story import Story
-from models.event import Event
-from database_manager import DatabaseManager
+from models.event import Event, format_timestamp
+from async_database_manager import AsyncDatabaseManager
+from pattern_rules import pattern_engine
+from sequence_mining import compute_funnel, mine_sequences
 from logging_config import logger
+from dotenv import load_dotenv
 
-async def get_stories(db_manager: DatabaseManager, session_id: Optional[str] = None, story_id: Optional[str] = None) -> List[Story]:
+load_dotenv()
+
+# Historias por bloque al recorrer la colección para minería de secuencias
+SEQUENCES_BATCH_SIZE = int(os.getenv("SEQUENCES_BATCH_SIZE", "1000"))
+SEQUENCES_MAX_CANDIDATES = int(os.getenv("SEQUENCES_MAX_CANDIDATES", "100000"))
+
+# Usuarios por bloque (una escritura de `bulk_upsert_stories` y un punto de control) en el backfill de historias
+BACKFILL_USERS_PER_BATCH = int(os.getenv("BACKFILL_USERS_PER_BATCH", "500"))
+
+# Cálculo de GET /v1/stories/patterns: "aggregation" (en MongoDB, solo viajan los conteos), "python"
+# o "materialized" (lee la colección `pattern_counts`, que POST /v1/stories/ mantiene de forma incremental)
+PATTERNS_MODES = ("aggregation", "python", "materialized")
+PATTERNS_MODE = os.getenv("PATTERNS_MODE", "aggregation").lower()
+if PATTERNS_MODE not in PATTERNS_MODES:
+    raise ValueError(f"Invalid PATTERNS_MODE: {PATTERNS_MODE}")
+# Documentos por inserción al reconstruir `pattern_counts`
+PATTERN_COUNTS_REBUILD_BATCH_SIZE = int(os.getenv("PATTERN_COUNTS_REBUILD_BATCH_SIZE", "5000"))
+# Mientras se reconstruye `pattern_counts`, POST /v1/stories/ responde 503 (el lock vence solo si el proceso muere)
+PATTERN_COUNTS_REBUILD_LOCK = "pattern_counts_rebuild"
+PATTERN_COUNTS_REBUILD_LOCK_SECONDS = float(os.getenv("PATTERN_COUNTS_REBUILD_LOCK_SECONDS", "3600"))
+# Espera entre tomar el lock y leer las historias, para que terminen las escrituras que ya estaban en curso
+PATTERN_COUNTS_REBUILD_GRACE_SECONDS = float(os.getenv("PATTERN_COUNTS_REBUILD_GRACE_SECONDS", "5"))
+
+
+class PatternCountsRebuilding(Exception):
+    """
+    Se está reconstruyendo `pattern_counts`: las historias se rechazan hasta que termine para no perder sus conteos.
+    """
+
+async def get_stories(db_manager: AsyncDatabaseManager, session_id: Optional[str] = None, story_id: Optional[str] = None) -> List[Story]:
     """
     Recupera historias de la base de datos.
 
     Args:
-        db_manager (DatabaseManager): Gestor de la base de datos.
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
         session_id (Optional[str]): ID de sesión para filtrar las historias.
         story_id (Optional[str]): ID de la historia para filtrar.
 
@@ -21,13 +56,13 @@ async def get_stories(db_manager: DatabaseManager, session_id: Optional[str] = N
 
         if session_id:
             logger.info(f"Obteniendo historias por session_id={session_id}")
-            stories_data = db_manager.get_stories_by_session_id(session_id)
+            stories_data = await db_manager.get_stories_by_session_id(session_id)
         elif story_id:
             logger.info(f"Obteniendo historias por story_id={story_id}")
-            stories_data = db_manager.get_stories_by_story_id(story_id)
+            stories_data = await db_manager.get_stories_by_story_id(story_id)
         else:
             logger.info("Obteniendo todas las historias sin filtros")
-            stories_data = db_manager.get_all_stories()
+            stories_data = await db_manager.get_all_stories()
 
         logger.info(f"Historias obtenidas de la base de datos: {len(stories_data)} historias encontradas.")
         stories = [Story(**story_data) for story_data in stories_data]
@@ -37,21 +72,195 @@ async def get_stories(db_manager: DatabaseManager, session_id: Optional[str] = N
         logger.error(f"Error al obtener historias en get_stories_application: {str(e)}", exc_info=True)
         raise
 
-async def post_stories(events: List[Event], db_manager: DatabaseManager):
+async def get_stories_page(
+    db_manager: AsyncDatabaseManager,
+    limit: int,
+    after: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> Tuple[List[Story], Optional[str]]:
+    """
+    Recupera una página de historias ordenadas por `id`.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
+        limit (int): Tamaño de la página.
+        after (Optional[str]): `id` de la última historia de la página anterior.
+        session_id (Optional[str]): ID de sesión para filtrar las historias.
+
+    Returns:
+        Tuple[List[Story], Optional[str]]: Historias de la página y el cursor `after` de la siguiente, o None si no hay más.
+    """
+    try:
+        stories_data = await db_manager.get_stories_page(limit, after=after, session_id=session_id)
+        stories = [Story(**story_data) for story_data in stories_data]
+        next_after = stories[-1].id if len(stories) == limit else None
+        return stories, next_after
+    except Exception as e:
+        logger.error(f"Error al obtener la página de historias: {str(e)}", exc_info=True)
+        raise
+
+async def stream_stories(db_manager: AsyncDatabaseManager, session_id: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    Emite las historias en formato NDJSON directamente desde el cursor de MongoDB.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
+        session_id (Optional[str]): ID de sesión para filtrar las historias.
+
+    Yields:
+        bytes: Bloque de líneas NDJSON, una historia por línea.
+    """
+    async for batch in db_manager.iter_stories(session_id=session_id):
+        yield "".join(json.dumps(story, default=str) + "\n" for story in batch).encode("utf-8")
+
+async def post_stories(events: List[Event], db_manager: AsyncDatabaseManager):
     """
     Procesa eventos para agruparlos en historias y las guarda en la base de datos.
 
     Args:
         events (List[Event]): Lista de eventos proporcionados.
-        db_manager (DatabaseManager): Gestor de la base de datos.
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
+
+    Raises:
+        PatternCountsRebuilding: En modo `materialized`, si se está reconstruyendo `pattern_counts`.
     """
+    if PATTERNS_MODE == "materialized" and await db_manager.lock_is_held(PATTERN_COUNTS_REBUILD_LOCK):
+        # Los `$inc` sobre la colección que la reconstrucción va a reemplazar se perderían.
+        raise PatternCountsRebuilding()
     try:
         stories = _group_events_into_stories(events)
-        db_manager.bulk_upsert_stories(stories)
+        if PATTERNS_MODE == "materialized":
+            # Cada historia se escribe solo si no cambió desde que se leyó su estado previo, así dos lotes
+            # concurrentes sobre la misma historia no cuentan dos veces las mismas acciones.
+            previous = await db_manager.upsert_stories_returning_previous(stories)
+            await _increment_pattern_counts(db_manager, stories, previous)
+        else:
+            await db_manager.bulk_upsert_stories(stories)
     except Exception as e:
         logger.error(f"Error in post_stories: {str(e)}", exc_info=True)
         raise
 
+async def _increment_pattern_counts(db_manager: AsyncDatabaseManager, stories: List[Story], previous: List[dict]):
+    """
+    Actualiza `pattern_counts` solo con las acciones que el lote agregó a cada historia.
+
+    El upsert descarta las acciones repetidas, así que las que ya estaban guardadas
+    (o aparecen dos veces en el lote) no se vuelven a contar.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
+        stories (List[Story]): Historias del lote.
+        previous (List[dict]): Acciones de esas historias inmediatamente antes de su actualización.
+    """
+    stored = {
+        document["id"]: {_action_key(action) for action in document.get("actions") or ()}
+        for document in previous
+    }
+    delta = []
+    for story in stories:
+        seen = stored.get(story.id, set())
+        new_actions = []
+        for action in story.model_dump()["actions"]:
+            key = _action_key(action)
+            if key not in seen:
+                seen.add(key)
+                new_actions.append(action)
+        if new_actions:
+            delta.append({"id": story.id, "actions": new_actions})
+
+    patterns = pattern_engine.identify(delta)
+    increments = [
+        {"pattern": pattern, "story_id": story_id, "count": count}
+        for pattern, by_story in patterns.items()
+        for story_id, count in by_story.items()
+    ]
+    await db_manager.increment_pattern_counts(increments)
+
+def _action_key(action: dict) -> Tuple:
+    return tuple(sorted(action.items()))
+
+async def rebuild_pattern_counts(db_manager: AsyncDatabaseManager) -> int:
+    """
+    Recalcula por completo `pattern_counts` con el pipeline de agregación (backfills o cambios de reglas).
+
+    Mientras dura, toma el lock `PATTERN_COUNTS_REBUILD_LOCK` y `post_stories` rechaza los lotes en modo
+    `materialized`: sus `$inc` irían a la colección que se reemplaza al terminar y se perderían. Antes de
+    leer las historias espera `PATTERN_COUNTS_REBUILD_GRACE_SECONDS` a que terminen los lotes en curso.
+
+    Returns:
+        int: Cantidad de pares (patrón, historia) escritos.
+    """
+    if not await db_manager.acquire_lock(PATTERN_COUNTS_REBUILD_LOCK, PATTERN_COUNTS_REBUILD_LOCK_SECONDS):
+        raise RuntimeError("Ya hay una reconstrucción de pattern_counts en curso.")
+    try:
+        await asyncio.sleep(PATTERN_COUNTS_REBUILD_GRACE_SECONDS)
+        results = await db_manager.aggregate_stories(pattern_engine.aggregation_pipeline())
+        counts = [
+            {"pattern": result["_id"]["pattern"], "story_id": result["_id"]["story_id"], "count": result["count"]}
+            for result in results
+        ]
+        return await db_manager.replace_pattern_counts(counts, batch_size=PATTERN_COUNTS_REBUILD_BATCH_SIZE)
+    finally:
+        await db_manager.release_lock(PATTERN_COUNTS_REBUILD_LOCK)
+
+async def warn_if_pattern_counts_missing(db_manager: AsyncDatabaseManager):
+    """
+    En modo `materialized`, advierte si hay historias pero `pattern_counts` está vacía (se activó el modo
+    sobre datos existentes sin ejecutar `cli.py rebuild-pattern-counts`).
+    """
+    if PATTERNS_MODE != "materialized":
+        return
+    if await db_manager.collection_is_empty("pattern_counts") and not await db_manager.collection_is_empty("stories"):
+        logger.warning(
+            "PATTERNS_MODE=materialized con pattern_counts vacía: GET /v1/stories/patterns no devolverá patrones "
+            "hasta ejecutar `python cli.py rebuild-pattern-counts`."
+        )
+
+async def backfill_stories(
+    db_manager: AsyncDatabaseManager,
+    partition: int = 0,
+    partitions: int = 1,
+    resume: bool = False,
+    users_per_batch: int = BACKFILL_USERS_PER_BATCH,
+) -> dict:
+    """
+    Reconstruye las historias a partir de los eventos guardados, usuario por usuario.
+
+    Los eventos llegan del cursor ordenados por (distinct_id, timestamp) en bloques de usuarios; cada
+    bloque se convierte con `_create_story_from_events` y se escribe con un solo `bulk_upsert_stories`.
+    Después de cada bloque se guarda un punto de control con el último `distinct_id`, así una ejecución
+    interrumpida puede reanudarse. Repetir un bloque no tiene efecto: el upsert descarta las acciones ya guardadas.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
+        partition (int): Partición de usuarios a procesar (por hash de `distinct_id`).
+        partitions (int): Cantidad total de particiones.
+        resume (bool): Continúa desde el punto de control de esta partición.
+        users_per_batch (int): Usuarios por bloque.
+
+    Returns:
+        dict: Usuarios y eventos procesados, y el último `distinct_id` escrito.
+    """
+    checkpoint_id = f"stories:{partition}/{partitions}"
+    after = await db_manager.get_backfill_checkpoint(checkpoint_id) if resume else None
+    summary = {"partition": partition, "users": 0, "events": 0, "after": after}
+
+    async for groups in db_manager.iter_events_by_distinct_id(
+        after=after, partition=partition, partitions=partitions, users_per_batch=users_per_batch
+    ):
+        stories = [
+            _create_story_from_events(distinct_id, [Event(**document) for document in documents])
+            for distinct_id, documents in groups
+        ]
+        await db_manager.bulk_upsert_stories(stories)
+        summary["after"] = groups[-1][0]
+        summary["users"] += len(groups)
+        summary["events"] += sum(len(documents) for _, documents in groups)
+        await db_manager.save_backfill_checkpoint(checkpoint_id, summary["after"], len(groups))
+        logger.info(f"Backfill {checkpoint_id}: {summary['users']} usuarios, {summary['events']} eventos.")
+
+    return summary
+
 def _group_events_into_stories(events: List[Event]) -> List[Story]:
     """
     Agrupa eventos por distinct_id y los convierte en historias.
@@ -86,8 +295,8 @@ def _create_story_from_events(distinct_id: str, events: List[Event]) -> Story:
             id=f"story-{distinct_id}",
             session_id=events[0].properties.session_id,
             title=f"User Story {distinct_id}",
-            startTimestamp=events[0].timestamp,
-            endTimestamp=events[-1].timestamp,
+            startTimestamp=format_timestamp(events[0].timestamp),
+            endTimestamp=format_timestamp(events[-1].timestamp),
             initialState={"url": events[0].properties.current_url},
             finalState={"url": events[-1].properties.current_url},
             actions=[
@@ -95,6 +304,7 @@ def _create_story_from_events(distinct_id: str, events: List[Event]) -> Story:
                     "type": event.properties.eventType,
                     "target": event.properties.elementType,
                     "value": event.properties.elementText,
+                    "timestamp": format_timestamp(event.timestamp),
                 }
                 for event in events
             ],
@@ -107,27 +317,45 @@ def _create_story_from_events(distinct_id: str, events: List[Event]) -> Story:
         logger.error(f"Error creating story for distinct_id={distinct_id}: {str(e)}", exc_info=True)
         raise
 
-async def get_patterns(db_manager: DatabaseManager, session_id: Optional[str] = None) -> dict:
+async def get_patterns(db_manager: AsyncDatabaseManager, session_id: Optional[str] = None) -> dict:
     """
     Detecta patrones comunes en las historias de usuario.
 
     Args:
-        db_manager (DatabaseManager): Gestor de la base de datos.
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
         session_id (Optional[str]): ID de sesión para filtrar las historias.
 
     Returns:
         dict: Diccionario con patrones detectados.
     """
     try:
-        stories = await get_stories(db_manager, session_id)
-        return _identify_patterns(stories)
+        if PATTERNS_MODE == "materialized":
+            story_ids = await db_manager.get_story_ids_by_session_id(session_id) if session_id else None
+            patterns: Dict[str, Dict[str, int]] = {}
+            for document in await db_manager.get_pattern_counts(story_ids):
+                patterns.setdefault(document["pattern"], {})[document["story_id"]] = document["count"]
+            return patterns
+
+        query = {"session_id": session_id} if session_id else {}
+        if PATTERNS_MODE == "aggregation":
+            results = await db_manager.aggregate_stories(pattern_engine.aggregation_pipeline(query))
+            return pattern_engine.collect_aggregation(results)
+
+        # Cada documento se valida con `Story` antes de evaluar sus acciones.
+        if session_id:
+            stories_data = await db_manager.get_stories_by_session_id(session_id)
+        else:
+            stories_data = await db_manager.get_all_stories()
+        return _identify_patterns(stories_data)
     except Exception as e:
         logger.error(f"Error retrieving patterns: {str(e)}", exc_info=True)
         raise
 
 def _identify_patterns(stories: List[Union[Story, dict]]) -> Dict[str, Dict[str, int]]:
     """
-    Identifica patrones comunes en las historias proporcionadas.
+    Identifica patrones comunes en las historias proporcionadas con el motor de reglas.
+
+    Los diccionarios se validan con `Story` antes de evaluarlos; los que no son válidos se omiten.
 
     Args:
         stories (List[Union[Story, dict]]): Lista de historias como instancias de `Story` o diccionarios.
@@ -135,60 +363,78 @@ def _identify_patterns(stories: List[Union[Story, dict]]) -> Dict[str, Dict[str,
     Returns:
         Dict[str, Dict[str, int]]: Patrones detectados organizados por tipo.
     """
-    patterns = {}
+    return pattern_engine.identify(_validated_stories(stories))
 
+def _validated_stories(stories: List[Union[Story, dict]]) -> Iterator[Story]:
     for story_data in stories:
         if isinstance(story_data, Story):
-            story = story_data
+            yield story_data
         elif isinstance(story_data, dict):
             try:
-                story = Story(**story_data)
+                yield Story(**story_data)
             except Exception as e:
                 logger.warning(f"Error al convertir historia: {story_data}. Error: {str(e)}")
-                continue
         else:
             logger.warning(f"Historia no válida encontrada: {story_data}")
-            continue
-
-        for action in story.actions:
-            # Patrón: Login
-            if action.type == "input" and "login" in action.target:
-                patterns.setdefault("login", {}).setdefault(story.id, 0)
-                patterns["login"][story.id] += 1
-
-            # Patrón: Checkout
-            elif action.type == "click" and "checkout" in action.target:
-                patterns.setdefault("checkout", {}).setdefault(story.id, 0)
-                patterns["checkout"][story.id] += 1
-
-            # Otros patrones
-            elif action.type == "navigation" and "search" in action.target:
-                patterns.setdefault("search", {}).setdefault(story.id, 0)
-                patterns["search"][story.id] += 1
-
-            # Patrón: Navegación por secciones principales
-            elif action.type == "click" and action.target == "a" and action.value in ["User Stories", "Test Cases"]:
-                patterns.setdefault("navigation_to_section", {}).setdefault(story.id, 0)
-                patterns["navigation_to_section"][story.id] += 1
-
-            # Interacción con contenido destacado
-            elif action.type == "click" and action.target == "div" and action.value:
-                patterns.setdefault("interaction_with_highlighted_content", {}).setdefault(story.id, 0)
-                patterns["interaction_with_highlighted_content"][story.id] += 1
-
-            # Interacciones repetidas
-            elif action.type == "click" and action.value == "Test Cases":
-                patterns.setdefault("repeated_click", {}).setdefault(story.id, 0)
-                patterns["repeated_click"][story.id] += 1
-
-            # Interacción con íconos
-            elif action.type == "click" and action.target == "svg":
-                patterns.setdefault("ui_icon_interaction", {}).setdefault(story.id, 0)
-                patterns["ui_icon_interaction"][story.id] += 1
-
-            # Interacciones ambiguas
-            elif action.type == "click" and not action.value:
-                patterns.setdefault("ambiguous_interaction", {}).setdefault(story.id, 0)
-                patterns["ambiguous_interaction"][story.id] += 1
-
-    return patterns
+
+def _story_actions_source(db_manager: AsyncDatabaseManager, session_id: Optional[str]):
+    """
+    Fuente de historias para la minería de secuencias: cada llamada abre un cursor nuevo con solo las acciones.
+    """
+    return lambda: db_manager.iter_story_actions(batch_size=SEQUENCES_BATCH_SIZE, session_id=session_id)
+
+async def get_frequent_sequences(
+    db_manager: AsyncDatabaseManager,
+    session_id: Optional[str] = None,
+    min_support: int = 2,
+    max_length: int = 5,
+    include_value: bool = False,
+) -> dict:
+    """
+    Encuentra secuencias de acciones frecuentes recorriendo las historias con un cursor.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
+        session_id (Optional[str]): ID de sesión para filtrar las historias.
+        min_support (int): Cantidad mínima de historias que contienen la secuencia.
+        max_length (int): Largo máximo de las secuencias.
+        include_value (bool): Distingue las acciones también por su valor.
+
+    Returns:
+        dict: Secuencias frecuentes con su soporte.
+    """
+    try:
+        return await mine_sequences(
+            _story_actions_source(db_manager, session_id),
+            min_support=min_support,
+            max_length=max_length,
+            max_candidates=SEQUENCES_MAX_CANDIDATES,
+            include_value=include_value,
+        )
+    except Exception as e:
+        logger.error(f"Error mining sequences: {str(e)}", exc_info=True)
+        raise
+
+async def get_funnel(
+    db_manager: AsyncDatabaseManager,
+    steps: List[str],
+    session_id: Optional[str] = None,
+    include_value: bool = False,
+) -> dict:
+    """
+    Calcula cuántas historias avanzan por cada paso de un embudo.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de la base de datos.
+        steps (List[str]): Pasos del embudo como símbolos `tipo:objetivo`.
+        session_id (Optional[str]): ID de sesión para filtrar las historias.
+        include_value (bool): Los pasos incluyen el valor de la acción.
+
+    Returns:
+        dict: Historias y tasa de conversión por paso.
+    """
+    try:
+        return await compute_funnel(_story_actions_source(db_manager, session_id), steps, include_value=include_value)
+    except Exception as e:
+        logger.error(f"Error computing funnel: {str(e)}", exc_info=True)
+        raise
@@ -97,3 +97,575 @@ def test_get_patterns_endpoint():
 
 
 
+def test_queries_use_indexes():
+    """Verifica con explain que las consultas por story_id, session_id y sesiones usan índices."""
+    from dependencies import get_database_manager
+
+    db_manager = get_database_manager().db_manager
+    db_manager.create_indexes()
+    db_manager.create_indexes()  # Idempotente
+
+    queries = [
+        ("stories", {"id": "story-12345"}),
+        ("stories", {"session_id": "abc"}),
+        ("sessions", {"distinct_id": "12345"}),
+        ("sessions", {"sessions": "abc"}),
+        ("session_registry", {"distinct_id": "12345"}),
+        ("events", {"properties.distinct_id": "12345", "properties.session_id": "abc"}),
+    ]
+    for collection_name, query in queries:
+        cursor = db_manager.get_collection(collection_name).find(query)
+        if not hasattr(cursor, "explain"):
+            pytest.skip("El backend de MongoDB no soporta explain.")
+        plan = cursor.explain()
+        assert "IXSCAN" in str(plan["queryPlanner"]["winningPlan"]), f"{collection_name} {query}"
+
+def test_get_stories_paginated_and_streaming():
+    """Prueba la paginación por clave y el modo NDJSON de GET /v1/stories."""
+    import json
+    from dependencies import get_database_manager
+
+    stories_collection = get_database_manager().db_manager.get_collection("stories")
+    for suffix in ("page-a", "page-b", "page-c"):
+        stories_collection.update_one(
+            {"id": f"story-{suffix}"},
+            {"$set": {
+                "id": f"story-{suffix}",
+                "session_id": "session-pages",
+                "title": f"User Story {suffix}",
+                "startTimestamp": "2024-01-01T00:00:00Z",
+                "endTimestamp": "2024-01-01T00:00:00Z",
+                "initialState": {"url": "https://example.com"},
+                "finalState": {"url": "https://example.com"},
+                "actions": [{"type": "click", "target": "button", "value": "Submit"}],
+                "networkRequests": [],
+            }},
+            upsert=True,
+        )
+
+    first_page = client.get("/v1/stories", params={"session_id": "session-pages", "limit": 2}).json()
+    assert [story["id"] for story in first_page["stories"]] == ["story-page-a", "story-page-b"]
+    assert first_page["next_after"] == "story-page-b"
+
+    second_page = client.get(
+        "/v1/stories", params={"session_id": "session-pages", "limit": 2, "after": first_page["next_after"]}
+    ).json()
+    assert [story["id"] for story in second_page["stories"]] == ["story-page-c"]
+    assert second_page["next_after"] is None
+
+    response = client.get("/v1/stories", params={"session_id": "session-pages", "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    streamed_ids = sorted(json.loads(line)["id"] for line in response.text.splitlines())
+    assert streamed_ids == ["story-page-a", "story-page-b", "story-page-c"]
+
+def test_post_stories_merges_batches_incrementally():
+    """Prueba que lotes sucesivos (y tardíos) se combinan en la historia en orden de timestamp."""
+    def build_event(timestamp, text, url):
+        return {
+            "event": "user_click",
+            "properties": {
+                "distinct_id": "incremental-user",
+                "session_id": f"session-{timestamp[11:13]}",
+                "$current_url": url,
+                "$host": "example.com",
+                "$pathname": "/",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "button",
+                "elementText": text,
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False
+            },
+            "timestamp": timestamp
+        }
+
+    second = build_event("2024-01-01T02:00:00Z", "second", "https://example.com/second")
+    third = build_event("2024-01-01T03:00:00Z", "third", "https://example.com/third")
+    late_first = build_event("2024-01-01T01:00:00Z", "first", "https://example.com/first")
+
+    assert client.post("/v1/stories", json=[second, third]).status_code == 200
+    assert client.post("/v1/stories", json=[late_first, third]).status_code == 200
+
+    story = client.get("/v1/stories", params={"story_id": "story-incremental-user"}).json()["stories"][0]
+    assert [action["value"] for action in story["actions"]] == ["first", "second", "third"]
+    assert story["startTimestamp"] == "2024-01-01T01:00:00.000Z"
+    assert story["endTimestamp"] == "2024-01-01T03:00:00.000Z"
+    assert story["initialState"] == {"url": "https://example.com/first"}
+    assert story["finalState"] == {"url": "https://example.com/third"}
+    assert story["session_id"] == "session-01"
+
+def test_post_stories_accepts_msgpack_gzip():
+    """Prueba que POST /v1/stories acepta msgpack comprimido con gzip y rechaza formatos desconocidos."""
+    from serialization import encode_payload
+
+    event = {
+        "event": "user_click",
+        "properties": {
+            "distinct_id": "wire-user",
+            "session_id": "wire-session",
+            "$current_url": "https://example.com",
+            "$host": "example.com",
+            "$pathname": "/",
+            "$browser": "Chrome",
+            "$device": "Desktop",
+            "$screen_height": 1080,
+            "$screen_width": 1920,
+            "eventType": "click",
+            "elementType": "button",
+            "elementText": "Submit",
+            "timestamp": "2024-01-01T00:00:00Z",
+            "x": 1,
+            "y": 1,
+            "mouseButton": 0,
+            "ctrlKey": False,
+            "shiftKey": False,
+            "altKey": False,
+            "metaKey": False
+        },
+        "timestamp": "2024-01-01T00:00:00Z"
+    }
+
+    body, headers = encode_payload([event], "msgpack", "gzip")
+    response = client.post("/v1/stories", content=body, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/v1/stories", params={"story_id": "story-wire-user"}).status_code == 200
+
+    response = client.post("/v1/stories", content=b"<events/>", headers={"Content-Type": "application/xml"})
+    assert response.status_code == 415
+
+def test_story_cache_read_through_and_invalidation(monkeypatch):
+    """Prueba que las lecturas por story_id/session_id se sirven de caché y que un upsert las invalida."""
+    from datetime import datetime, timezone
+    from cache_manager import CacheManager
+    from story_cache import StoryCache
+    from dependencies import get_database_manager
+
+    monkeypatch.setenv("CACHE_BACKEND", "fakeredis")
+    db_manager = get_database_manager().db_manager
+    monkeypatch.setattr(db_manager, "story_cache", StoryCache(CacheManager(ttl=60)))
+
+    def build_story(session_id, pathname, timestamp):
+        return Story(
+            id="story-cached",
+            title="Cached story",
+            session_id=session_id,
+            startTimestamp=timestamp,
+            endTimestamp=timestamp,
+            initialState={"url": pathname},
+            finalState={"url": pathname},
+            actions=[{"type": "click", "target": "button", "value": pathname, "timestamp": timestamp}],
+            networkRequests=[],
+        )
+
+    db_manager.bulk_upsert_stories([build_story("session-cache-b", "/b", "2024-01-01T02:00:00.000Z")])
+    assert db_manager.get_stories_by_story_id("story-cached")[0]["session_id"] == "session-cache-b"
+    assert len(db_manager.get_stories_by_session_id("session-cache-b")) == 1
+    assert db_manager.get_stories_by_story_id("story-cached")[0]["session_id"] == "session-cache-b"
+    assert db_manager.get_cache_stats()["hits"] == 1
+
+    # Un lote anterior mueve la historia a otra sesión: ambas consultas deben reflejarlo.
+    db_manager.bulk_upsert_stories([build_story("session-cache-a", "/a", "2024-01-01T01:00:00.000Z")])
+    assert db_manager.get_stories_by_story_id("story-cached")[0]["session_id"] == "session-cache-a"
+    assert db_manager.get_stories_by_session_id("session-cache-b") == []
+    stats = db_manager.get_cache_stats()
+    assert stats["invalidations"] >= 3
+    assert stats["misses"] == 4
+    assert stats["evictions"]["local"] == 0
+
+    # Una escritura que invalida mientras otra lectura consulta la base: el valor leído no se guarda.
+    story_cache = db_manager.story_cache
+
+    def stale_loader():
+        story_cache.invalidate(["stories:race"])
+        return "stale"
+
+    assert story_cache.get_or_load("stories:race", stale_loader) == "stale"
+    assert story_cache.get_or_load("stories:race", lambda: "fresh") == "fresh"
+    assert story_cache.get_or_load("stories:race", lambda: "unused") == "fresh"
+    assert story_cache.stats()["discarded_loads"] == 1
+
+def test_cache_manager_local_tier(monkeypatch):
+    """Prueba el nivel LRU en memoria, el acceso por lotes y la invalidación recibida de otros procesos."""
+    import json
+    from cache_manager import CacheManager
+    from local_cache import LocalCache
+
+    lru = LocalCache(max_entries=2, max_bytes=10, ttl=60)
+    lru.set("a", 1, 4)
+    lru.set("b", 2, 4)
+    lru.get("a")
+    lru.set("c", 3, 4)  # Supera 10 bytes: se descarta la menos usada ("b")
+    assert lru.get("b") is None and lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+    monkeypatch.setenv("CACHE_BACKEND", "fakeredis")
+    cache = CacheManager(ttl=60, local_max_entries=100)
+    try:
+        cache.save_many({"k1": {"value": 1}, "k2": {"value": 2}})
+        cache.redis.set("k3", json.dumps({"value": 3}))
+        assert cache.get_many(["k1", "k2", "k3", "k4"]) == {"k1": {"value": 1}, "k2": {"value": 2}, "k3": {"value": 3}}
+        assert cache.stats()["hits"] == 2
+
+        # Un cambio hecho en Redis no se ve hasta que llega el aviso de otro proceso.
+        cache.redis.set("k1", json.dumps({"value": 10}))
+        cache._handle_invalidation({"data": json.dumps({"origin": cache.instance_id, "keys": ["k1"]})})
+        assert cache.get("k1") == {"value": 1}
+        cache._handle_invalidation({"data": json.dumps({"origin": "otro-proceso", "keys": ["k1"]})})
+        assert cache.get("k1") == {"value": 10}
+
+        cache.delete_many(["k2"])
+        assert cache.get("k2") == {}
+    finally:
+        cache.close()
+
+def test_pattern_engine_matches_rule_table_in_order():
+    """Prueba que el motor de reglas respeta el orden de la tabla, trabaja sobre documentos y cuenta aciertos."""
+    from pattern_rules import DEFAULT_PATTERN_RULES, PatternEngine, PatternRule
+
+    engine = PatternEngine(DEFAULT_PATTERN_RULES)
+    stories = [
+        {
+            "id": "story-a",
+            "actions": [
+                {"type": "input", "target": "#login-email", "value": "user"},
+                {"type": "click", "target": "a", "value": "Test Cases"},  # navigation_to_section gana a repeated_click
+                {"type": "click", "target": "svg", "value": None},         # ui_icon_interaction gana a ambiguous
+                {"type": "click", "target": "span", "value": ""},
+                {"type": "input", "target": None, "value": "sin selector"},
+            ],
+        },
+        Story(
+            id="story-b",
+            session_id="session-b",
+            title="Story B",
+            startTimestamp="2024-01-01T00:00:00.000Z",
+            endTimestamp="2024-01-01T00:00:00.000Z",
+            initialState={},
+            finalState={},
+            actions=[{"type": "click", "target": "div", "value": "Destacado"}, {"type": "click", "target": "button", "value": "Test Cases"}],
+            networkRequests=[],
+        ),
+    ]
+
+    assert engine.identify(stories) == {
+        "login": {"story-a": 1},
+        "navigation_to_section": {"story-a": 1},
+        "ui_icon_interaction": {"story-a": 1},
+        "ambiguous_interaction": {"story-a": 1},
+        "interaction_with_highlighted_content": {"story-b": 1},
+        "repeated_click": {"story-b": 1},
+    }
+    hits = {rule["name"]: rule["hits"] for rule in engine.stats()}
+    assert hits["login"] == 1 and hits["checkout"] == 0
+
+    custom = PatternEngine([PatternRule(name="submit", action_type="click", value_in=["Submit", "Enviar"])])
+    assert custom.match("click", "button", "Enviar") == "submit"
+    assert custom.match("input", "button", "Enviar") is None
+
+    # `GET /v1/stories/patterns` valida cada documento con `Story`: el documento incompleto se omite.
+    from story_application import _identify_patterns
+    assert _identify_patterns([stories[0], stories[1].model_dump()]) == {
+        "interaction_with_highlighted_content": {"story-b": 1},
+        "repeated_click": {"story-b": 1},
+    }
+
+def test_patterns_aggregation_matches_python_engine():
+    """Prueba que el pipeline de agregación produce los mismos conteos que el motor de reglas en Python."""
+    import asyncio
+    import random
+    import story_application
+    from dependencies import get_database_manager
+    from pattern_rules import PatternEngine, PatternRule, DEFAULT_PATTERN_RULES
+
+    rng = random.Random(7)
+    targets = ["a", "div", "svg", "span", "#login-form", "#checkout.btn", "/search?q=1", "(x+y)", None]
+    values = ["User Stories", "Test Cases", "Destacado", "$literal", "", None]
+    stories = [
+        {
+            "id": f"story-parity-{index}",
+            "session_id": "session-parity" if index % 2 else "session-parity-other",
+            "actions": [
+                {key: value for key, value in {
+                    "type": rng.choice(["click", "input", "navigation", "scroll"]),
+                    "target": rng.choice(targets),
+                    "value": rng.choice(values),
+                }.items() if value is not None or rng.random() < 0.5}
+                for _ in range(rng.randint(0, 12))
+            ],
+        }
+        for index in range(60)
+    ]
+    db_manager = get_database_manager()
+    collection = db_manager.get_collection("stories")
+    collection.delete_many({"id": {"$regex": "^story-parity-"}})
+    collection.insert_many([dict(story) for story in stories])
+
+    engines = [
+        PatternEngine(DEFAULT_PATTERN_RULES),
+        PatternEngine([
+            PatternRule(name="parens", action_type="click", target_contains="(x+"),
+            PatternRule(name="dollar", action_type="input", value_equals="$literal"),
+        ]),
+    ]
+    for engine in engines:
+        for session_id, expected_stories in [
+            ("session-parity", [story for story in stories if story["session_id"] == "session-parity"]),
+            (None, stories),
+        ]:
+            query = {"session_id": session_id} if session_id else {"id": {"$regex": "^story-parity-"}}
+            results = asyncio.run(db_manager.aggregate_stories(engine.aggregation_pipeline(query)))
+            assert engine.collect_aggregation(results) == engine.identify(expected_stories)
+
+    response = client.get("/v1/stories/patterns", params={"session_id": "session-parity"})
+    assert response.status_code == 200
+    assert story_application.PATTERNS_MODE == "aggregation"
+    assert response.json() == engines[0].identify([s for s in stories if s["session_id"] == "session-parity"])
+
+def test_materialized_pattern_counts_follow_incremental_batches(monkeypatch):
+    """Prueba que pattern_counts suma solo las acciones nuevas de cada lote y coincide con una reconstrucción."""
+    import asyncio
+    import story_application
+    from dependencies import get_database_manager
+    from pattern_rules import pattern_engine
+
+    monkeypatch.setattr(story_application, "PATTERNS_MODE", "materialized")
+    db_manager = get_database_manager()
+
+    def build_event(distinct_id, second, element_type, text):
+        timestamp = f"2024-02-01T00:00:{second:02d}Z"
+        return {
+            "event": "user_click",
+            "properties": {
+                "distinct_id": distinct_id,
+                "session_id": f"session-{distinct_id}",
+                "$current_url": "https://example.com",
+                "$host": "example.com",
+                "$pathname": "/",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": element_type,
+                "elementText": text,
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False
+            },
+            "timestamp": timestamp
+        }
+
+    first_batch = [
+        build_event("materialized-1", 1, "svg", ""),
+        build_event("materialized-1", 2, "a", "Test Cases"),
+        build_event("materialized-2", 1, "span", ""),
+    ]
+    second_batch = first_batch[:2] + [build_event("materialized-1", 3, "svg", ""), build_event("materialized-2", 2, "div", "Card")]
+    assert client.post("/v1/stories", json=first_batch).status_code == 200
+    assert client.post("/v1/stories", json=second_batch).status_code == 200  # Reenvío parcial + acciones nuevas
+
+    story_ids = ["story-materialized-1", "story-materialized-2"]
+    stored = asyncio.run(db_manager.get_story_actions_by_ids(story_ids))
+    expected = pattern_engine.identify(stored)
+    assert expected == {
+        "ui_icon_interaction": {"story-materialized-1": 2},
+        "navigation_to_section": {"story-materialized-1": 1},
+        "ambiguous_interaction": {"story-materialized-2": 1},
+        "interaction_with_highlighted_content": {"story-materialized-2": 1},
+    }
+
+    response = client.get("/v1/stories/patterns", params={"session_id": "session-materialized-1"})
+    assert response.json() == {pattern: by_story for pattern, by_story in expected.items() if "story-materialized-1" in by_story}
+
+    def materialized():
+        return sorted((d["pattern"], d["story_id"], d["count"]) for d in asyncio.run(db_manager.get_pattern_counts(story_ids)))
+
+    incremental = materialized()
+    monkeypatch.setattr(story_application, "PATTERN_COUNTS_REBUILD_GRACE_SECONDS", 0)
+    asyncio.run(story_application.rebuild_pattern_counts(db_manager))
+    assert materialized() == incremental
+    collections = db_manager.db_manager.db.list_collection_names()
+    assert not [name for name in collections if name.startswith("pattern_counts_rebuild_")]  # La temporal se renombró
+
+    # Durante una reconstrucción los lotes se rechazan con 503 para que sus `$inc` no se pierdan.
+    lock = story_application.PATTERN_COUNTS_REBUILD_LOCK
+    assert asyncio.run(db_manager.acquire_lock(lock, 60))
+    assert not asyncio.run(db_manager.acquire_lock(lock, 60))
+    response = client.post("/v1/stories", json=[build_event("materialized-1", 4, "svg", "")])
+    assert response.status_code == 503 and response.headers["Retry-After"]
+    asyncio.run(db_manager.release_lock(lock))
+    assert client.post("/v1/stories", json=[build_event("materialized-1", 4, "svg", "")]).status_code == 200
+    assert ("ui_icon_interaction", "story-materialized-1", 3) in materialized()
+
+def test_sequences_and_funnel_over_story_cursor():
+    """Prueba la minería de secuencias frecuentes y el embudo sobre historias leídas con un cursor."""
+    from dependencies import get_database_manager
+
+    search, product, checkout, other = (
+        {"type": "navigation", "url": "/search"},
+        {"type": "click", "target": "product"},
+        {"type": "click", "target": "checkout"},
+        {"type": "click", "target": "banner"},
+    )
+    flows = [
+        [search, product, checkout],
+        [search, product, checkout, other],
+        [other, search, product, other, checkout],
+        [search, other],
+    ]
+    collection = get_database_manager().get_collection("stories")
+    collection.delete_many({"session_id": "session-funnel"})
+    collection.insert_many([
+        {"id": f"story-funnel-{index}", "session_id": "session-funnel", "actions": actions}
+        for index, actions in enumerate(flows)
+    ])
+
+    response = client.get("/v1/stories/sequences", params={"session_id": "session-funnel", "min_support": 3})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["stories"] == 4 and data["truncated"] is False
+    supports = {tuple(sequence["steps"]): sequence["support"] for sequence in data["sequences"]}
+    assert supports[("navigation:/search", "click:product")] == 3
+    assert supports[("navigation:/search",)] == 4
+    assert ("navigation:/search", "click:product", "click:checkout") not in supports  # Soporte 2 < 3
+
+    assert data["complete_length"] == 5
+
+    # Si un largo supera el límite de candidatos se descarta completo y los soportes informados siguen siendo exactos.
+    import asyncio
+    from sequence_mining import mine_sequences
+
+    async def source():
+        yield [{"actions": actions} for actions in flows[:2]]
+        yield [{"actions": actions} for actions in flows[2:]]
+
+    truncated = asyncio.run(mine_sequences(source, min_support=3, max_length=5, max_candidates=5))
+    assert truncated["truncated"] is True and truncated["complete_length"] == 1
+    assert {tuple(sequence["steps"]): sequence["support"] for sequence in truncated["sequences"]} == {
+        steps: support for steps, support in supports.items() if len(steps) == 1
+    }
+
+    response = client.get(
+        "/v1/stories/funnel",
+        params=[("session_id", "session-funnel"), ("steps", "navigation:/search"), ("steps", "click:product"), ("steps", "click:checkout")],
+    )
+    assert response.status_code == 200
+    assert [step["stories"] for step in response.json()["steps"]] == [4, 3, 3]
+    assert response.json()["steps"][1]["conversion"] == 0.75
+
+def test_backfill_rebuilds_stories_by_partition_and_resumes():
+    """Prueba que el backfill reconstruye las historias desde `events` por particiones y reanuda desde el punto de control."""
+    import asyncio
+    import story_application
+    from dependencies import get_database_manager
+
+    db_manager = get_database_manager()
+
+    def build_event(distinct_id, second, text):
+        timestamp = f"2024-04-01T00:00:{second:02d}Z"
+        return Event(**{
+            "event": "user_click",
+            "properties": {
+                "distinct_id": distinct_id,
+                "session_id": f"session-{distinct_id}",
+                "$current_url": f"https://example.com/{second}",
+                "$host": "example.com",
+                "$pathname": "/",
+                "$browser": "Chrome",
+                "$device": "Desktop",
+                "$screen_height": 1080,
+                "$screen_width": 1920,
+                "eventType": "click",
+                "elementType": "button",
+                "elementText": text,
+                "timestamp": timestamp,
+                "x": 1,
+                "y": 1,
+                "mouseButton": 0,
+                "ctrlKey": False,
+                "shiftKey": False,
+                "altKey": False,
+                "metaKey": False
+            },
+            "timestamp": timestamp
+        })
+
+    users = [f"backfill-{index}" for index in range(6)]
+    events = [build_event(user, second, f"{user}-{second}") for user in users for second in (3, 1, 2)]
+    asyncio.run(db_manager.bulk_save_events(events))
+
+    summaries = [
+        asyncio.run(story_application.backfill_stories(db_manager, partition=partition, partitions=2, users_per_batch=2))
+        for partition in range(2)
+    ]
+    processed = sum(summary["users"] for summary in summaries)
+    assert processed >= len(users)  # La colección puede tener eventos de otras pruebas
+
+    for user in users:
+        story = asyncio.run(db_manager.get_stories_by_story_id(f"story-{user}"))[0]
+        assert [action["value"] for action in story["actions"]] == [f"{user}-1", f"{user}-2", f"{user}-3"]
+        assert story["finalState"] == {"url": "https://example.com/3"}
+
+    resumed = [
+        asyncio.run(story_application.backfill_stories(db_manager, partition=partition, partitions=2, resume=True))
+        for partition in range(2)
+    ]
+    assert [summary["users"] for summary in resumed] == [0, 0]
+
+def test_materialized_counts_do_not_drift_with_concurrent_batches(monkeypatch):
+    """Prueba que dos lotes concurrentes con la misma acción nueva la cuentan una sola vez."""
+    import asyncio
+    import story_application
+    from dependencies import get_database_manager
+
+    monkeypatch.setattr(story_application, "PATTERNS_MODE", "materialized")
+    db_manager = get_database_manager()
+    timestamp = "2024-08-01T00:00:01Z"
+    event = Event(**{
+        "event": "user_click",
+        "properties": {
+            "distinct_id": "concurrent-1",
+            "session_id": "session-concurrent-1",
+            "$current_url": "https://example.com",
+            "$host": "example.com",
+            "$pathname": "/",
+            "$browser": "Chrome",
+            "$device": "Desktop",
+            "$screen_height": 1080,
+            "$screen_width": 1920,
+            "eventType": "click",
+            "elementType": "svg",
+            "elementText": "",
+            "timestamp": timestamp,
+            "x": 1,
+            "y": 1,
+            "mouseButton": 0,
+            "ctrlKey": False,
+            "shiftKey": False,
+            "altKey": False,
+            "metaKey": False
+        },
+        "timestamp": timestamp
+    })
+
+    async def post_concurrently():
+        await asyncio.gather(*(story_application.post_stories([event], db_manager) for _ in range(4)))
+
+    asyncio.run(post_concurrently())
+    counts = asyncio.run(db_manager.get_pattern_counts(["story-concurrent-1"]))
+    assert [(count["pattern"], count["count"]) for count in counts] == [("ui_icon_interaction", 1)]
@@ -0,0 +1,68 @@
+"""
+Regeneración offline de los tests de Playwright guardados en la colección `tests`.
+
+Lee las historias directamente de MongoDB por bloques y reparte la generación entre procesos.
+
+Uso:
+    python cli.py regenerate [--story-id ID] [--workers N] [--chunk-size N] [--batch-size N] [--force]
+"""
+import argparse
+import asyncio
+import os
+import time
+import test_generation
+from dependencies import init_database_manager, close_database_manager
+from models.story import StoryActions
+from test_application import _get_or_generate_tests
+from logging_config import logger
+
+
+async def regenerate(story_id, batch_size: int, force: bool) -> int:
+    """
+    Recorre las historias y genera los tests que faltan o cuyas acciones cambiaron.
+
+    Returns:
+        int: Cantidad de historias procesadas.
+    """
+    db_manager = init_database_manager()
+    processed = 0
+    try:
+        await db_manager.create_indexes()
+        async for documents in db_manager.iter_story_actions(story_id, batch_size=batch_size):
+            stories = [StoryActions(**document) for document in documents]
+            await _get_or_generate_tests(db_manager, stories, force=force)
+            processed += len(stories)
+            logger.info(f"Historias procesadas: {processed}")
+    finally:
+        close_database_manager()
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Herramientas del servicio de tests.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    regenerate_parser = subparsers.add_parser("regenerate", help="Regenera los tests guardados a partir de las historias.")
+    regenerate_parser.add_argument("--story-id", default=None, help="Regenera solo esta historia.")
+    regenerate_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos de generación.")
+    regenerate_parser.add_argument(
+        "--chunk-size", type=int, default=test_generation.TEST_GENERATION_CHUNK_SIZE, help="Historias por tarea de cada proceso."
+    )
+    regenerate_parser.add_argument("--batch-size", type=int, default=5000, help="Historias leídas de MongoDB por bloque.")
+    regenerate_parser.add_argument("--force", action="store_true", help="Regenera aunque las acciones no hayan cambiado.")
+    args = parser.parse_args()
+
+    # El CLI siempre usa el pool: los bloques son grandes y no compiten con solicitudes HTTP.
+    test_generation.TEST_GENERATION_CHUNK_SIZE = args.chunk_size
+    test_generation.TEST_GENERATION_PARALLEL_THRESHOLD = 0
+    test_generation.init_generation_pool(args.workers)
+    start = time.perf_counter()
+    try:
+        processed = asyncio.run(regenerate(args.story_id, args.batch_size, args.force))
+    finally:
+        test_generation.close_generation_pool()
+    print(f"{processed} historias procesadas en {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
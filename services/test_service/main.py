@@ -1,24 +1,25 @@
-import os
 from fastapi import FastAPI
 from routes.v1.tests import router as tests_router
+from monitoring import router as monitoring_router
 from contextlib import asynccontextmanager
-from database_manager import DatabaseManager
+from dependencies import init_database_manager, close_database_manager
+from http_client import init_http_client, close_http_client
+from test_generation import init_generation_pool, close_generation_pool
 from logging_config import logger
 
-db_uri = os.getenv("DB_URI")
-db_name = os.getenv("DB_NAME")
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Configura el ciclo de vida de la aplicación FastAPI, incluyendo la inicialización y cierre de la base de datos.
     """
-    global db_manager
     try:
+        # El pool se crea antes que los hilos del cliente de MongoDB y del gestor asíncrono.
+        init_generation_pool()
         logger.info("Inicializando conexión a MongoDB...")
-        db_manager = DatabaseManager(uri=db_uri, db_name=db_name)
+        db_manager = init_database_manager()
+        init_http_client()
 
-        db_manager.create_indexes()
+        await db_manager.create_indexes()
         logger.info("Conexión a MongoDB inicializada y los índices fueron creados.")
 
         yield
@@ -27,9 +28,10 @@ async def lifespan(app: FastAPI):
         logger.error(f"Error en la conexión a MongoDB: {e}", exc_info=True)
         raise e
     finally:
-        if db_manager and db_manager.client:
-            db_manager.client.close()
-            logger.info("Conexión a MongoDB cerrada.")
+        await close_http_client()
+        close_generation_pool()
+        close_database_manager()
+        logger.info("Conexión a MongoDB cerrada.")
 
 
 app = FastAPI(
@@ -55,3 +57,4 @@ async def log_requests(request, call_next):
 
 
 app.include_router(tests_router)
+app.include_router(monitoring_router)
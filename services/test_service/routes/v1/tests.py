@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Query, HTTPException, Depends
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
 from models.test import Test
-from test_application import generate_tests
+from test_application import generate_tests, stream_tests
 from dependencies import get_database_manager
-from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
 from logging_config import logger
 
 router = APIRouter(prefix="/v1/tests")
@@ -11,19 +12,34 @@ router = APIRouter(prefix="/v1/tests")
 
 @router.get("/", summary="Generar tests de Playwright")
 async def get_tests_endpoint(
-    db_manager: DatabaseManager = Depends(get_database_manager),
+    db_manager: AsyncDatabaseManager = Depends(get_database_manager),
     story_id: Optional[str] = Query(None, description="Filtrar por ID de la historia (opcional)"),
+    stream: Optional[Literal["ndjson", "zip"]] = Query(
+        None, description="Emitir los tests a medida que se generan: `ndjson` o un archivo `zip` de scripts"
+    ),
 ) -> List[Test]:
     """
     Endpoint para generar y retornar los tests de Playwright basados en historias.
 
+    Con `stream` los tests se generan y emiten por bloques de historias, sin construir la lista completa.
+
     Args:
-        db_manager (DatabaseManager): Gestor de base de datos.
+        db_manager (AsyncDatabaseManager): Gestor de base de datos.
         story_id (Optional[str]): Identificador único de la historia.
+        stream (Optional[str]): Formato de streaming (`ndjson` o `zip`).
 
     Returns:
         List[Test]: Lista de tests generados.
     """
+    if stream == "ndjson":
+        return StreamingResponse(stream_tests(db_manager, story_id, "ndjson"), media_type="application/x-ndjson")
+    if stream == "zip":
+        return StreamingResponse(
+            stream_tests(db_manager, story_id, "zip"),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="playwright_tests.zip"'},
+        )
+
     try:
         logger.info(f"Iniciando generación de tests para story_id={story_id}")
         tests = await generate_tests(db_manager=db_manager, story_id=story_id)
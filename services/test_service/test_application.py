@@ -1,14 +1,57 @@
 import httpx
+import io
+import json
 import os
+import re
+import zipfile
 from dotenv import load_dotenv
-from typing import List, Optional
-from models.story import Story
+from typing import AsyncIterator, List, Optional, Union
+from models.story import Story, StoryActions
 from models.test import Test
-from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
+from http_client import get_http_client
+from test_generation import generate_tests_batch_async
 from logging_config import logger
 
 load_dotenv()
 STORIES_SERVICE_URL = os.getenv("STORIES_SERVICE_URL")
+STORIES_FETCH_TIMEOUT_SECONDS = float(os.getenv("STORIES_FETCH_TIMEOUT_SECONDS", "30"))
+# Origen de las historias: "http" (servicio de historias) o "database" (lectura directa de MongoDB, con HTTP como respaldo)
+STORY_SOURCES = ("http", "database")
+TEST_STORY_SOURCE = os.getenv("TEST_STORY_SOURCE", "http").lower()
+if TEST_STORY_SOURCE not in STORY_SOURCES:
+    raise ValueError(f"Invalid TEST_STORY_SOURCE: {TEST_STORY_SOURCE}")
+# Historias por bloque al emitir tests en modo streaming
+TESTS_STREAM_BATCH_SIZE = int(os.getenv("TESTS_STREAM_BATCH_SIZE", "200"))
+# Tamaño máximo de página que acepta GET /v1/stories/?limit=
+STORIES_PAGE_MAX_SIZE = 1000
+STREAM_FORMATS = ("ndjson", "zip")
+
+def _parse_stories_response(stories_data) -> List[Story]:
+    """
+    Valida la respuesta `{"stories": [...]}` del servicio de historias y descarta las historias inválidas.
+    """
+    if not isinstance(stories_data, dict) or 'stories' not in stories_data:
+        logger.error(f"El formato de la respuesta no es válido: {stories_data}")
+        raise Exception("El formato de la respuesta no es válido: se esperaba un diccionario con la clave 'stories'.")
+
+    stories_list = stories_data.get('stories', [])
+
+    if not isinstance(stories_list, list):
+        logger.error(f"El formato de la lista de historias no es válido: {stories_list}")
+        raise Exception("El formato de la lista de historias no es válido: se esperaba una lista.")
+
+    valid_stories = []
+    for story_data in stories_list:
+        if isinstance(story_data, dict):
+            try:
+                valid_stories.append(Story(**story_data))
+            except Exception as e:
+                logger.warning(f"Historia inválida: {story_data}. Error: {str(e)}")
+        else:
+            logger.warning(f"Elemento no válido en historias: {story_data}")
+    return valid_stories
+
 
 async def fetch_stories(story_id: Optional[str] = None) -> List[Story]:
     """
@@ -27,32 +70,10 @@ async def fetch_stories(story_id: Optional[str] = None) -> List[Story]:
         url = f"{STORIES_SERVICE_URL}?story_id={story_id}" if story_id else STORIES_SERVICE_URL
         logger.info(f"Solicitando historias al servicio de historias: {url}")
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-
-        stories_data = response.json()
-
-        if not isinstance(stories_data, dict) or 'stories' not in stories_data:
-            logger.error(f"El formato de la respuesta no es válido: {stories_data}")
-            raise Exception("El formato de la respuesta no es válido: se esperaba un diccionario con la clave 'stories'.")
-
-        stories_list = stories_data.get('stories', [])
-
-        if not isinstance(stories_list, list):
-            logger.error(f"El formato de la lista de historias no es válido: {stories_list}")
-            raise Exception("El formato de la lista de historias no es válido: se esperaba una lista.")
-
-        valid_stories = []
-        for story_data in stories_list:
-            if isinstance(story_data, dict):
-                try:
-                    valid_stories.append(Story(**story_data))
-                except Exception as e:
-                    logger.warning(f"Historia inválida: {story_data}. Error: {str(e)}")
-            else:
-                logger.warning(f"Elemento no válido en historias: {story_data}")
+        response = await get_http_client().get(url, timeout=STORIES_FETCH_TIMEOUT_SECONDS)
+        response.raise_for_status()
 
+        valid_stories = _parse_stories_response(response.json())
         logger.info(f"Se recuperaron {len(valid_stories)} historias válidas del servicio.")
         return valid_stories
 
@@ -61,33 +82,224 @@ async def fetch_stories(story_id: Optional[str] = None) -> List[Story]:
         raise Exception(f"Error al obtener historias: {str(e)}")
 
 
-async def generate_tests(db_manager: DatabaseManager, story_id: Optional[str] = None) -> List[Test]:
+async def fetch_stories_from_database(
+    db_manager: AsyncDatabaseManager, story_id: Optional[str] = None
+) -> List[StoryActions]:
+    """
+    Lee las historias directamente de MongoDB, proyectando solo el ID y las acciones.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de base de datos.
+        story_id (Optional[str]): Identificador único de la historia (opcional).
+
+    Returns:
+        List[StoryActions]: Historias reducidas a lo que necesita la generación de tests.
+    """
+    documents = await db_manager.get_story_actions(story_id)
+    logger.info(f"Se leyeron {len(documents)} historias desde la base de datos.")
+    return [StoryActions(**document) for document in documents]
+
+
+async def load_stories(
+    db_manager: AsyncDatabaseManager, story_id: Optional[str] = None
+) -> List[Union[Story, StoryActions]]:
+    """
+    Obtiene las historias desde el origen configurado en `TEST_STORY_SOURCE`.
+    Si la lectura directa de MongoDB falla, se recurre al servicio de historias.
+    """
+    if TEST_STORY_SOURCE == "database":
+        try:
+            return await fetch_stories_from_database(db_manager, story_id)
+        except Exception as e:
+            logger.warning(f"No se pudieron leer las historias desde la base de datos, se usa HTTP: {e}")
+    return await fetch_stories(story_id)
+
+
+async def generate_tests(db_manager: AsyncDatabaseManager, story_id: Optional[str] = None) -> List[Test]:
     """
     Genera tests de Playwright basados en historias de usuario.
 
+    Los tests se guardan en la colección `tests` junto con el hash de las acciones de su historia;
+    solo se regeneran las historias cuyas acciones cambiaron desde la última generación.
+
     Args:
-        db_manager (DatabaseManager): Gestor de base de datos.
+        db_manager (AsyncDatabaseManager): Gestor de base de datos.
         story_id (Optional[str]): Identificador único de la historia (opcional).
 
     Returns:
         List[Test]: Lista de tests generados.
     """
     try:
-        stories = await fetch_stories(story_id)
+        stories = await load_stories(db_manager, story_id)
         if not stories:
             logger.warning(f"No se encontraron historias para story_id={story_id}")
             return []
 
-        valid_stories = [
-            Story(**story) if isinstance(story, dict) else story
-            for story in stories
-        ]
-        
-        logger.info(f"Generando tests para {len(valid_stories)} historias...")
-        tests = [Test.from_story(story) for story in valid_stories]
-        logger.info(f"Se generaron {len(tests)} tests exitosamente.")
+        tests = await _get_or_generate_tests(db_manager, stories)
+        logger.info(f"Se obtuvieron {len(tests)} tests exitosamente.")
         return tests
 
     except Exception as e:
         logger.error(f"Error generando tests: {e}", exc_info=True)
         raise Exception(f"Error generando tests: {str(e)}")
+
+
+async def fetch_story_pages(page_size: int) -> AsyncIterator[List[Story]]:
+    """
+    Recorre todas las historias del servicio de historias página por página (`limit`/`after`),
+    así nunca se tiene en memoria más de una página.
+
+    Args:
+        page_size (int): Historias por página (el servicio admite hasta 1000).
+    """
+    if not STORIES_SERVICE_URL:
+        raise Exception("STORIES_SERVICE_URL no configurado en las variables de entorno.")
+
+    after = None
+    try:
+        while True:
+            params = {"limit": min(page_size, STORIES_PAGE_MAX_SIZE)}
+            if after is not None:
+                params["after"] = after
+            response = await get_http_client().get(
+                STORIES_SERVICE_URL, params=params, timeout=STORIES_FETCH_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+            page = response.json()
+            stories = _parse_stories_response(page)
+            if stories:
+                yield stories
+            after = page.get("next_after")
+            if after is None:
+                return
+    except httpx.HTTPError as e:
+        logger.error(f"Error al recorrer las historias del servicio: {e}", exc_info=True)
+        raise Exception(f"Error al obtener historias: {str(e)}")
+
+
+async def iter_story_batches(
+    db_manager: AsyncDatabaseManager, story_id: Optional[str] = None
+) -> AsyncIterator[List[Union[Story, StoryActions]]]:
+    """
+    Entrega las historias por bloques. Con `TEST_STORY_SOURCE=database` se leen de un cursor de MongoDB
+    y, como en `load_stories`, si la lectura falla antes del primer bloque se recurre al servicio de
+    historias. Con `http` se recorren las páginas del servicio.
+    """
+    if TEST_STORY_SOURCE == "database":
+        yielded = False
+        try:
+            async for documents in db_manager.iter_story_actions(story_id, batch_size=TESTS_STREAM_BATCH_SIZE):
+                yielded = True
+                yield [StoryActions(**document) for document in documents]
+            return
+        except Exception as e:
+            if yielded:
+                raise  # Parte de la respuesta ya se envió: recomenzar por HTTP repetiría historias.
+            logger.warning(f"No se pudieron leer las historias desde la base de datos, se usa HTTP: {e}")
+
+    if story_id:
+        yield await fetch_stories(story_id)
+        return
+    async for stories in fetch_story_pages(TESTS_STREAM_BATCH_SIZE):
+        yield stories
+
+
+class _ZipChunks(io.RawIOBase):
+    """
+    Destino no posicionable para `zipfile`: acumula lo escrito hasta que se retira con `drain`.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _script_filename(story_id: str) -> str:
+    return "test_" + re.sub(r"[^A-Za-z0-9_.-]", "_", story_id) + ".py"
+
+
+async def stream_tests(
+    db_manager: AsyncDatabaseManager, story_id: Optional[str] = None, stream_format: str = "ndjson"
+) -> AsyncIterator[bytes]:
+    """
+    Genera y emite los tests bloque a bloque, sin mantener todos los scripts en memoria.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de base de datos.
+        story_id (Optional[str]): Identificador único de la historia (opcional).
+        stream_format (str): `ndjson` (un test por línea) o `zip` (un archivo `.py` por historia).
+
+    Yields:
+        bytes: Fragmentos de la respuesta.
+    """
+    if stream_format not in STREAM_FORMATS:
+        raise ValueError(f"Formato de streaming no soportado: {stream_format}")
+
+    if stream_format == "ndjson":
+        async for stories in iter_story_batches(db_manager, story_id):
+            tests = await _get_or_generate_tests(db_manager, stories)
+            yield "".join(json.dumps(test.model_dump()) + "\n" for test in tests).encode("utf-8")
+        return
+
+    sink = _ZipChunks()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for stories in iter_story_batches(db_manager, story_id):
+            for test in await _get_or_generate_tests(db_manager, stories):
+                archive.writestr(_script_filename(test.story_id), test.test_script)
+            yield sink.drain()
+    yield sink.drain()  # Directorio central del archivo
+
+
+async def _get_or_generate_tests(
+    db_manager: AsyncDatabaseManager, stories: List[Union[Story, StoryActions]], force: bool = False
+) -> List[Test]:
+    """
+    Reutiliza los tests guardados cuyas historias no cambiaron y genera (y guarda) el resto.
+    Los tests a generar se reparten entre los procesos del pool de generación.
+
+    Args:
+        db_manager (AsyncDatabaseManager): Gestor de base de datos.
+        stories (List[Union[Story, StoryActions]]): Historias para las que se necesitan tests.
+        force (bool): Regenera todos los tests aunque sus historias no hayan cambiado.
+
+    Returns:
+        List[Test]: Un test por historia, en el mismo orden.
+    """
+    hashes = {story.id: Test.actions_hash(story.actions) for story in stories}
+    stored = {} if force else {
+        doc["story_id"]: doc
+        for doc in await db_manager.get_tests_by_story_ids(list(hashes))
+    }
+
+    tests: List[Optional[Test]] = []
+    pending_positions, pending_stories = [], []
+    for story in stories:
+        cached = stored.get(story.id)
+        if cached and cached.get("actions_hash") == hashes[story.id]:
+            tests.append(Test(story_id=story.id, test_script=cached["test_script"]))
+            continue
+        pending_positions.append(len(tests))
+        pending_stories.append(story)
+        tests.append(None)
+
+    if pending_stories:
+        logger.info(f"Generando tests para {len(pending_stories)} de {len(stories)} historias (el resto no cambió).")
+        generated = await generate_tests_batch_async(pending_stories)
+        for position, test in zip(pending_positions, generated):
+            tests[position] = test
+        await db_manager.bulk_upsert_tests([
+            {"story_id": test.story_id, "actions_hash": hashes[test.story_id], "test_script": test.test_script}
+            for test in generated
+        ])
+    return tests
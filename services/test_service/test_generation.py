@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+from models.story import Story, StoryActions
+from models.test import Test
+from logging_config import logger
+
+load_dotenv()
+
+# Procesos para generar scripts en paralelo (0 o 1 deshabilita el pool y genera en el proceso actual)
+TEST_GENERATION_WORKERS = int(os.getenv("TEST_GENERATION_WORKERS", str(os.cpu_count() or 1)))
+# Historias enviadas a cada proceso por tarea
+TEST_GENERATION_CHUNK_SIZE = int(os.getenv("TEST_GENERATION_CHUNK_SIZE", "256"))
+# Por debajo de esta cantidad de historias el costo de serializar hacia los procesos supera la ganancia
+TEST_GENERATION_PARALLEL_THRESHOLD = int(os.getenv("TEST_GENERATION_PARALLEL_THRESHOLD", "1000"))
+# Cómo se inician los procesos: `fork` copiaría un proceso con hilos vivos (monitores de pymongo,
+# executor del gestor asíncrono), lo que puede dejar al hijo bloqueado en un lock tomado por otro hilo
+TEST_GENERATION_START_METHOD = os.getenv("TEST_GENERATION_START_METHOD", "spawn").lower()
+if TEST_GENERATION_START_METHOD not in ("spawn", "forkserver"):
+    raise ValueError(f"Invalid TEST_GENERATION_START_METHOD: {TEST_GENERATION_START_METHOD}")
+
+_generation_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ScriptAction(NamedTuple):
+    """
+    Acción reducida a los campos que lee `Test.generate_script_from_actions`.
+    Viaja a los procesos como tupla: serializar los modelos de pydantic cuesta más que generar el script.
+    """
+    type: str
+    target: Optional[str]
+    value: Optional[str]
+    url: Optional[str]
+
+
+def _to_payload(story: Union[Story, StoryActions]) -> Tuple[str, List[tuple]]:
+    return story.id, [(action.type, action.target, action.value, action.url) for action in story.actions]
+
+
+def _generate_script(payload: Tuple[str, List[tuple]]) -> str:
+    """
+    Tarea ejecutada en los procesos del pool.
+    """
+    _, actions = payload
+    return Test.generate_script_from_actions([ScriptAction(*action) for action in actions])
+
+
+def init_generation_pool(workers: int = TEST_GENERATION_WORKERS) -> Optional[ProcessPoolExecutor]:
+    """
+    Crea el pool de procesos compartido para la generación de tests. Se invoca desde el `lifespan` (antes de
+    abrir la conexión a MongoDB) o el CLI. Los procesos se inician con `TEST_GENERATION_START_METHOD`, nunca
+    con `fork`. Con un solo proceso no se crea: el pool solo agregaría el costo de serialización.
+    """
+    global _generation_pool
+    if _generation_pool is None and workers > 1:
+        _generation_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context(TEST_GENERATION_START_METHOD)
+        )
+        logger.info(f"Pool de generación de tests inicializado con {workers} procesos.")
+    return _generation_pool
+
+
+def close_generation_pool():
+    """
+    Detiene el pool de procesos de generación de tests.
+    """
+    global _generation_pool
+    if _generation_pool is not None:
+        _generation_pool.shutdown(wait=True)
+        _generation_pool = None
+
+
+def generate_tests_batch(
+    stories: Sequence[Union[Story, StoryActions]],
+    chunk_size: Optional[int] = None,
+    parallel_threshold: Optional[int] = None,
+) -> List[Test]:
+    """
+    Genera los tests de un lote de historias, repartiéndolas en bloques entre los procesos del pool.
+
+    Args:
+        stories (Sequence[Union[Story, StoryActions]]): Historias a convertir.
+        chunk_size (Optional[int]): Historias por tarea enviada a cada proceso (por defecto `TEST_GENERATION_CHUNK_SIZE`).
+        parallel_threshold (Optional[int]): Cantidad mínima de historias para usar el pool
+            (por defecto `TEST_GENERATION_PARALLEL_THRESHOLD`).
+
+    Returns:
+        List[Test]: Un test por historia, en el mismo orden de entrada.
+    """
+    chunk_size = chunk_size or TEST_GENERATION_CHUNK_SIZE
+    if parallel_threshold is None:
+        parallel_threshold = TEST_GENERATION_PARALLEL_THRESHOLD
+    if _generation_pool is None or len(stories) < parallel_threshold:
+        return [Test.from_story(story) for story in stories]
+    payloads = [_to_payload(story) for story in stories]
+    scripts = _generation_pool.map(_generate_script, payloads, chunksize=chunk_size)
+    return [Test(story_id=story_id, test_script=script) for (story_id, _), script in zip(payloads, scripts)]
+
+
+async def generate_tests_batch_async(stories: Sequence[Union[Story, StoryActions]]) -> List[Test]:
+    """
+    Versión para el event loop de `generate_tests_batch`: la espera ocurre en un hilo aparte.
+    """
+    if not stories:
+        return []
+    return await asyncio.get_running_loop().run_in_executor(None, generate_tests_batch, stories)
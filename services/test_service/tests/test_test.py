@@ -35,10 +35,13 @@ def mock_database_manager(mocker):
 
 def test_get_tests_endpoint(mocker):
     # Mock para `fetch_stories`
+    from models.story import Story
+
+    # `fetch_stories` devuelve historias ya validadas.
     mock_fetch_stories = mocker.patch(
         "test_application.fetch_stories",
         return_value=[
-            {
+            Story(**{
                 "id": "story-1",
                 "session_id": "session-1",
                 "title": "Mock Story",
@@ -48,7 +51,7 @@ def test_get_tests_endpoint(mocker):
                 "finalState": {"url": "https://example.com/final"},
                 "actions": [{"type": "click", "target": "button", "value": "Submit"}],
                 "networkRequests": []
-            }
+            })
         ]
     )
 
@@ -60,3 +63,203 @@ def test_get_tests_endpoint(mocker):
         assert isinstance(data, list)
         assert len(data) == 1
         assert data[0]["story_id"] == "story-1"
+
+
+def test_http_client_stats_count_connection_reuse():
+    import asyncio
+    import httpx
+    from http_client import HttpClientStats
+
+    class FakeStream:
+        pass
+
+    first_connection, second_connection = FakeStream(), FakeStream()
+    stats = HttpClientStats()
+
+    async def record_all():
+        for stream in (first_connection, first_connection, second_connection, first_connection):
+            await stats.record_response(httpx.Response(200, extensions={"network_stream": stream}))
+
+    asyncio.run(record_all())
+    snapshot = stats.snapshot()
+    assert snapshot["requests"] == 4
+    assert snapshot["new_connections"] == 2
+    assert snapshot["reused_connections"] == 2
+    assert snapshot["reuse_ratio"] == 0.5
+
+
+def test_generate_tests_reuses_unchanged_scripts(mocker):
+    import asyncio
+    from models.story import Story
+    from models.test import Test
+    from test_application import generate_tests
+
+    stored_tests = {}
+    db_manager = MagicMock()
+    db_manager.get_tests_by_story_ids = AsyncMock(
+        side_effect=lambda ids: [dict(stored_tests[story_id]) for story_id in ids if story_id in stored_tests]
+    )
+    db_manager.bulk_upsert_tests = AsyncMock(
+        side_effect=lambda tests: stored_tests.update({test["story_id"]: test for test in tests})
+    )
+
+    def build_story(story_id, actions):
+        return Story(
+            id=story_id,
+            session_id=f"session-{story_id}",
+            title="Mock Story",
+            startTimestamp="2024-01-01T00:00:00Z",
+            endTimestamp="2024-01-01T01:00:00Z",
+            initialState={"url": "https://example.com"},
+            finalState={"url": "https://example.com/final"},
+            actions=actions,
+            networkRequests=[],
+        )
+
+    click = {"type": "click", "target": "button", "value": "Submit"}
+    stories = [build_story("story-1", [click]), build_story("story-2", [click])]
+    mocker.patch("test_application.fetch_stories", AsyncMock(side_effect=lambda story_id: stories))
+    generator = mocker.spy(Test, "generate_script_from_actions")
+
+    first = asyncio.run(generate_tests(db_manager))
+    assert [test.story_id for test in first] == ["story-1", "story-2"]
+    assert generator.call_count == 2
+
+    # Solo se modifican las acciones de story-2 (el timestamp no cambia el script).
+    stories[0] = build_story("story-1", [dict(click, timestamp="2024-01-01T00:00:01.000Z")])
+    stories[1] = build_story("story-2", [click, {"type": "navigation", "url": "https://example.com/next"}])
+    second = asyncio.run(generate_tests(db_manager))
+    assert generator.call_count == 3
+    assert second[0].test_script == first[0].test_script
+    assert "page.goto('https://example.com/next')" in second[1].test_script
+    assert db_manager.bulk_upsert_tests.await_args.args[0][0]["story_id"] == "story-2"
+
+
+def test_load_stories_reads_database_and_falls_back_to_http(mocker):
+    import asyncio
+    import test_application
+    from models.story import StoryActions
+
+    mocker.patch.object(test_application, "TEST_STORY_SOURCE", "database")
+    fetch_http = mocker.patch("test_application.fetch_stories", AsyncMock(return_value=["from-http"]))
+    db_manager = MagicMock()
+    db_manager.get_story_actions = AsyncMock(
+        return_value=[{"id": "story-1", "actions": [{"type": "click", "target": "button", "value": "Submit"}]}]
+    )
+
+    stories = asyncio.run(test_application.load_stories(db_manager, "story-1"))
+    assert stories == [StoryActions(id="story-1", actions=[{"type": "click", "target": "button", "value": "Submit"}])]
+    db_manager.get_story_actions.assert_awaited_once_with("story-1")
+    fetch_http.assert_not_awaited()
+
+    db_manager.get_story_actions.side_effect = RuntimeError("mongo no disponible")
+    assert asyncio.run(test_application.load_stories(db_manager)) == ["from-http"]
+
+
+def test_get_tests_streaming_ndjson_and_zip(mocker):
+    import io
+    import json
+    import zipfile
+    import test_application
+    from dependencies import get_database_manager
+
+    stories = [
+        {"id": f"story-{index}", "actions": [{"type": "click", "target": f"#button-{index}"}]}
+        for index in range(5)
+    ]
+
+    async def iter_story_actions(story_id=None, batch_size=500):
+        for start in range(0, len(stories), batch_size):
+            yield stories[start:start + batch_size]
+
+    db_manager = MagicMock()
+    db_manager.iter_story_actions = iter_story_actions
+    db_manager.get_tests_by_story_ids = AsyncMock(return_value=[])
+    db_manager.bulk_upsert_tests = AsyncMock()
+    mocker.patch.object(test_application, "TEST_STORY_SOURCE", "database")
+    mocker.patch.object(test_application, "TESTS_STREAM_BATCH_SIZE", 2)
+    app.dependency_overrides[get_database_manager] = lambda: db_manager
+    try:
+        response = client.get("/v1/tests/", params={"stream": "ndjson"})
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["story_id"] for line in lines] == [f"story-{index}" for index in range(5)]
+        assert db_manager.bulk_upsert_tests.await_count == 3  # Un bloque de 2 historias por vez
+
+        response = client.get("/v1/tests/", params={"stream": "zip"})
+        assert response.headers["content-type"] == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            assert sorted(archive.namelist()) == [f"test_story-{index}.py" for index in range(5)]
+            assert "page.locator('#button-3').click()" in archive.read("test_story-3.py").decode()
+    finally:
+        app.dependency_overrides = {}
+
+
+def test_generate_tests_batch_uses_process_pool_in_order():
+    import test_generation
+    from models.story import StoryActions
+    from models.test import Test
+
+    stories = [
+        StoryActions(id=f"story-{index}", actions=[{"type": "input", "target": "#q", "value": str(index)}])
+        for index in range(50)
+    ]
+    expected = [Test.from_story(story) for story in stories]
+
+    test_generation.init_generation_pool(2)
+    try:
+        generated = test_generation.generate_tests_batch(stories, chunk_size=7, parallel_threshold=0)
+    finally:
+        test_generation.close_generation_pool()
+    assert generated == expected
+
+
+def test_iter_story_batches_pages_over_http_and_falls_back_from_database(mocker):
+    import asyncio
+    import httpx
+    import test_application
+
+    def story(index):
+        return {
+            "id": f"story-{index}",
+            "session_id": "session-1",
+            "title": "Mock Story",
+            "startTimestamp": "2024-01-01T00:00:00Z",
+            "endTimestamp": "2024-01-01T01:00:00Z",
+            "initialState": {"url": "https://example.com"},
+            "finalState": {"url": "https://example.com/final"},
+            "actions": [{"type": "click", "target": "button", "value": "Submit"}],
+            "networkRequests": [],
+        }
+
+    pages = {
+        None: {"stories": [story(0), story(1)], "next_after": "story-1"},
+        "story-1": {"stories": [story(2)], "next_after": None},
+    }
+
+    async def get(url, params=None, timeout=None):
+        return httpx.Response(200, json=pages[params.get("after")], request=httpx.Request("GET", url))
+
+    http_client = MagicMock()
+    http_client.get = AsyncMock(side_effect=get)
+    mocker.patch("test_application.get_http_client", return_value=http_client)
+    mocker.patch.object(test_application, "STORIES_SERVICE_URL", "http://stories/v1/stories/")
+    mocker.patch.object(test_application, "TESTS_STREAM_BATCH_SIZE", 2)
+
+    async def broken_cursor(story_id=None, batch_size=500):
+        raise RuntimeError("mongo no disponible")
+        yield
+
+    db_manager = MagicMock()
+    db_manager.iter_story_actions = broken_cursor
+
+    async def collect():
+        return [[s.id for s in batch] async for batch in test_application.iter_story_batches(db_manager)]
+
+    for source in ("http", "database"):
+        mocker.patch.object(test_application, "TEST_STORY_SOURCE", source)
+        http_client.get.reset_mock()
+        assert asyncio.run(collect()) == [["story-0", "story-1"], ["story-2"]]
+        assert [call.kwargs["params"] for call in http_client.get.await_args_list] == [
+            {"limit": 2}, {"limit": 2, "after": "story-1"}
+        ]
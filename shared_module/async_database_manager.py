@@ -0,0 +1,75 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from database_manager import DatabaseManager
+
+ASYNC_MODES = ("threadpool", "inline")
+
+
+class AsyncDatabaseManager:
+    """
+    Fachada asíncrona de `DatabaseManager`: expone los mismos métodos como corrutinas.
+
+    En modo `threadpool` cada operación de pymongo se ejecuta en un pool de hilos acotado, de modo que
+    el event loop de uvicorn sigue atendiendo otras solicitudes mientras espera a MongoDB.
+    En modo `inline` las operaciones se ejecutan directamente en el event loop (comportamiento bloqueante).
+    Los métodos `iter_*` del gestor (generadores por bloques) se exponen como iteradores asíncronos.
+    """
+
+    # Métodos que no hacen I/O y se devuelven tal cual.
+    _NON_BLOCKING = {"get_collection", "get_pool_stats"}
+
+    def __init__(self, db_manager: DatabaseManager, mode: str = "threadpool", max_workers: int = 16):
+        if mode not in ASYNC_MODES:
+            raise ValueError(f"Invalid DB_ASYNC_MODE: {mode}")
+
+        self.db_manager = db_manager
+        self.mode = mode
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if mode == "threadpool":
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db_manager, name)
+        if name in self._NON_BLOCKING or name.startswith("_") or not callable(attr):
+            return attr
+        if name.startswith("iter_"):
+            return self._wrap_iterator(attr)
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        return call
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Ejecuta una función bloqueante según el modo configurado y espera su resultado.
+        """
+        if self._executor is None:
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def _wrap_iterator(self, func):
+        @functools.wraps(func)
+        async def iterate(*args, **kwargs):
+            iterator = func(*args, **kwargs)
+            exhausted = object()
+            try:
+                while True:
+                    batch = await self.run(next, iterator, exhausted)
+                    if batch is exhausted:
+                        break
+                    yield batch
+            finally:
+                await self.run(iterator.close)
+
+        return iterate
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.db_manager.close()
@@ -1,18 +1,36 @@
 import os
+import uuid
 import redis
 import fakeredis
 import json
 from dotenv import load_dotenv
-from typing import Dict
+from typing import Dict, List, Optional
+from local_cache import LocalCache
 
 load_dotenv()
 
+# Nivel en memoria del proceso delante de Redis (0 entradas lo deshabilita)
+CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", "0"))
+CACHE_LOCAL_MAX_BYTES = int(os.getenv("CACHE_LOCAL_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_LOCAL_TTL_SECONDS = float(os.getenv("CACHE_LOCAL_TTL_SECONDS", "5"))
+# Canal de pub/sub con el que los procesos se avisan las claves modificadas
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache-invalidation")
+
 class CacheManager:
     """
     Gestor de cache configurable para usar Redis o fakeredis según el entorno.
+
+    Opcionalmente mantiene un nivel LRU en memoria delante de Redis. Cada escritura o borrado se
+    publica en `CACHE_INVALIDATION_CHANNEL` para que los demás procesos descarten su copia local.
     """
 
-    def __init__(self, ttl: int = 3600):
+    def __init__(
+        self,
+        ttl: int = 3600,
+        local_max_entries: int = CACHE_LOCAL_MAX_ENTRIES,
+        local_max_bytes: int = CACHE_LOCAL_MAX_BYTES,
+        local_ttl: float = CACHE_LOCAL_TTL_SECONDS,
+    ):
         self.ttl = ttl
         cache_backend = os.getenv("CACHE_BACKEND", "redis").lower()
 
@@ -25,6 +43,13 @@ class CacheManager:
         else:
             raise ValueError(f"Invalid CACHE_BACKEND: {cache_backend}")
 
+        self.instance_id = uuid.uuid4().hex
+        self.local: Optional[LocalCache] = None
+        self._pubsub_thread = None
+        if local_max_entries > 0:
+            self.local = LocalCache(max_entries=local_max_entries, max_bytes=local_max_bytes, ttl=local_ttl)
+            self._subscribe()
+
     def _connect(self):
         """
         Conecta al servidor Redis.
@@ -38,14 +63,154 @@ class CacheManager:
             print(f"[ERROR] Could not connect to Redis: {str(e)}")
             raise Exception("Failed to connect to Redis. Check your configuration.")
 
+    def _subscribe(self):
+        """
+        Escucha el canal de invalidación en un hilo en segundo plano.
+        """
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{CACHE_INVALIDATION_CHANNEL: self._handle_invalidation})
+        self._pubsub_thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _handle_invalidation(self, message: dict):
+        payload = json.loads(message["data"])
+        if payload.get("origin") == self.instance_id:
+            return  # El propio proceso ya actualizó su nivel local.
+        for key in payload.get("keys", []):
+            self.local.delete(key)
+
+    def _publish_invalidation(self, keys: List[str]):
+        if self.local is not None and keys:
+            self.redis.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": self.instance_id, "keys": keys}))
+
     def save(self, key: str, data: dict):
-        self.redis.setex(key, self.ttl, json.dumps(data))
+        self.save_many({key: data})
 
     def get(self, key: str) -> dict:
-        cached_data = self.redis.get(key)
-        if cached_data:
-            return json.loads(cached_data)
-        return {}
+        return self.get_many([key]).get(key, {})
+
+    def save_many(self, items: Dict[str, dict]):
+        """
+        Guarda varias claves en un único pipeline de Redis.
+        """
+        if not items:
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        for key, data in items.items():
+            serialized = json.dumps(data)
+            pipeline.setex(key, self.ttl, serialized)
+            if self.local is not None:
+                self.local.set(key, data, len(serialized))
+        pipeline.execute()
+        self._publish_invalidation(list(items))
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """
+        Obtiene varias claves: primero del nivel local y el resto con un único MGET.
+
+        Returns:
+            Dict[str, dict]: Valores encontrados (las claves ausentes no se incluyen).
+        """
+        found: Dict[str, dict] = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key) if self.local is not None else None
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+
+        if missing:
+            for key, cached_data in zip(missing, self.redis.mget(missing)):
+                if cached_data:
+                    value = json.loads(cached_data)
+                    found[key] = value
+                    if self.local is not None:
+                        self.local.set(key, value, len(cached_data))
+        return found
 
     def delete(self, key: str):
-        self.redis.delete(key)
+        self.delete_many([key])
+
+    def delete_many(self, keys: List[str]):
+        if keys:
+            if self.local is not None:
+                for key in keys:
+                    self.local.delete(key)
+            self.redis.delete(*keys)
+            self._publish_invalidation(keys)
+
+    @staticmethod
+    def _generation_key(key: str) -> str:
+        return f"{key}:generation"
+
+    def get_generation(self, key: str) -> Optional[bytes]:
+        """
+        Generación actual de una clave (None si nunca se invalidó). Se lee antes de consultar la base de datos
+        y se pasa a `save_if_generation`.
+        """
+        return self.redis.get(self._generation_key(key))
+
+    def save_if_generation(self, key: str, data: dict, generation: Optional[bytes]) -> bool:
+        """
+        Guarda una clave solo si su generación sigue siendo `generation`. Si `invalidate_many` la incrementó
+        mientras se consultaba la base de datos, el valor leído puede ser anterior a esa escritura y se descarta.
+
+        Returns:
+            bool: Si el valor se guardó.
+        """
+        serialized = json.dumps(data)
+        generation_key = self._generation_key(key)
+        with self.redis.pipeline() as pipeline:
+            try:
+                pipeline.watch(generation_key)
+                if pipeline.get(generation_key) != generation:
+                    return False
+                pipeline.multi()
+                pipeline.setex(key, self.ttl, serialized)
+                pipeline.execute()
+            except redis.WatchError:
+                return False
+        if self.local is not None:
+            self.local.set(key, data, len(serialized))
+        self._publish_invalidation([key])
+        return True
+
+    def invalidate_many(self, keys: List[str]):
+        """
+        Borra varias claves e incrementa su generación, así una lectura que empezó antes de la escritura
+        no vuelve a guardar el valor anterior con `save_if_generation`.
+        """
+        if not keys:
+            return
+        if self.local is not None:
+            for key in keys:
+                self.local.delete(key)
+        pipeline = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipeline.incr(self._generation_key(key))
+            pipeline.expire(self._generation_key(key), self.ttl)
+        pipeline.delete(*keys)
+        pipeline.execute()
+        self._publish_invalidation(keys)
+
+    def stats(self) -> dict:
+        """
+        Estadísticas del nivel en memoria (vacío si está deshabilitado).
+        """
+        return self.local.stats() if self.local is not None else {}
+
+    def redis_stats(self) -> dict:
+        """
+        Claves desalojadas (`maxmemory`) y vencidas en el servidor Redis, para todo el servidor.
+        Vacío si el backend no soporta `INFO` (p. ej. fakeredis).
+        """
+        try:
+            info = self.redis.info("stats")
+        except redis.RedisError:
+            return {}
+        return {"evicted_keys": info.get("evicted_keys", 0), "expired_keys": info.get("expired_keys", 0)}
+
+    def close(self):
+        if self._pubsub_thread is not None:
+            self._pubsub_thread.stop()
+            self._pubsub_thread = None
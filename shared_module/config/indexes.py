@@ -0,0 +1,49 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Tiempo que se conserva la marca de entrega de un evento en `outbox` (evita volver a notificarlo si el cliente reintenta).
+OUTBOX_DELIVERED_TTL_SECONDS = 7 * 24 * 3600
+
+# Registro declarativo de índices por colección.
+# `DatabaseManager.create_indexes` lo aplica al iniciar cada servicio; crear un índice que ya existe no tiene efecto.
+INDEXES = {
+    "events": [
+        # Clave del upsert de eventos: (distinct_id, session_id, timestamp). También cubre las consultas por distinct_id.
+        IndexModel(
+            [("properties.distinct_id", ASCENDING), ("properties.session_id", ASCENDING), ("timestamp", ASCENDING)],
+            unique=True,
+        ),
+        IndexModel([("properties.session_id", ASCENDING)]),
+        IndexModel([("timestamp", ASCENDING)]),
+        # Recorrido del backfill de historias: eventos de cada usuario en orden cronológico.
+        IndexModel([("properties.distinct_id", ASCENDING), ("timestamp", ASCENDING)]),
+    ],
+    "stories": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("session_id", ASCENDING)]),
+    ],
+    # Formato anterior (un documento por usuario); solo se consulta para sesiones previas a `session_registry`.
+    "sessions": [
+        IndexModel([("distinct_id", ASCENDING)], unique=True),
+        # Índice multikey: permite buscar un session_id dentro del arreglo `sessions`.
+        IndexModel([("sessions", ASCENDING)]),
+    ],
+    # Un documento por sesión con `_id` = session_id (sesión → usuario es una lectura por `_id`).
+    "session_registry": [
+        IndexModel([("distinct_id", ASCENDING), ("last_seen", DESCENDING)]),
+    ],
+    "pattern_counts": [
+        # Clave de la vista materializada; también resuelve las consultas por conjunto de historias.
+        IndexModel([("story_id", ASCENDING), ("pattern", ASCENDING)], unique=True),
+    ],
+    "tests": [
+        IndexModel([("story_id", ASCENDING)], unique=True),
+    ],
+    # Una entrada por evento (`_id` = ID del evento).
+    "outbox": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("delivered_at", ASCENDING)], expireAfterSeconds=OUTBOX_DELIVERED_TTL_SECONDS),
+    ],
+    "outbox_dead_letter": [
+        IndexModel([("dead_at", ASCENDING)]),
+    ],
+}
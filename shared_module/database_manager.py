@@ -1,117 +1,648 @@
-from pymongo import MongoClient, UpdateOne
+import heapq
+import re
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from models.event import Event
 from models.story import Story
 from logging_config import logger
-from typing import Optional, List
+from pool_monitor import PoolStatsListener
+from story_cache import StoryCache
+from event_archive import EventArchive
+from config.indexes import INDEXES
+from itertools import groupby, islice
+from typing import Dict, Iterable, Iterator, Optional, List, Tuple
+
+DUPLICATE_KEY_ERROR = 11000
+EVENTS_WRITE_MODES = ("insert", "upsert")
+EVENTS_STORAGE_MODES = ("single", "bucketed")
+# Formato del nombre de cada colección de eventos por período (`events_202410` o `events_20241010`).
+EVENTS_BUCKET_FORMATS = {"month": "events_%Y%m", "day": "events_%Y%m%d"}
+EVENTS_BACKFILL_SORT = [("properties.distinct_id", ASCENDING), ("timestamp", ASCENDING)]
+EVENTS_BUCKET_PATTERNS = {"month": re.compile(r"^events_\d{6}$"), "day": re.compile(r"^events_\d{8}$")}
+# Colección de un período renombrada para archivarla: `archiving_<bucket>_<id>`
+EVENTS_ARCHIVING_PATTERN = re.compile(r"^archiving_(events_\d{6}|events_\d{8})_[0-9a-f]+$")
+# Campos de una historia que necesita la generación de tests.
+STORY_ACTIONS_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "actions.type": 1,
+    "actions.target": 1,
+    "actions.value": 1,
+    "actions.url": 1,
+}
+
+
+
+def event_partition(distinct_id: str, partitions: int) -> int:
+    """
+    Partición estable (igual en todos los procesos) a la que pertenece un usuario.
+    """
+    return zlib.crc32(distinct_id.encode("utf-8")) % partitions
+
 
 class DatabaseManager:
-    def __init__(self, uri: str, db_name: str):
-        self.client = MongoClient(uri)
+    def __init__(
+        self,
+        uri: str,
+        db_name: str,
+        max_pool_size: int = 100,
+        min_pool_size: int = 0,
+        max_idle_time_ms: Optional[int] = None,
+        wait_queue_timeout_ms: Optional[int] = None,
+        events_write_mode: str = "insert",
+        events_chunk_size: int = 1000,
+        story_cache: Optional[StoryCache] = None,
+        events_storage_mode: str = "single",
+        events_bucket: str = "month",
+        events_hot_retention_days: int = 30,
+        events_archive_dir: Optional[str] = None,
+    ):
+        """
+        Crea el cliente de MongoDB con un pool de conexiones configurable.
+
+        Args:
+            uri (str): URI de conexión a MongoDB.
+            db_name (str): Nombre de la base de datos.
+            max_pool_size (int): Máximo de conexiones simultáneas en el pool.
+            min_pool_size (int): Conexiones que el pool mantiene abiertas aunque estén ociosas.
+            max_idle_time_ms (Optional[int]): Tiempo máximo que una conexión puede quedar ociosa antes de cerrarse.
+            wait_queue_timeout_ms (Optional[int]): Tiempo máximo de espera por una conexión libre.
+            events_write_mode (str): `insert` (inserción con `_id` determinístico) o `upsert` (clave de tres campos).
+            events_chunk_size (int): Cantidad máxima de eventos por operación masiva.
+            story_cache (Optional[StoryCache]): Caché read-through de consultas de historias (opcional).
+            events_storage_mode (str): `single` (colección `events`) o `bucketed` (una colección por período).
+            events_bucket (str): Período de cada colección en modo `bucketed`: `month` o `day`.
+            events_hot_retention_days (int): Días que un período permanece en MongoDB antes de archivarse.
+            events_archive_dir (Optional[str]): Directorio del archivo frío de los períodos vencidos.
+        """
+        if events_write_mode not in EVENTS_WRITE_MODES:
+            raise ValueError(f"Invalid EVENTS_WRITE_MODE: {events_write_mode}")
+        if events_storage_mode not in EVENTS_STORAGE_MODES:
+            raise ValueError(f"Invalid EVENTS_STORAGE_MODE: {events_storage_mode}")
+        if events_bucket not in EVENTS_BUCKET_FORMATS:
+            raise ValueError(f"Invalid EVENTS_BUCKET: {events_bucket}")
+
+        self.events_write_mode = events_write_mode
+        self.events_chunk_size = events_chunk_size
+        self.story_cache = story_cache
+        self.events_storage_mode = events_storage_mode
+        self.events_bucket = events_bucket
+        self.events_hot_retention = timedelta(days=events_hot_retention_days)
+        self.event_archive = EventArchive(events_archive_dir) if events_archive_dir else None
+        self.pool_stats = PoolStatsListener()
+        self.client = MongoClient(
+            uri,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxIdleTimeMS=max_idle_time_ms,
+            waitQueueTimeoutMS=wait_queue_timeout_ms,
+            event_listeners=[self.pool_stats],
+        )
         self.db = self.client[db_name]
 
     def close(self):
-        if self._client:
-            self._client.close()
-            self._client = None        
+        if self.client:
+            self.client.close()
+            self.client = None
+        if self.story_cache is not None:
+            self.story_cache.close()
+
+    def get_pool_stats(self) -> dict:
+        """
+        Devuelve las estadísticas del pool de conexiones de MongoDB.
+        """
+        return self.pool_stats.snapshot()
+
+    def get_cache_stats(self) -> dict:
+        """
+        Devuelve los contadores de la caché de historias, o un diccionario vacío si está deshabilitada.
+        """
+        return self.story_cache.stats() if self.story_cache else {}
+
+    def _cached(self, key: str, loader, cache_none: bool = True):
+        if self.story_cache is None:
+            return loader()
+        return self.story_cache.get_or_load(key, loader, cache_none=cache_none)
 
     def get_collection(self, collection_name: str) -> Collection:
         return self.db[collection_name]
 
     def create_indexes(self):
         """
-        Crea índices en las colecciones para mejorar el rendimiento de las consultas.
+        Crea los índices declarados en `config.indexes.INDEXES` para cada colección.
+        La operación es idempotente: los índices existentes no se modifican.
         """
         try:
-            events_collection = self.get_collection("events")
-            events_collection.create_index("properties.distinct_id")
-            events_collection.create_index("properties.session_id")
-            events_collection.create_index("timestamp")
-            logger.info("Índices creados en la colección de eventos.")
+            for collection_name, index_models in INDEXES.items():
+                created = self.get_collection(collection_name).create_indexes(index_models)
+                logger.info(f"Índices aplicados en la colección {collection_name}: {created}")
         except Exception as e:
             logger.error(f"Error creando índices: {str(e)}", exc_info=True)
             raise
 
-    def bulk_save_events(self, events: List[Event]):
+    def bulk_save_events(self, events: List[Event]) -> dict:
         """
-        Guarda o actualiza una lista de eventos en la base de datos utilizando una operación masiva.
+        Guarda una lista de eventos en la base de datos con operaciones masivas no ordenadas,
+        divididas en bloques de `events_chunk_size`.
+
+        En modo de almacenamiento `bucketed` cada evento va a la colección del período de su `timestamp`.
+        En modo `insert` cada evento se inserta con un `_id` determinístico y los duplicados
+        (error de clave duplicada) se toleran y se informan. En modo `upsert` se mantiene el
+        `UpdateOne(..., upsert=True)` sobre la clave (distinct_id, session_id, timestamp).
 
         Args:
             events (List[Event]): Lista de instancias de la clase Event.
+
+        Returns:
+            dict: Cantidad de eventos insertados, duplicados y los `_id` de los duplicados.
         """
-        events_collection = self.get_collection("events")
-        bulk_operations = []
+        summary = {"inserted": 0, "duplicates": 0, "duplicate_ids": []}
 
         try:
-            for event in events:
-                filter_key = {
-                    "properties.distinct_id": event.properties.distinct_id,
-                    "properties.session_id": event.properties.session_id,
-                    "timestamp": event.timestamp,
-                }
+            for collection_name, collection_events in self._group_events_by_collection(events).items():
+                events_collection = self.get_collection(collection_name)
+                for start in range(0, len(collection_events), self.events_chunk_size):
+                    chunk = collection_events[start:start + self.events_chunk_size]
+                    if self.events_write_mode == "insert":
+                        self._insert_events_chunk(events_collection, chunk, summary)
+                    else:
+                        self._upsert_events_chunk(events_collection, chunk, summary)
+        except Exception as e:
+            logger.error(f"Error ejecutando bulk_save_events: {str(e)}", exc_info=True)
+            raise
 
-                event_json = event.to_json()
+        logger.info(f"Se guardaron {summary['inserted']} eventos ({summary['duplicates']} duplicados).")
+        return summary
 
-                bulk_operations.append(
-                    UpdateOne(filter_key, {"$set": event_json}, upsert=True)
-                )
+    def event_bucket_name(self, timestamp: datetime) -> str:
+        """
+        Nombre de la colección del período al que pertenece un timestamp (en UTC).
+        """
+        return timestamp.astimezone(timezone.utc).strftime(EVENTS_BUCKET_FORMATS[self.events_bucket])
 
-            if bulk_operations:
-                events_collection.bulk_write(bulk_operations)
+    def _group_events_by_collection(self, events: List[Event]) -> dict:
+        if self.events_storage_mode == "single":
+            return {"events": events} if events else {}
+        grouped = {}
+        for event in events:
+            grouped.setdefault(self.event_bucket_name(event.timestamp), []).append(event)
+        for collection_name in grouped:
+            self._ensure_event_bucket(collection_name)
+        return grouped
 
-        except Exception as e:
-            logger.error(f"Error ejecutando bulk_save_events: {str(e)}", exc_info=True)
-            raise
+    def _ensure_event_bucket(self, collection_name: str):
+        """
+        Aplica a una colección de período los índices de `events` antes de cada escritura. No se recuerda por
+        proceso: otro proceso puede archivar el período y un evento tardío volver a crear la colección,
+        que sin el índice único dejaría de rechazar duplicados. `create_indexes` no hace nada si ya existen.
+        """
+        self.get_collection(collection_name).create_indexes(INDEXES["events"])
 
+    def _bucket_end(self, collection_name: str) -> datetime:
+        start = datetime.strptime(collection_name, EVENTS_BUCKET_FORMATS[self.events_bucket]).replace(tzinfo=timezone.utc)
+        if self.events_bucket == "day":
+            return start + timedelta(days=1)
+        return (start + timedelta(days=32)).replace(day=1)
 
-        if bulk_operations:
+    def list_event_buckets(self) -> List[str]:
+        """
+        Colecciones de eventos por período presentes en MongoDB, de la más antigua a la más reciente.
+        """
+        pattern = EVENTS_BUCKET_PATTERNS[self.events_bucket]
+        return sorted(name for name in self.db.list_collection_names() if pattern.match(name))
+
+    def list_archiving_buckets(self) -> List[str]:
+        """
+        Colecciones de período ya renombradas para archivarlas y todavía no eliminadas (un archivado en curso
+        o uno interrumpido, que la próxima ejecución retoma).
+        """
+        return sorted(name for name in self.db.list_collection_names() if EVENTS_ARCHIVING_PATTERN.match(name))
+
+    def archive_expired_event_buckets(self, now: Optional[datetime] = None) -> List[dict]:
+        """
+        Archiva en el directorio frío los períodos que terminaron hace más de `events_hot_retention_days`
+        y luego elimina su colección.
+
+        Cada colección se renombra primero a `archiving_<bucket>_<id>` (operación atómica) y se archiva esa
+        copia: un evento tardío que llega mientras tanto crea de nuevo la colección del período, en lugar de
+        perderse al eliminarla, y se archiva en una ejecución posterior. La copia se elimina solo si el archivo
+        se escribió completo; una copia que quedó de una ejecución interrumpida se archiva primero.
+
+        Args:
+            now (Optional[datetime]): Instante de referencia (por defecto, ahora en UTC).
+
+        Returns:
+            List[dict]: Un resumen `{bucket, archived}` por período archivado.
+        """
+        if self.events_storage_mode != "bucketed":
+            return []
+        if self.event_archive is None:
+            raise ValueError("EVENTS_ARCHIVE_DIR is required to archive event buckets")
+
+        cutoff = (now or datetime.now(timezone.utc)) - self.events_hot_retention
+        staging_names = self.list_archiving_buckets()
+        for collection_name in self.list_event_buckets():
+            if self._bucket_end(collection_name) > cutoff:
+                continue
+            staging_name = f"archiving_{collection_name}_{uuid.uuid4().hex}"
+            self.get_collection(collection_name).rename(staging_name)
+            staging_names.append(staging_name)
+
+        archived = []
+        for staging_name in staging_names:
+            bucket = EVENTS_ARCHIVING_PATTERN.match(staging_name).group(1)
+            staging = self.get_collection(staging_name)
+            count = self.event_archive.write_bucket(bucket, staging.find({}).sort("_id", ASCENDING))
+            staging.drop()
+            archived.append({"bucket": bucket, "archived": count})
+            logger.info(f"Se archivaron {count} eventos de la colección {bucket}.")
+        return archived
+
+    def _insert_events_chunk(self, events_collection: Collection, events: List[Event], summary: dict):
+        documents = [{"_id": event.event_id(), **event.to_document()} for event in events]
+        try:
+            result = events_collection.insert_many(documents, ordered=False)
+            summary["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in write_errors):
+                raise
+            summary["inserted"] += e.details.get("nInserted", 0)
+            summary["duplicates"] += len(write_errors)
+            summary["duplicate_ids"].extend(documents[error["index"]]["_id"] for error in write_errors)
+
+    def _upsert_events_chunk(self, events_collection: Collection, events: List[Event], summary: dict):
+        bulk_operations = []
+        for event in events:
+            filter_key = {
+                "properties.distinct_id": event.properties.distinct_id,
+                "properties.session_id": event.properties.session_id,
+                "timestamp": event.timestamp,
+            }
+            bulk_operations.append(UpdateOne(filter_key, {"$set": event.to_document()}, upsert=True))
+
+        result = events_collection.bulk_write(bulk_operations, ordered=False)
+        upserted_indexes = set(result.upserted_ids.keys())
+        summary["inserted"] += len(upserted_indexes)
+        summary["duplicates"] += len(events) - len(upserted_indexes)
+        summary["duplicate_ids"].extend(
+            event.event_id() for index, event in enumerate(events) if index not in upserted_indexes
+        )
+
+    def migrate_legacy_events(self, batch_size: int = 1000) -> dict:
+        """
+        Reescribe los eventos guardados con el formato anterior (timestamps como texto y `_id` de `ObjectId` o
+        calculado sobre el texto del timestamp) al formato actual: fechas BSON y `_id` = `Event.event_id()`.
+        Sin esta migración, un evento antiguo reenviado no se reconoce como duplicado y se guarda dos veces.
+
+        El `_id` no se puede modificar, así que cada evento se inserta con el formato nuevo y después se elimina
+        el documento anterior. Si el evento ya existía en el formato nuevo (o dos documentos antiguos eran el
+        mismo evento), la inserción choca con la clave única y solo se elimina el anterior. La operación es
+        idempotente: una ejecución interrumpida se retoma volviendo a lanzarla.
+
+        Args:
+            batch_size (int): Documentos por inserción y eliminación.
+
+        Returns:
+            dict: Cantidad de eventos migrados, duplicados descartados e inválidos (se dejan sin tocar).
+        """
+        summary = {"migrated": 0, "duplicates": 0, "invalid": 0}
+        legacy_filter = {"$or": [{"timestamp": {"$type": "string"}}, {"properties.timestamp": {"$type": "string"}}]}
+        collection_names = ["events"] if self.events_storage_mode == "single" else ["events"] + self.list_event_buckets()
+        for collection_name in collection_names:
+            events_collection = self.get_collection(collection_name)
+            cursor = events_collection.find(legacy_filter, batch_size=batch_size)
+            while True:
+                documents = list(islice(cursor, batch_size))
+                if not documents:
+                    break
+                self._migrate_legacy_events_chunk(events_collection, documents, summary)
+        logger.info(
+            f"Migración de eventos: {summary['migrated']} migrados, {summary['duplicates']} duplicados, "
+            f"{summary['invalid']} inválidos."
+        )
+        return summary
+
+    def _migrate_legacy_events_chunk(self, events_collection: Collection, documents: List[dict], summary: dict):
+        legacy_ids, migrated = [], []
+        for document in documents:
+            legacy_id = document.pop("_id")
             try:
-                events_collection.bulk_write(bulk_operations)
-                logger.info(f"Se guardaron {len(bulk_operations)} eventos.")
+                event = Event(**document)
             except Exception as e:
-                logger.error(f"Error guardando eventos en bulk: {str(e)}", exc_info=True)
+                summary["invalid"] += 1
+                logger.warning(f"Evento antiguo inválido, no se migra (_id={legacy_id}): {e}")
+                continue
+            legacy_ids.append(legacy_id)
+            migrated.append({"_id": event.event_id(), **event.to_document()})
+        if not migrated:
+            return
+
+        try:
+            summary["migrated"] += len(events_collection.insert_many(migrated, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in write_errors):
                 raise
+            summary["migrated"] += e.details.get("nInserted", 0)
+            summary["duplicates"] += len(write_errors)
+        # Solo después de escribir el formato nuevo: una interrupción nunca deja un evento sin ninguna copia.
+        events_collection.delete_many({"_id": {"$in": legacy_ids}})
 
     def bulk_upsert_sessions(self, sessions: List[dict]):
         """
-        Inserta o actualiza masivamente las sesiones en MongoDB.
-        """
-        sessions_collection = self.get_collection("sessions")
-        bulk_operations = []
+        Registra masivamente las sesiones en `session_registry`, un documento por sesión (`_id` = `session_id`).
 
-        for session in sessions:
-            bulk_operations.append(
-                UpdateOne(
-                    {"distinct_id": session["distinct_id"]},
-                    {"$addToSet": {"sessions": {"$each": session["sessions"]}}},
-                    upsert=True,
-                )
+        Cada operación solo toca la sesión del lote: el `distinct_id` se fija al crearla, `first_seen`/`last_seen`
+        se amplían con `$min`/`$max` y `event_count` se incrementa, sin reescribir el historial del usuario.
+
+        Args:
+            sessions (List[dict]): Documentos con `session_id`, `distinct_id`, `first_seen`, `last_seen` y `event_count`.
+        """
+        sessions_collection = self.get_collection("session_registry")
+        bulk_operations = [
+            UpdateOne(
+                {"_id": session["session_id"]},
+                {
+                    "$setOnInsert": {"distinct_id": session["distinct_id"]},
+                    "$min": {"first_seen": session["first_seen"]},
+                    "$max": {"last_seen": session["last_seen"]},
+                    "$inc": {"event_count": session["event_count"]},
+                },
+                upsert=True,
             )
+            for session in sessions
+        ]
 
         if bulk_operations:
             try:
-                sessions_collection.bulk_write(bulk_operations)
+                sessions_collection.bulk_write(bulk_operations, ordered=False)
                 logger.info(f"Se actualizaron {len(bulk_operations)} sesiones.")
             except Exception as e:
                 logger.error(f"Error actualizando sesiones en bulk: {str(e)}", exc_info=True)
                 raise
 
-        
+    def get_sessions_by_distinct_id(self, distinct_id: str) -> List[dict]:
+        """
+        Obtiene las sesiones registradas de un usuario, de la más reciente a la más antigua.
+
+        Args:
+            distinct_id (str): ID único del usuario.
+
+        Returns:
+            List[dict]: Documentos con `session_id`, `first_seen`, `last_seen` y `event_count`.
+        """
+        sessions_collection = self.get_collection("session_registry")
+        cursor = sessions_collection.find({"distinct_id": distinct_id}).sort("last_seen", DESCENDING)
+        return [
+            {
+                "session_id": session["_id"],
+                "first_seen": session.get("first_seen"),
+                "last_seen": session.get("last_seen"),
+                "event_count": session.get("event_count", 0),
+            }
+            for session in cursor
+        ]
+
+    def enqueue_outbox(self, events: Dict[str, dict]):
+        """
+        Agrega eventos (ya serializados) a la cola `outbox` para su envío al servicio de historias.
+
+        Cada entrada usa el ID del evento como `_id` y solo se crea si no existe: encolar de nuevo un evento
+        pendiente, en envío o ya entregado no tiene efecto. Así un reintento del cliente puede volver a
+        encolar todos sus eventos, incluidos los que ya figuran como duplicados.
+
+        Args:
+            events (Dict[str, dict]): Eventos en formato JSON por ID de evento.
+        """
+        if not events:
+            return
+        now = datetime.now(timezone.utc)
+        bulk_operations = [
+            UpdateOne(
+                {"_id": event_id},
+                {"$setOnInsert": {
+                    "status": "pending",
+                    "event": event,
+                    "attempts": 0,
+                    "created_at": now,
+                    "next_attempt_at": now,
+                }},
+                upsert=True,
+            )
+            for event_id, event in events.items()
+        ]
+        try:
+            self.get_collection("outbox").bulk_write(bulk_operations, ordered=False)
+        except BulkWriteError as e:
+            # Dos solicitudes concurrentes con el mismo evento: la entrada ya existe.
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                raise
+
+    def claim_outbox_batch(self, max_events: int, lease_seconds: int) -> List[dict]:
+        """
+        Reserva entradas pendientes de la cola `outbox` hasta reunir `max_events` eventos.
+        Las entradas reservadas cuya reserva venció (p. ej. por una caída del proceso) se vuelven a tomar.
+
+        La reserva se hace con un `update_many` que vuelve a verificar el estado de cada entrada y les
+        asigna un `claim_id` propio, de modo que dos despachadores nunca reservan la misma entrada.
+
+        Args:
+            max_events (int): Cantidad máxima aproximada de eventos a reservar.
+            lease_seconds (int): Duración de la reserva.
+
+        Returns:
+            List[dict]: Entradas reservadas, en orden de creación.
+        """
+        outbox_collection = self.get_collection("outbox")
+        now = datetime.now(timezone.utc)
+        claimable = {
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "in_flight", "lease_until": {"$lt": now}},
+            ]
+        }
+        candidate_ids = [
+            entry["_id"]
+            for entry in outbox_collection.find(claimable, {"_id": 1}).sort("created_at", ASCENDING).limit(max_events)
+        ]
+        if not candidate_ids:
+            return []
+
+        claim_id = uuid.uuid4().hex
+        outbox_collection.update_many(
+            {"_id": {"$in": candidate_ids}, **claimable},
+            {"$set": {"status": "in_flight", "lease_until": now + timedelta(seconds=lease_seconds), "claim_id": claim_id}},
+        )
+        return list(
+            outbox_collection.find({"_id": {"$in": candidate_ids}, "claim_id": claim_id}).sort("created_at", ASCENDING)
+        )
+
+    def ack_outbox(self, entry_ids: List):
+        """
+        Confirma la entrega de entradas de la cola `outbox`. La entrada queda como marca de entregada
+        (sin el evento) hasta que el índice TTL sobre `delivered_at` la elimina.
+        """
+        self.get_collection("outbox").update_many(
+            {"_id": {"$in": entry_ids}},
+            {
+                "$set": {"status": "delivered", "delivered_at": datetime.now(timezone.utc)},
+                "$unset": {"event": "", "events": "", "lease_until": "", "claim_id": ""},
+            },
+        )
+
+    def dead_letter_outbox(self, entry_ids: List, error: str):
+        """
+        Mueve entradas de la cola `outbox` a `outbox_dead_letter` (entregas rechazadas de forma permanente
+        o que agotaron los reintentos) para revisarlas o reenviarlas a mano.
+        """
+        if not entry_ids:
+            return
+        outbox_collection = self.get_collection("outbox")
+        now = datetime.now(timezone.utc)
+        entries = [
+            dict(entry, status="dead", last_error=error, dead_at=now)
+            for entry in outbox_collection.find({"_id": {"$in": entry_ids}})
+        ]
+        if entries:
+            try:
+                self.get_collection("outbox_dead_letter").insert_many(entries, ordered=False)
+            except BulkWriteError as e:
+                # Una caída entre la copia y el borrado deja entradas ya copiadas: se ignoran.
+                if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                    raise
+        outbox_collection.delete_many({"_id": {"$in": entry_ids}})
+        logger.warning(f"Se movieron {len(entries)} entradas de la outbox a outbox_dead_letter: {error}")
+
+    def retry_outbox(self, entry_ids: List, error: str, backoff_seconds: float):
+        """
+        Devuelve entradas de la cola `outbox` a pendiente para reintentarlas luego de `backoff_seconds`.
+        """
+        self.get_collection("outbox").update_many(
+            {"_id": {"$in": entry_ids}},
+            {
+                "$set": {
+                    "status": "pending",
+                    "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=backoff_seconds),
+                    "last_error": error,
+                },
+                "$unset": {"lease_until": "", "claim_id": ""},
+                "$inc": {"attempts": 1},
+            },
+        )
+
     def get_events_by_sessions(self, session_ids: List[str]) -> List[dict]:
         """
         Obtiene todos los eventos asociados a una lista de session_id.
 
+        En modo `bucketed` se consultan la colección `events` (eventos previos al modo), las colecciones
+        de período vigentes y, por último, el archivo frío.
+
         Args:
             session_ids (List[str]): Lista de session_id.
-            events_collection (Collection): Colección de eventos.
 
         Returns:
             List[dict]: Lista de eventos.
         """
-        
-        events_collection = self.get_collection("events")
-        
-        return list(events_collection.find({"properties.session_id": {"$in": session_ids}}))
+        query = {"properties.session_id": {"$in": session_ids}}
+        events = list(self.get_collection("events").find(query))
+        if self.events_storage_mode == "single":
+            return events
+
+        for collection_name in self.list_event_buckets() + self.list_archiving_buckets():
+            events.extend(self.get_collection(collection_name).find(query))
+        if self.event_archive is not None:
+            events.extend(self.event_archive.find_by_sessions(session_ids))
+        # Un período que se está archivando puede estar a la vez en su copia y en el archivo.
+        return list({event["_id"]: event for event in events}.values())
+
+    def _event_collections(self) -> List[str]:
+        if self.events_storage_mode == "single":
+            return ["events"]
+        return ["events"] + self.list_event_buckets() + self.list_archiving_buckets()
+
+    def _iter_event_distinct_ids(self, collection_name: str, after: Optional[str]) -> Iterator[str]:
+        """
+        Recorre los `distinct_id` de una colección de eventos en orden; `$sort` + `$group` usa el índice.
+        """
+        match = {"properties.distinct_id": {"$gt": after}} if after is not None else {}
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"properties.distinct_id": ASCENDING}},
+            {"$group": {"_id": "$properties.distinct_id"}},
+            {"$sort": {"_id": ASCENDING}},
+        ]
+        for document in self.get_collection(collection_name).aggregate(pipeline, allowDiskUse=True):
+            yield document["_id"]
+
+    def iter_events_by_distinct_id(
+        self,
+        after: Optional[str] = None,
+        partition: int = 0,
+        partitions: int = 1,
+        users_per_batch: int = 500,
+    ) -> Iterator[List[Tuple[str, List[dict]]]]:
+        """
+        Recorre los eventos guardados agrupados por usuario, ordenados por (distinct_id, timestamp).
+
+        Primero se recorren los `distinct_id` en orden y se conservan los de la partición pedida; luego,
+        por cada bloque de `users_per_batch` usuarios, un cursor trae sus eventos ya ordenados. En memoria
+        solo queda un bloque de usuarios. En modo `bucketed` se combinan la colección `events` y las
+        colecciones de período vigentes (el archivo frío no se recorre).
+
+        Args:
+            after (Optional[str]): Último `distinct_id` ya procesado (para reanudar).
+            partition (int): Partición a recorrer, entre 0 y `partitions - 1`.
+            partitions (int): Cantidad total de particiones (ver `event_partition`).
+            users_per_batch (int): Usuarios por bloque.
+
+        Yields:
+            List[Tuple[str, List[dict]]]: Pares `(distinct_id, eventos)` de un bloque, en orden de `distinct_id`.
+        """
+        collection_names = self._event_collections()
+        distinct_ids = (
+            distinct_id
+            for distinct_id, _ in groupby(heapq.merge(*(
+                self._iter_event_distinct_ids(collection_name, after) for collection_name in collection_names
+            )))
+            if partitions == 1 or event_partition(distinct_id, partitions) == partition
+        )
+
+        def sort_key(event: dict):
+            return event["properties"]["distinct_id"], event["timestamp"]
+
+        for users in self._batched(distinct_ids, users_per_batch):
+            query = {"properties.distinct_id": {"$in": users}}
+            cursors = [
+                self.get_collection(collection_name).find(query, {"_id": 0}).sort(EVENTS_BACKFILL_SORT)
+                for collection_name in collection_names
+            ]
+            events = heapq.merge(*cursors, key=sort_key)
+            yield [
+                (distinct_id, list(user_events))
+                for distinct_id, user_events in groupby(events, key=lambda event: event["properties"]["distinct_id"])
+            ]
+
+    def get_backfill_checkpoint(self, checkpoint_id: str) -> Optional[str]:
+        """
+        Devuelve el último `distinct_id` procesado por un backfill, o None si no hay punto de control.
+        """
+        checkpoint = self.get_collection("backfill_checkpoints").find_one({"_id": checkpoint_id})
+        return checkpoint["after"] if checkpoint else None
+
+    def save_backfill_checkpoint(self, checkpoint_id: str, after: str, processed: int):
+        """
+        Guarda el avance de un backfill: los usuarios hasta `after` (inclusive) ya están escritos.
+        """
+        self.get_collection("backfill_checkpoints").update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"after": after, "updated_at": datetime.now(timezone.utc)}, "$inc": {"processed": processed}},
+            upsert=True,
+        )
 
    
     def get_all_stories(self, session_id: Optional[str] = None) -> List[Story]:
@@ -127,7 +658,66 @@ class DatabaseManager:
         stories_collection = self.get_collection("stories")
         query = {"session_id": session_id} if session_id else {}
         return list(stories_collection.find(query, {"_id": 0}))
-        
+
+    def aggregate_stories(self, pipeline: List[dict]) -> List[dict]:
+        """
+        Ejecuta un pipeline de agregación sobre la colección de historias.
+
+        Args:
+            pipeline (List[dict]): Etapas del pipeline.
+
+        Returns:
+            List[dict]: Documentos resultantes.
+        """
+        return list(self.get_collection("stories").aggregate(pipeline, allowDiskUse=True))
+
+    def get_stories_page(self, limit: int, after: Optional[str] = None, session_id: Optional[str] = None) -> List[dict]:
+        """
+        Obtiene una página de historias ordenadas por `id` usando paginación por clave (keyset).
+
+        Args:
+            limit (int): Cantidad máxima de historias de la página.
+            after (Optional[str]): `id` de la última historia de la página anterior.
+            session_id (Optional[str]): ID de sesión para filtrar historias.
+
+        Returns:
+            List[dict]: Historias de la página.
+        """
+        stories_collection = self.get_collection("stories")
+        query = {"session_id": session_id} if session_id else {}
+        if after:
+            query["id"] = {"$gt": after}
+        return list(stories_collection.find(query, {"_id": 0}).sort("id", ASCENDING).limit(limit))
+
+    def iter_stories(self, session_id: Optional[str] = None, batch_size: int = 500) -> Iterator[List[dict]]:
+        """
+        Recorre las historias con un cursor de MongoDB y las entrega en bloques, sin materializar la colección.
+
+        Args:
+            session_id (Optional[str]): ID de sesión para filtrar historias.
+            batch_size (int): Cantidad de historias por bloque.
+
+        Yields:
+            List[dict]: Bloque de historias.
+        """
+        stories_collection = self.get_collection("stories")
+        query = {"session_id": session_id} if session_id else {}
+        with stories_collection.find(query, {"_id": 0}, batch_size=batch_size) as cursor:
+            yield from self._batched(cursor, batch_size)
+
+    @staticmethod
+    def _batched(cursor, batch_size: int) -> Iterator[List[dict]]:
+        """
+        Agrupa los documentos de un cursor en bloques de `batch_size`.
+        """
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     def get_stories_by_distinct_id(self, distinct_id: str) -> List[dict]:
         """
@@ -149,7 +739,7 @@ class DatabaseManager:
 
     def get_distinct_id_by_session_id(self, session_id: str) -> Optional[str]:
         """
-        Obtiene el `distinct_id` asociado a un `session_id` desde la tabla `sessions`.
+        Obtiene el `distinct_id` asociado a un `session_id` con una lectura puntual en `session_registry`.
 
         Args:
             session_id (str): ID de sesión.
@@ -157,39 +747,165 @@ class DatabaseManager:
         Returns:
             Optional[str]: ID único del usuario asociado, o None si no se encuentra.
         """
-        sessions_collection = self.get_collection("sessions")
-        result = sessions_collection.find_one(
-            {"sessions": session_id},  # Filtro: busca el `session_id` dentro del campo `sessions`
-            {"distinct_id": 1, "_id": 0}  # Proyección: incluye `distinct_id` y excluye `_id`
-        )
-        return result["distinct_id"] if result else None
+        def load() -> Optional[str]:
+            result = self.get_collection("session_registry").find_one({"_id": session_id}, {"distinct_id": 1})
+            if result is None:
+                # Sesiones registradas antes de `session_registry`, en el arreglo `sessions` de cada usuario.
+                result = self.get_collection("sessions").find_one(
+                    {"sessions": session_id},  # Filtro: busca el `session_id` dentro del campo `sessions`
+                    {"distinct_id": 1, "_id": 0}  # Proyección: incluye `distinct_id` y excluye `_id`
+                )
+            return result["distinct_id"] if result else None
+
+        # Una sesión no cambia de usuario; solo se evita guardar "no encontrada" hasta que se registre.
+        return self._cached(StoryCache.distinct_id_key(session_id), load, cache_none=False)
 
     def bulk_upsert_stories(self, stories: List[Story]):
         """
-        Inserta o actualiza masivamente las historias en la base de datos.
+        Inserta o actualiza masivamente las historias en la base de datos de forma incremental.
+
+        Cada historia del lote se combina con la almacenada: las acciones nuevas se agregan
+        ordenadas por timestamp (las repetidas se descartan), y `startTimestamp`/`endTimestamp`
+        junto con `initialState`/`finalState` solo se amplían cuando el lote contiene eventos
+        anteriores o posteriores a los ya registrados. Solo el lote viaja por la red, pero MongoDB
+        reescribe el arreglo `actions` completo de cada historia (`$setUnion` + `$sortArray`), así que
+        el trabajo del servidor crece con el tamaño de la historia almacenada.
 
         Args:
             stories (List[Story]): Lista de historias.
         """
         stories_collection = self.get_collection("stories")
-        bulk_operations = []
-        for story in stories:
-            bulk_operations.append(
-                UpdateOne(
-                    {"id": story.id},
-                    {"$set": {"session_id": story.session_id, **story.model_dump()}},
-                    upsert=True,
-                )
-            )
+        bulk_operations = [
+            UpdateOne({"id": story.id}, self._story_merge_pipeline(story), upsert=True)
+            for story in stories
+        ]
 
         if bulk_operations:
+            stale_keys = self._story_cache_keys(stories) if self.story_cache is not None else []
             try:
-                stories_collection.bulk_write(bulk_operations)
+                stories_collection.bulk_write(bulk_operations, ordered=False)
                 logger.info(f"Se guardaron/actualizaron {len(bulk_operations)} historias.")
             except Exception as e:
                 logger.error(f"Error ejecutando bulk_upsert_stories: {str(e)}", exc_info=True)
                 raise
-            
+            finally:
+                # Aun ante un error parcial, las historias del lote pudieron cambiar.
+                if self.story_cache is not None:
+                    self.story_cache.invalidate(stale_keys)
+
+    def upsert_stories_returning_previous(self, stories: List[Story], max_attempts: int = 5) -> List[dict]:
+        """
+        Combina cada historia del lote con la almacenada (igual que `bulk_upsert_stories`) y devuelve las
+        acciones que tenía cada una justo antes de su actualización.
+
+        El estado previo del lote se lee con un solo `find` y se escribe con un solo `bulk_write` no ordenado.
+        Cada actualización exige que la historia conserve la cantidad de acciones leída: como las acciones solo
+        se agregan, si otro lote la modificó entre la lectura y la escritura la condición no se cumple, el
+        upsert choca con el índice único de `id` y esa historia se vuelve a leer y escribir. Así la diferencia
+        entre el lote y el estado devuelto son exactamente las acciones que agregó esta actualización.
+
+        Args:
+            stories (List[Story]): Lista de historias.
+            max_attempts (int): Intentos por historia ante escrituras concurrentes.
+
+        Returns:
+            List[dict]: `{id, actions}` previos de las historias que ya existían.
+        """
+        if not stories:
+            return []
+        stories_collection = self.get_collection("stories")
+        stale_keys = self._story_cache_keys(stories) if self.story_cache is not None else []
+        previous: Dict[str, dict] = {}
+        pending = list(stories)
+        try:
+            for _ in range(max_attempts):
+                stored = {
+                    document["id"]: document
+                    for document in stories_collection.find(
+                        {"id": {"$in": [story.id for story in pending]}}, {"_id": 0, "id": 1, "actions": 1}
+                    )
+                }
+                operations = [
+                    UpdateOne(
+                        {"id": story.id, **self._actions_size_guard(stored.get(story.id))},
+                        self._story_merge_pipeline(story),
+                        upsert=True,
+                    )
+                    for story in pending
+                ]
+                conflicts = set()
+                try:
+                    stories_collection.bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if any(error.get("code") != 11000 for error in errors):
+                        raise
+                    conflicts = {error["index"] for error in errors}
+
+                for index, story in enumerate(pending):
+                    if index not in conflicts and story.id in stored:
+                        previous[story.id] = stored[story.id]
+                pending = [story for index, story in enumerate(pending) if index in conflicts]
+                if not pending:
+                    break
+            else:
+                raise RuntimeError(f"{len(pending)} historias cambiaron durante {max_attempts} intentos de actualización")
+            logger.info(f"Se guardaron/actualizaron {len(stories)} historias.")
+        except Exception as e:
+            logger.error(f"Error ejecutando upsert_stories_returning_previous: {str(e)}", exc_info=True)
+            raise
+        finally:
+            if self.story_cache is not None:
+                self.story_cache.invalidate(stale_keys)
+        return list(previous.values())
+
+    @staticmethod
+    def _actions_size_guard(stored: Optional[dict]) -> dict:
+        size = len(stored.get("actions") or ()) if stored is not None else 0
+        return {"$expr": {"$eq": [{"$size": {"$ifNull": ["$actions", []]}}, size]}}
+
+    def _story_cache_keys(self, stories: List[Story]) -> List[str]:
+        """
+        Claves de caché afectadas por un lote de historias: sus IDs, las sesiones del lote y las
+        sesiones almacenadas previamente (una historia cambia de sesión si llegan eventos anteriores).
+        """
+        story_ids = [story.id for story in stories]
+        stored = self.get_collection("stories").find({"id": {"$in": story_ids}}, {"session_id": 1, "_id": 0})
+        session_ids = {story.session_id for story in stories} | {doc["session_id"] for doc in stored if doc.get("session_id")}
+        return [StoryCache.story_key(story_id) for story_id in story_ids] + [
+            StoryCache.session_key(session_id) for session_id in session_ids
+        ]
+
+    @staticmethod
+    def _story_merge_pipeline(story: Story) -> List[dict]:
+        """
+        Construye el pipeline de actualización que combina una historia parcial con la almacenada.
+        Todas las expresiones de un mismo `$set` leen los valores previos del documento.
+        `$sortArray` requiere MongoDB 5.2 o posterior.
+        """
+        story_data = story.model_dump()
+        is_new = {"$eq": [{"$ifNull": ["$startTimestamp", None]}, None]}
+        starts_earlier = {"$or": [is_new, {"$lt": [{"$literal": story.startTimestamp}, "$startTimestamp"]}]}
+        ends_later = {"$or": [is_new, {"$gt": [{"$literal": story.endTimestamp}, "$endTimestamp"]}]}
+
+        def merge_arrays(field: str) -> dict:
+            return {"$setUnion": [{"$ifNull": [f"${field}", []]}, {"$literal": story_data[field]}]}
+
+        return [
+            {
+                "$set": {
+                    "title": {"$ifNull": ["$title", {"$literal": story.title}]},
+                    "session_id": {"$cond": [starts_earlier, {"$literal": story.session_id}, "$session_id"]},
+                    "startTimestamp": {"$cond": [starts_earlier, {"$literal": story.startTimestamp}, "$startTimestamp"]},
+                    "initialState": {"$cond": [starts_earlier, {"$literal": story.initialState}, "$initialState"]},
+                    "endTimestamp": {"$cond": [ends_later, {"$literal": story.endTimestamp}, "$endTimestamp"]},
+                    "finalState": {"$cond": [ends_later, {"$literal": story.finalState}, "$finalState"]},
+                    "actions": {"$sortArray": {"input": merge_arrays("actions"), "sortBy": {"timestamp": 1}}},
+                    "networkRequests": merge_arrays("networkRequests"),
+                }
+            }
+        ]
+
     def get_stories_by_session_id(self, session_id: str) -> List[dict]:
         """
         Obtiene historias asociadas a un `session_id`.
@@ -202,7 +918,10 @@ class DatabaseManager:
         """
         stories_collection = self.get_collection("stories")
         query = {"session_id": session_id}
-        return list(stories_collection.find(query, {"_id": 0}))
+        return self._cached(
+            StoryCache.session_key(session_id),
+            lambda: list(stories_collection.find(query, {"_id": 0})),
+        )
             
     def get_stories_by_story_id(self, story_id: str) -> List[dict]:
         """
@@ -216,5 +935,191 @@ class DatabaseManager:
         """
         stories_collection = self.get_collection("stories")
         query = {"id": story_id}
-        return list(stories_collection.find(query, {"_id": 0}))
+        return self._cached(
+            StoryCache.story_key(story_id),
+            lambda: list(stories_collection.find(query, {"_id": 0})),
+        )
             
+
+    def get_tests_by_story_ids(self, story_ids: List[str]) -> List[dict]:
+        """
+        Obtiene los tests generados y guardados para un conjunto de historias.
+
+        Args:
+            story_ids (List[str]): IDs de las historias.
+
+        Returns:
+            List[dict]: Documentos con `story_id`, `actions_hash` y `test_script`.
+        """
+        if not story_ids:
+            return []
+        tests_collection = self.get_collection("tests")
+        return list(tests_collection.find({"story_id": {"$in": story_ids}}, {"_id": 0}))
+
+    def bulk_upsert_tests(self, tests: List[dict]):
+        """
+        Guarda o reemplaza masivamente los tests generados, uno por historia.
+
+        Args:
+            tests (List[dict]): Documentos con `story_id`, `actions_hash` y `test_script`.
+        """
+        bulk_operations = [
+            UpdateOne({"story_id": test["story_id"]}, {"$set": test}, upsert=True)
+            for test in tests
+        ]
+        if bulk_operations:
+            try:
+                self.get_collection("tests").bulk_write(bulk_operations, ordered=False)
+                logger.info(f"Se guardaron/actualizaron {len(bulk_operations)} tests.")
+            except Exception as e:
+                logger.error(f"Error ejecutando bulk_upsert_tests: {str(e)}", exc_info=True)
+                raise
+
+    def get_story_actions(self, story_id: Optional[str] = None) -> List[dict]:
+        """
+        Obtiene el ID y los campos de las acciones que usa la generación de tests, sin el resto de la historia.
+
+        Args:
+            story_id (Optional[str]): Filtra por ID de historia (opcional).
+
+        Returns:
+            List[dict]: Documentos con `id` y `actions` (`type`, `target`, `value`, `url`).
+        """
+        query = {"id": story_id} if story_id else {}
+        return list(self.get_collection("stories").find(query, STORY_ACTIONS_PROJECTION))
+
+    def iter_story_actions(
+        self, story_id: Optional[str] = None, batch_size: int = 500, session_id: Optional[str] = None
+    ) -> Iterator[List[dict]]:
+        """
+        Recorre con un cursor el ID y las acciones de las historias (ver `get_story_actions`) y los entrega en bloques.
+
+        Args:
+            story_id (Optional[str]): Filtra por ID de historia (opcional).
+            batch_size (int): Cantidad de historias por bloque.
+            session_id (Optional[str]): Filtra por ID de sesión (opcional).
+
+        Yields:
+            List[dict]: Bloque de documentos con `id` y `actions`.
+        """
+        query = {"id": story_id} if story_id else {}
+        if session_id:
+            query["session_id"] = session_id
+        with self.get_collection("stories").find(query, STORY_ACTIONS_PROJECTION, batch_size=batch_size) as cursor:
+            yield from self._batched(cursor, batch_size)
+
+    def get_story_actions_by_ids(self, story_ids: List[str]) -> List[dict]:
+        """
+        Obtiene el ID y las acciones completas de las historias indicadas.
+
+        Args:
+            story_ids (List[str]): IDs de las historias.
+
+        Returns:
+            List[dict]: Documentos con `id` y `actions`.
+        """
+        if not story_ids:
+            return []
+        stories_collection = self.get_collection("stories")
+        return list(stories_collection.find({"id": {"$in": story_ids}}, {"_id": 0, "id": 1, "actions": 1}))
+
+    def get_story_ids_by_session_id(self, session_id: str) -> List[str]:
+        """
+        Obtiene los IDs de las historias de una sesión.
+        """
+        stories_collection = self.get_collection("stories")
+        return [story["id"] for story in stories_collection.find({"session_id": session_id}, {"_id": 0, "id": 1})]
+
+    def increment_pattern_counts(self, increments: List[dict]):
+        """
+        Suma conteos a la vista materializada `pattern_counts` (un documento por patrón e historia).
+
+        Args:
+            increments (List[dict]): Documentos con `pattern`, `story_id` y `count` (el incremento).
+        """
+        bulk_operations = [
+            UpdateOne(
+                {"story_id": increment["story_id"], "pattern": increment["pattern"]},
+                {"$inc": {"count": increment["count"]}},
+                upsert=True,
+            )
+            for increment in increments
+        ]
+        if bulk_operations:
+            try:
+                self.get_collection("pattern_counts").bulk_write(bulk_operations, ordered=False)
+            except Exception as e:
+                logger.error(f"Error ejecutando increment_pattern_counts: {str(e)}", exc_info=True)
+                raise
+
+    def get_pattern_counts(self, story_ids: Optional[List[str]] = None) -> List[dict]:
+        """
+        Lee la vista materializada `pattern_counts`, completa o para un conjunto de historias.
+
+        Args:
+            story_ids (Optional[List[str]]): IDs de las historias (opcional).
+
+        Returns:
+            List[dict]: Documentos con `pattern`, `story_id` y `count`.
+        """
+        query = {"story_id": {"$in": story_ids}} if story_ids is not None else {}
+        return list(self.get_collection("pattern_counts").find(query, {"_id": 0}))
+
+    def acquire_lock(self, name: str, ttl_seconds: float) -> bool:
+        """
+        Toma un lock con vencimiento en la colección `maintenance_locks`. Un lock vencido (su dueño terminó
+        sin liberarlo) se puede volver a tomar.
+
+        Returns:
+            bool: False si otro proceso tiene el lock.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            self.get_collection("maintenance_locks").update_one(
+                {"_id": name, "expires_at": {"$lte": now}},
+                {"$set": {"acquired_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def release_lock(self, name: str):
+        self.get_collection("maintenance_locks").delete_one({"_id": name})
+
+    def lock_is_held(self, name: str) -> bool:
+        locks = self.get_collection("maintenance_locks")
+        return locks.find_one({"_id": name, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 1}) is not None
+
+    def collection_is_empty(self, collection_name: str) -> bool:
+        return self.get_collection(collection_name).find_one({}, {"_id": 1}) is None
+
+    def replace_pattern_counts(self, counts: Iterable[dict], batch_size: int = 1000) -> int:
+        """
+        Reemplaza el contenido de la vista materializada `pattern_counts` (reconstrucción completa).
+
+        Los conteos se escriben en una colección temporal con los mismos índices, que luego reemplaza a
+        `pattern_counts` con un `rename(..., dropTarget=True)`. Mientras se reconstruye, las lecturas siguen
+        viendo la vista anterior completa y los `$inc` de `POST /v1/stories/` no chocan con la reconstrucción;
+        los incrementos aplicados a la vista anterior durante ese intervalo se pierden con el reemplazo.
+
+        Args:
+            counts (Iterable[dict]): Documentos con `pattern`, `story_id` y `count`.
+            batch_size (int): Documentos por inserción masiva.
+
+        Returns:
+            int: Cantidad de documentos escritos.
+        """
+        staging = self.get_collection(f"pattern_counts_rebuild_{uuid.uuid4().hex}")
+        written = 0
+        try:
+            staging.create_indexes(INDEXES["pattern_counts"])  # También crea la colección aunque no haya conteos
+            for batch in self._batched(counts, batch_size):
+                staging.insert_many(batch, ordered=False)
+                written += len(batch)
+            staging.rename("pattern_counts", dropTarget=True)
+        except Exception as e:
+            logger.error(f"Error reconstruyendo pattern_counts: {str(e)}", exc_info=True)
+            staging.drop()
+            raise
+        return written
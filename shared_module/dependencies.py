@@ -1,9 +1,9 @@
 import os
+from typing import Optional
 from database_manager import DatabaseManager
-from pymongo.collection import Collection
-from config.mongoDB_config import mongodb_config
-
-
+from async_database_manager import AsyncDatabaseManager
+from cache_manager import CacheManager
+from story_cache import StoryCache
 from dotenv import load_dotenv
 
 load_dotenv()  # Carga las variables de entorno desde el archivo .env
@@ -11,9 +11,71 @@ load_dotenv()  # Carga las variables de entorno desde el archivo .env
 db_uri = os.getenv("DB_URI")
 db_name = os.getenv("DB_NAME")
 
-def get_database_manager() -> DatabaseManager:
+# Configuración del pool de conexiones de MongoDB
+db_max_pool_size = int(os.getenv("DB_MAX_POOL_SIZE", "100"))
+db_min_pool_size = int(os.getenv("DB_MIN_POOL_SIZE", "0"))
+db_max_idle_time_ms = int(os.getenv("DB_MAX_IDLE_TIME_MS", "300000"))
+db_wait_queue_timeout_ms = int(os.getenv("DB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+# Escritura de eventos: "insert" (con `_id` determinístico) o "upsert"
+events_write_mode = os.getenv("EVENTS_WRITE_MODE", "insert").lower()
+events_chunk_size = int(os.getenv("EVENTS_BULK_CHUNK_SIZE", "1000"))
+
+# Almacenamiento de eventos: "single" (colección `events`) o "bucketed" (una colección por mes o día)
+events_storage_mode = os.getenv("EVENTS_STORAGE_MODE", "single").lower()
+events_bucket = os.getenv("EVENTS_BUCKET", "month").lower()
+events_hot_retention_days = int(os.getenv("EVENTS_HOT_RETENTION_DAYS", "30"))
+events_archive_dir = os.getenv("EVENTS_ARCHIVE_DIR", "./archive/events")
+
+# Caché read-through de historias (Redis o fakeredis según CACHE_BACKEND)
+story_cache_enabled = os.getenv("STORY_CACHE_ENABLED", "false").lower() == "true"
+story_cache_ttl = int(os.getenv("STORY_CACHE_TTL_SECONDS", "300"))
+
+# Ejecución de las operaciones de MongoDB: "threadpool" (no bloquea el event loop) o "inline"
+db_async_mode = os.getenv("DB_ASYNC_MODE", "threadpool").lower()
+db_executor_workers = int(os.getenv("DB_EXECUTOR_WORKERS", str(min(32, db_max_pool_size))))
+
+_db_manager: Optional[AsyncDatabaseManager] = None
+
+
+def init_database_manager() -> AsyncDatabaseManager:
+    """
+    Crea la instancia compartida de DatabaseManager del proceso. Se invoca desde el `lifespan` de cada servicio.
+    """
+    global _db_manager
+    if _db_manager is None:
+        story_cache = StoryCache(CacheManager(ttl=story_cache_ttl)) if story_cache_enabled else None
+        sync_manager = DatabaseManager(
+            uri=db_uri,
+            db_name=db_name,
+            max_pool_size=db_max_pool_size,
+            min_pool_size=db_min_pool_size,
+            max_idle_time_ms=db_max_idle_time_ms,
+            wait_queue_timeout_ms=db_wait_queue_timeout_ms,
+            events_write_mode=events_write_mode,
+            events_chunk_size=events_chunk_size,
+            story_cache=story_cache,
+            events_storage_mode=events_storage_mode,
+            events_bucket=events_bucket,
+            events_hot_retention_days=events_hot_retention_days,
+            events_archive_dir=events_archive_dir,
+        )
+        _db_manager = AsyncDatabaseManager(sync_manager, mode=db_async_mode, max_workers=db_executor_workers)
+    return _db_manager
+
+
+def close_database_manager():
     """
-    Retorna una instancia de DatabaseManager.
+    Cierra el cliente compartido de MongoDB al apagar el servicio.
     """
-    return DatabaseManager(uri=db_uri, db_name=db_name)
+    global _db_manager
+    if _db_manager is not None:
+        _db_manager.close()
+        _db_manager = None
+
 
+def get_database_manager() -> AsyncDatabaseManager:
+    """
+    Retorna la instancia compartida de DatabaseManager (y su pool de conexiones) con su fachada asíncrona.
+    """
+    return init_database_manager()
@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+from bson import json_util
+from typing import Iterable, Iterator, List
+
+
+class EventArchive:
+    """
+    Archivo frío de los buckets de eventos vencidos, en un directorio local.
+
+    Cada bucket se guarda como `<bucket>.jsonl.gz` (un documento por línea, en Extended JSON para conservar
+    fechas e IDs) junto con `<bucket>.sessions.json`, la lista de sesiones que contiene, para que una
+    búsqueda por sesión solo descomprima los archivos donde esas sesiones aparecen.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, bucket: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{bucket}{suffix}")
+
+    def archived_buckets(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(".jsonl.gz")] for name in os.listdir(self.directory) if name.endswith(".jsonl.gz"))
+
+    def _free_name(self, bucket: str) -> str:
+        """
+        Si el bucket ya fue archivado (eventos tardíos que recrearon la colección), usa `<bucket>.1`, `<bucket>.2`, ...
+        """
+        name, part = bucket, 0
+        while os.path.exists(self._path(name, ".jsonl.gz")):
+            part += 1
+            name = f"{bucket}.{part}"
+        return name
+
+    def write_bucket(self, bucket: str, documents: Iterable[dict]) -> int:
+        """
+        Escribe los documentos de un bucket. El archivo se publica recién al terminar (escritura + rename),
+        así un archivado interrumpido no deja un bucket a medias. Un archivo existente nunca se sobrescribe.
+
+        Returns:
+            int: Cantidad de documentos archivados.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        bucket = self._free_name(bucket)
+        data_path = self._path(bucket, ".jsonl.gz")
+        sessions_path = self._path(bucket, ".sessions.json")
+        session_ids = set()
+        written = 0
+
+        with gzip.open(data_path + ".tmp", "wt", encoding="utf-8") as archive_file:
+            for document in documents:
+                archive_file.write(json_util.dumps(document) + "\n")
+                session_ids.add(document.get("properties", {}).get("session_id"))
+                written += 1
+        with open(sessions_path + ".tmp", "w", encoding="utf-8") as sessions_file:
+            json.dump(sorted(session_id for session_id in session_ids if session_id), sessions_file)
+
+        os.replace(sessions_path + ".tmp", sessions_path)
+        os.replace(data_path + ".tmp", data_path)
+        return written
+
+    def find_by_sessions(self, session_ids: List[str]) -> Iterator[dict]:
+        """
+        Recorre los buckets archivados que contienen alguna de las sesiones y entrega sus eventos.
+        """
+        wanted = set(session_ids)
+        for bucket in self.archived_buckets():
+            try:
+                with open(self._path(bucket, ".sessions.json"), "r", encoding="utf-8") as sessions_file:
+                    if wanted.isdisjoint(json.load(sessions_file)):
+                        continue
+            except FileNotFoundError:
+                pass  # Sin índice de sesiones se revisa el archivo completo.
+
+            with gzip.open(self._path(bucket, ".jsonl.gz"), "rt", encoding="utf-8") as archive_file:
+                for line in archive_file:
+                    document = json_util.loads(line)
+                    if document.get("properties", {}).get("session_id") in wanted:
+                        yield document
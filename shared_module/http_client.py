@@ -0,0 +1,103 @@
+import importlib.util
+import os
+import threading
+import weakref
+import httpx
+from dotenv import load_dotenv
+from typing import Optional
+from logging_config import logger
+
+load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+# HTTP/2 solo se habilita si el paquete `h2` está instalado.
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+
+
+class HttpClientStats:
+    """
+    Cuenta las solicitudes del cliente HTTP compartido y cuántas reutilizaron una conexión abierta.
+    Una conexión se identifica por el `network_stream` que httpcore adjunta a cada respuesta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen_streams = weakref.WeakSet()
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    async def record_response(self, response: httpx.Response):
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if stream is None:
+                return
+            if stream in self._seen_streams:
+                self.reused_connections += 1
+            else:
+                self._seen_streams.add(stream)
+                self.new_connections += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tracked = self.new_connections + self.reused_connections
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "reuse_ratio": self.reused_connections / tracked if tracked else 0.0,
+                "http2_enabled": HTTP2_ENABLED,
+            }
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_stats = HttpClientStats()
+
+
+def init_http_client() -> httpx.AsyncClient:
+    """
+    Crea el cliente HTTP compartido del proceso (pool de conexiones con keep-alive).
+    Se invoca desde el `lifespan` de los servicios que llaman a otros servicios.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=HTTP_TIMEOUT_SECONDS,
+            http2=HTTP2_ENABLED,
+            event_hooks={"response": [_http_client_stats.record_response]},
+        )
+        logger.info(f"Cliente HTTP compartido inicializado (http2={HTTP2_ENABLED}).")
+    return _http_client
+
+
+async def close_http_client():
+    """
+    Cierra el cliente HTTP compartido y sus conexiones abiertas.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Retorna el cliente HTTP compartido del proceso.
+    """
+    return init_http_client()
+
+
+def get_http_client_stats() -> dict:
+    """
+    Retorna las métricas de reutilización de conexiones del cliente HTTP compartido.
+    """
+    return _http_client_stats.snapshot()
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class LocalCache:
+    """
+    Caché LRU en memoria del proceso, acotada por cantidad de entradas y por bytes, con TTL por entrada.
+
+    El tamaño de cada entrada es el de su representación serializada (la misma que se guarda en Redis).
+    Los valores se devuelven sin copiar: quien los lee no debe modificarlos.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, ttl: float = 5.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, size: int):
+        """
+        Guarda un valor. Si supera el límite de bytes por sí solo no se guarda.
+        """
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires_at, size, value)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -7,6 +7,7 @@ class Action(BaseModel):
     target: Optional[str] = None  # Elemento afectado (e.g., selector CSS)
     value: Optional[str] = None  # Valor ingresado (para inputs)
     url: Optional[str] = None  # URL (para navegaciones)
+    timestamp: Optional[str] = None  # Momento del evento que originó la acción
 
     def is_login_action(self) -> bool:
         """
@@ -1,7 +1,15 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Dict, Optional, Union
-from datetime import datetime
-import json
+from pydantic import BaseModel, Field, TypeAdapter, field_serializer, field_validator
+from typing import Dict, List, Optional, Union
+from datetime import datetime, timezone
+import hashlib
+
+
+def format_timestamp(value: datetime) -> str:
+    """
+    Representación canónica de un timestamp: ISO 8601 en UTC con milisegundos (p. ej. `2024-10-10T22:53:05.563Z`).
+    """
+    return value.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
 
 class ElementAttributes(BaseModel):
     class_: Optional[str] = Field(None, alias="class")
@@ -23,7 +31,7 @@ class Properties(BaseModel):
     elementType: str
     elementText: str
     elementAttributes: Optional[ElementAttributes] = None
-    timestamp: str
+    timestamp: datetime
     x: int
     y: int
     mouseButton: int
@@ -33,30 +41,63 @@ class Properties(BaseModel):
     metaKey: bool
 
     @field_validator("timestamp")
-    def validate_timestamp(cls, value):
-        try:
-            datetime.fromisoformat(value.replace("Z", "+00:00"))
-            return value
-        except ValueError:
-            raise ValueError("Invalid ISO 8601 timestamp format.")
+    def validate_timestamp(cls, value: datetime) -> datetime:
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+    @field_serializer("timestamp", when_used="json")
+    def serialize_timestamp(self, value: datetime) -> str:
+        return format_timestamp(value)
 
 class Event(BaseModel):
     event: str
     properties: Properties
-    timestamp: str
+    timestamp: datetime
 
     @field_validator("timestamp")
-    def validate_event_timestamp(cls, value):
-        try:
-            datetime.fromisoformat(value.replace("Z", "+00:00"))
-            return value
-        except ValueError:
-            raise ValueError("Invalid ISO 8601 timestamp format.")
-        
+    def validate_event_timestamp(cls, value: datetime) -> datetime:
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+    @field_serializer("timestamp", when_used="json")
+    def serialize_event_timestamp(self, value: datetime) -> str:
+        return format_timestamp(value)
+
     def to_json(self) -> dict:
         """
         Convierte la instancia de Event a un formato JSON compatible con el alias.
         """
-        return self.model_dump(by_alias=True)  
-    
-          
+        return self.model_dump(mode="json", by_alias=True)
+
+    def to_document(self) -> dict:
+        """
+        Convierte la instancia de Event en un documento de MongoDB (los timestamps se guardan como fechas BSON).
+        """
+        return self.model_dump(by_alias=True)
+
+    def event_id(self) -> str:
+        """
+        Genera un identificador determinístico a partir de (distinct_id, session_id, timestamp).
+        Se usa como `_id` en MongoDB para que un reenvío del mismo evento se detecte como duplicado.
+        """
+        timestamp = self.timestamp.astimezone(timezone.utc).isoformat()
+        key = f"{self.properties.distinct_id}|{self.properties.session_id}|{timestamp}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+# Validadores precompilados para cuerpos con listas de eventos y para líneas NDJSON con un evento.
+EventListAdapter = TypeAdapter(List[Event])
+EventAdapter = TypeAdapter(Event)
+
+
+def parse_events(payload: Union[bytes, str, list]) -> List[Event]:
+    """
+    Convierte un cuerpo con una lista de eventos en instancias de Event con el validador precompilado.
+
+    Args:
+        payload (Union[bytes, str, list]): JSON crudo (se valida sin pasar por `json.loads`) o la lista ya decodificada.
+
+    Returns:
+        List[Event]: Eventos del cuerpo.
+    """
+    if isinstance(payload, (bytes, str)):
+        return EventListAdapter.validate_json(payload)
+    return EventListAdapter.validate_python(payload)
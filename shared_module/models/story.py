@@ -16,4 +16,12 @@ class Story(BaseModel):
     def __init__(self, **data):
         super().__init__(**data)
         self.actions = [Action(**action) if isinstance(action, dict) else action for action in self.actions]
-        
\ No newline at end of file
+        
+
+
+class StoryActions(BaseModel):
+    """
+    Vista reducida de una historia con los campos necesarios para generar su test.
+    """
+    id: str
+    actions: List[Action]
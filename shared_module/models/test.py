@@ -1,19 +1,24 @@
+import hashlib
+import json
 from pydantic import BaseModel
-from typing import List
-from models.story import Story
+from typing import List, Union
+from models.story import Story, StoryActions
 from models.action import Action  # Asegúrate de importar Action
 
+# Se incrementa al cambiar la plantilla del script para que los tests guardados se regeneren.
+SCRIPT_GENERATOR_VERSION = 1
+
 class Test(BaseModel):
     story_id: str
     test_script: str
 
     @classmethod
-    def from_story(cls, story: Story) -> "Test":
+    def from_story(cls, story: Union[Story, StoryActions]) -> "Test":
         """
         Genera un test de Playwright basado en una historia de usuario.
 
         Args:
-            story (Story): Historia de usuario.
+            story (Union[Story, StoryActions]): Historia de usuario (completa o solo con sus acciones).
 
         Returns:
             Test: Instancia del test generado.
@@ -21,6 +26,22 @@ class Test(BaseModel):
         script = cls.generate_script_from_actions(story.actions)
         return cls(story_id=story.id, test_script=script)
 
+    @staticmethod
+    def actions_hash(actions: List[Action]) -> str:
+        """
+        Hash de contenido de las acciones de una historia, limitado a los campos que usa el script.
+        Dos historias con el mismo hash generan el mismo test.
+
+        Args:
+            actions (List[Action]): Acciones de la historia.
+
+        Returns:
+            str: Hash SHA-1 en hexadecimal.
+        """
+        content = [action.model_dump(include={"type", "target", "value", "url"}) for action in actions]
+        payload = json.dumps([SCRIPT_GENERATOR_VERSION, content], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
     @staticmethod
     def generate_script_from_actions(actions: List[Action]) -> str:
         script_lines = [
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+from async_database_manager import AsyncDatabaseManager
+from dependencies import get_database_manager
+from http_client import get_http_client_stats
+
+router = APIRouter(prefix="/metrics")
+
+
+@router.get("/db-pool", summary="Estadísticas del pool de conexiones de MongoDB")
+async def get_db_pool_stats(db_manager: AsyncDatabaseManager = Depends(get_database_manager)) -> dict:
+    """
+    Expone conexiones en uso, esperas y tasa de creación del pool de MongoDB del proceso.
+    """
+    return db_manager.get_pool_stats()
+
+
+@router.get("/story-cache", summary="Contadores de la caché de historias")
+async def get_story_cache_stats(db_manager: AsyncDatabaseManager = Depends(get_database_manager)) -> dict:
+    """
+    Expone aciertos, fallos, invalidaciones y desalojos de la caché read-through de historias.
+    """
+    return await db_manager.get_cache_stats()
+
+
+@router.get("/http-client", summary="Reutilización de conexiones del cliente HTTP compartido")
+async def get_http_client_metrics() -> dict:
+    """
+    Expone la cantidad de solicitudes entre servicios y cuántas reutilizaron una conexión keep-alive.
+    """
+    return get_http_client_stats()
@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import deque
+from pymongo import monitoring
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Listener de CMAP que acumula estadísticas del pool de conexiones de un `MongoClient`.
+    """
+
+    def __init__(self, rate_window_seconds: int = 60):
+        self.rate_window_seconds = rate_window_seconds
+        self._lock = threading.Lock()
+        self._creation_times = deque()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.waiters = 0
+        self.total_created = 0
+        self.total_closed = 0
+        self.total_check_outs = 0
+        self.total_check_out_failures = 0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        now = time.monotonic()
+        with self._lock:
+            self.open_connections += 1
+            self.total_created += 1
+            self._creation_times.append(now)
+            self._trim_creation_times(now)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+            self.total_closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiters += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiters = max(self.waiters - 1, 0)
+            self.total_check_out_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiters = max(self.waiters - 1, 0)
+            self.checked_out += 1
+            self.total_check_outs += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _trim_creation_times(self, now: float):
+        limit = now - self.rate_window_seconds
+        while self._creation_times and self._creation_times[0] < limit:
+            self._creation_times.popleft()
+
+    def snapshot(self) -> dict:
+        """
+        Devuelve una foto consistente de las estadísticas del pool.
+
+        Returns:
+            dict: Conexiones abiertas, en uso, esperas y tasa de creación (conexiones/segundo).
+        """
+        with self._lock:
+            self._trim_creation_times(time.monotonic())
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "waiters": self.waiters,
+                "total_created": self.total_created,
+                "total_closed": self.total_closed,
+                "total_check_outs": self.total_check_outs,
+                "total_check_out_failures": self.total_check_out_failures,
+                "pool_clears": self.pool_clears,
+                "creation_rate_per_second": len(self._creation_times) / self.rate_window_seconds,
+            }
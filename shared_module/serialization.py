@@ -0,0 +1,237 @@
+import gzip
+import json
+import zlib
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # El formato binario es opcional: sin msgpack se usa JSON.
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin el paquete solo se aceptan cuerpos sin comprimir o con gzip.
+    zstandard = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+WIRE_FORMATS = ("json", "msgpack")
+WIRE_COMPRESSIONS = ("none", "gzip")
+
+
+class UnsupportedWireFormat(ValueError):
+    """
+    El cuerpo llegó con un Content-Type o Content-Encoding que el servicio no sabe decodificar.
+    """
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def encode_payload(payload, wire_format: str = "json", compression: str = "none") -> Tuple[bytes, dict]:
+    """
+    Serializa un payload para enviarlo entre servicios.
+
+    Args:
+        payload: Datos compatibles con JSON.
+        wire_format (str): `json` o `msgpack` (si msgpack no está instalado se usa `json`).
+        compression (str): `none` o `gzip`.
+
+    Returns:
+        Tuple[bytes, dict]: Cuerpo serializado y los headers `Content-Type`/`Content-Encoding` correspondientes.
+    """
+    if wire_format == "msgpack" and msgpack_available():
+        body = msgpack.packb(payload, use_bin_type=True)
+        headers = {"Content-Type": MSGPACK_CONTENT_TYPE}
+    else:
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type": JSON_CONTENT_TYPE}
+
+    if compression == "gzip":
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def decode_payload(body: bytes, content_type: Optional[str], content_encoding: Optional[str] = None):
+    """
+    Decodifica un cuerpo según sus headers `Content-Type` y `Content-Encoding`.
+
+    Raises:
+        UnsupportedWireFormat: Si el formato o la compresión no están soportados.
+    """
+    encoding = (content_encoding or "identity").lower()
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding != "identity":
+        raise UnsupportedWireFormat(f"Content-Encoding no soportado: {content_encoding}")
+
+    media_type = (content_type or JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+    if media_type == MSGPACK_CONTENT_TYPE:
+        if not msgpack_available():
+            raise UnsupportedWireFormat("msgpack no está instalado en este servicio.")
+        return msgpack.unpackb(body, raw=False)
+    if media_type == JSON_CONTENT_TYPE:
+        return json.loads(body)
+    raise UnsupportedWireFormat(f"Content-Type no soportado: {content_type}")
+
+
+# Máximo de bytes descomprimidos por paso, para que un bloque muy comprimido no se expanda de una vez en memoria.
+STREAM_DECOMPRESS_CHUNK = 1024 * 1024
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class _IdentityStreamDecoder:
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        if data:
+            yield data
+
+    def finish(self):
+        pass
+
+
+class _GzipStreamDecoder:
+    """
+    Descompresión incremental de gzip (admite varios miembros concatenados, como produce `cat a.gz b.gz`).
+    """
+
+    def __init__(self):
+        self._decoder = zlib.decompressobj(_GZIP_WBITS)
+        self._started = False
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            self._started = True
+            try:
+                output = self._decoder.decompress(data, STREAM_DECOMPRESS_CHUNK)
+            except zlib.error as e:
+                raise ValueError(f"El cuerpo gzip está dañado: {e}") from e
+            if output:
+                yield output
+            if self._decoder.eof:
+                data = self._decoder.unused_data
+                self._decoder = zlib.decompressobj(_GZIP_WBITS)
+                self._started = False
+            else:
+                data = self._decoder.unconsumed_tail
+
+    def finish(self):
+        if self._started and not self._decoder.eof:
+            raise ValueError("El cuerpo gzip está incompleto.")
+
+
+class _ZstdStreamDecoder:
+    """
+    Descompresión incremental de zstd. A diferencia de zlib, `zstandard` no permite limitar la salida de cada
+    llamada: cada fragmento recibido se descomprime completo en memoria, sin el tope de `STREAM_DECOMPRESS_CHUNK`.
+    Con clientes no confiables conviene limitar el tamaño de los fragmentos (o aceptar solo gzip) delante del servicio.
+    """
+
+    def __init__(self):
+        self._decoder = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        try:
+            output = self._decoder.decompress(data)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"El cuerpo zstd está dañado: {e}") from e
+        if output:
+            yield output
+
+    def finish(self):
+        pass
+
+
+def stream_decoder(content_encoding: Optional[str] = None):
+    """
+    Crea un descompresor incremental para un `Content-Encoding` (`identity`, `gzip` o `zstd`).
+
+    Raises:
+        UnsupportedWireFormat: Si la compresión no está soportada o `zstandard` no está instalado.
+    """
+    encoding = (content_encoding or "identity").lower()
+    if encoding == "identity":
+        return _IdentityStreamDecoder()
+    if encoding == "gzip":
+        return _GzipStreamDecoder()
+    if encoding == "zstd":
+        if zstandard is None:
+            raise UnsupportedWireFormat("zstandard no está instalado en este servicio.")
+        return _ZstdStreamDecoder()
+    raise UnsupportedWireFormat(f"Content-Encoding no soportado: {content_encoding}")
+
+
+class _LineSplitter:
+    """
+    Corta un flujo de bytes en líneas numeradas. Las líneas en blanco se omiten y las que superan
+    `max_line_bytes` se informan como None sin guardarlas en memoria.
+    """
+
+    def __init__(self, max_line_bytes: int):
+        self.max_line_bytes = max_line_bytes
+        self.line_number = 0
+        self._buffer = bytearray()
+        self._oversized = False
+
+    def _append(self, data: bytes):
+        if self._oversized:
+            return
+        self._buffer += data
+        if len(self._buffer) > self.max_line_bytes:
+            self._oversized = True
+            self._buffer.clear()
+
+    def _end_line(self, lines: List[Tuple[int, Optional[bytes]]]):
+        self.line_number += 1
+        if self._oversized:
+            lines.append((self.line_number, None))
+        elif self._buffer.strip():
+            lines.append((self.line_number, bytes(self._buffer)))
+        self._buffer.clear()
+        self._oversized = False
+
+    def feed(self, data: bytes) -> List[Tuple[int, Optional[bytes]]]:
+        lines = []
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                self._append(data[start:])
+                return lines
+            self._append(data[start:end])
+            self._end_line(lines)
+            start = end + 1
+
+    def close(self) -> List[Tuple[int, Optional[bytes]]]:
+        lines = []
+        if self._buffer or self._oversized:
+            self._end_line(lines)
+        return lines
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str] = None,
+    max_line_bytes: int = 1024 * 1024,
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Recorre un cuerpo NDJSON (opcionalmente comprimido) a medida que llega, sin leerlo completo.
+
+    Args:
+        chunks (AsyncIterator[bytes]): Bloques del cuerpo tal como llegan (p. ej. `request.stream()`).
+        content_encoding (Optional[str]): `identity`, `gzip` o `zstd`.
+        max_line_bytes (int): Largo máximo de una línea descomprimida.
+
+    Yields:
+        Tuple[int, Optional[bytes]]: Número de línea (desde 1) y su contenido, o None si la línea supera el máximo.
+    """
+    decoder = stream_decoder(content_encoding)
+    splitter = _LineSplitter(max_line_bytes)
+    async for chunk in chunks:
+        for data in decoder.decompress(chunk):
+            for line in splitter.feed(data):
+                yield line
+    decoder.finish()
+    for line in splitter.close():
+        yield line
@@ -0,0 +1,93 @@
+import threading
+from typing import Callable, Iterable, Optional
+from cache_manager import CacheManager
+
+
+class StoryCache:
+    """
+    Caché read-through de las consultas de historias y sesiones sobre `CacheManager`.
+
+    Cada consulta se guarda bajo una clave derivada de sus parámetros. `bulk_upsert_stories`
+    invalida las claves de las historias que modifica después de escribirlas. La invalidación
+    incrementa la generación de cada clave, y una lectura solo guarda su resultado si la generación
+    no cambió mientras consultaba la base de datos: una lectura concurrente con una escritura no
+    vuelve a dejar en Redis el valor anterior. Con el nivel en memoria habilitado, los demás
+    procesos pueden servir su copia local hasta recibir la invalidación por pub/sub, como máximo
+    `CACHE_LOCAL_TTL_SECONDS`.
+    """
+
+    def __init__(self, cache_manager: CacheManager):
+        self.cache = cache_manager
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.discarded_loads = 0
+
+    @staticmethod
+    def story_key(story_id: str) -> str:
+        return f"stories:id:{story_id}"
+
+    @staticmethod
+    def session_key(session_id: str) -> str:
+        return f"stories:session:{session_id}"
+
+    @staticmethod
+    def distinct_id_key(session_id: str) -> str:
+        return f"sessions:distinct_id:{session_id}"
+
+    def get_or_load(self, key: str, loader: Callable, cache_none: bool = True):
+        """
+        Devuelve el valor en caché para `key` o lo obtiene con `loader` y lo guarda.
+
+        Args:
+            key (str): Clave de la consulta.
+            loader (Callable): Función que consulta la base de datos.
+            cache_none (bool): Si es False, un resultado None no se guarda (p. ej. una sesión aún no registrada).
+        """
+        cached = self.cache.get(key)
+        if "value" in cached:
+            with self._lock:
+                self.hits += 1
+            return cached["value"]
+
+        with self._lock:
+            self.misses += 1
+        generation = self.cache.get_generation(key)
+        value = loader()
+        if value is not None or cache_none:
+            if not self.cache.save_if_generation(key, {"value": value}, generation):
+                with self._lock:
+                    self.discarded_loads += 1
+        return value
+
+    def invalidate(self, keys: Iterable[str]):
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return
+        self.cache.invalidate_many(keys)
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        local = self.cache.stats()
+        server = self.cache.redis_stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "discarded_loads": self.discarded_loads,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": {
+                    "local": local.get("evictions", 0),
+                    "local_expired": local.get("expirations", 0),
+                    "redis": server.get("evicted_keys"),
+                    "redis_expired": server.get("expired_keys"),
+                },
+                "local": local,
+            }
+
+    def close(self):
+        self.cache.close()